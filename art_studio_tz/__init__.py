@@ -2,9 +2,41 @@
 
 __version__ = "0.1.1"
 
-from .api import *  # noqa
-from .db import DB
+import importlib
 
-from .db_sql import DBsql  # noqa
+# name -> submodule, submodules are imported on first access (PEP 562),
+# so commands working with quotes.csv do not pay for SQLAlchemy and requests
+_lazy = {
+    "Quote": "api",
+    "QuoteDB": "api",
+    "QuoteDBsqlite": "api",
+    "QuoteDBsql": "api",
+    "AsyncQuoteDBsql": "api",
+    "QuoteException": "api",
+    "MissingText": "api",
+    "InvalidQuoteId": "api",
+    "BadReqest": "api",
+    "DB": "db",
+    "DBsql": "db_sql",
+    "DBsqlite": "db_sqlite",
+    "AsyncDBsql": "db_sql_async",
+    "RateLimiter": "net",
+    "HttpClient": "net",
+    "QuoteServer": "server",
+    "RemoteQuoteDB": "server",
+    "app": "cli",
+}
 
-# from .cli import app  # noqa
+__all__ = [*_lazy, "__version__"]
+
+
+def __getattr__(name):
+    if name in _lazy:
+        value = getattr(importlib.import_module(f".{_lazy[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted([*globals(), *_lazy])
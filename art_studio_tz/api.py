@@ -1,32 +1,43 @@
 """
 API for the quets project
 """
-import requests                                                                                                                                                                                                   
-import time, os
+from __future__ import annotations
+
+import os
+import random
+from collections import deque
 from datetime import datetime, timezone
-from dataclasses import asdict
 from dataclasses import dataclass
 from dataclasses import field
+from itertools import islice
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 
 from .db import DB
-from .db_sql import DBsql
+from .dedupe import near_duplicate_clusters, row_hash
+from .net import HttpClient, RateLimiter
 
 
 __all__ = [
     "Quote",
     "QuoteDB",
+    "QuoteDBsqlite",
     "QuoteDBsql",
+    "AsyncQuoteDBsql",
     "QuoteException",
     "MissingText",
     "InvalidQuoteId",
     "BadReqest",
+    "RateLimiter",
+    "HttpClient",
 ]
 
-@dataclass
+@dataclass(slots=True)
 class Quote:
     """model for a quote.
+
+    Slotted, so instances have no __dict__. id is not compared.
     """    
     text: str = None
     author: str = None
@@ -38,16 +49,28 @@ class Quote:
         """Create a Quote from a dict.
 
         Args:
-            d (_type_): dict with quote data.
+            d (dict): dict with quote data.
 
         Returns:
-            _type_: Quote instance
+            Quote: Quote instance
         """        
-        return Quote(**d)
+        return cls(**d)
+
+    @classmethod
+    def from_row(cls, row):
+        """Create a Quote from a row of (text, author, timestep, id).
+
+        Args:
+            row (Sequence): values in field order, e.g. a SQLAlchemy Row.
+
+        Returns:
+            Quote: Quote instance
+        """
+        return cls(*row)
     
     def to_dict(self):
-        """Return a dict representation of the Quote."""
-        return asdict(self)
+        """Return a dict representation of the Quote, values are not copied."""
+        return {"text": self.text, "author": self.author, "timestep": self.timestep, "id": self.id}
 
 
 class QuoteException(Exception):
@@ -65,21 +88,61 @@ class BadReqest(QuoteException):
     pass
 
 
+RECENT_LIMIT = 10_000  # ids remembered for the no-repeat window of random()
+
+
+def _random_quotes(sample: Callable[[int, set[int]], list[Quote]], recent: deque[int], n: int,
+                   weights: dict[str, float] | None, no_repeat: int) -> list[Quote]:
+    """Draw n distinct quotes for random().
+
+    ``sample(k, exclude)`` returns up to k distinct uniformly random quotes
+    whose ids are not excluded. With weights a drawn quote is kept with
+    probability weight of its author / max weight (rejection sampling), so
+    the cost grows with the max to average weight ratio, not with the store.
+    Quotes served by the last ``no_repeat`` draws are excluded while enough
+    other quotes are left.
+    """
+    window = set(islice(reversed(recent), min(no_repeat, RECENT_LIMIT)))
+    top = max([1.0, *weights.values()]) if weights else 1.0
+    chosen: dict[int, Quote] = {}
+    for exclude in (window, set()):
+        for _ in range(100 if weights else 1):  # unweighted draws take all they can at once
+            need = n - len(chosen)
+            if need <= 0:
+                break
+            drawn = sample(need, exclude.union(chosen))
+            if not drawn:
+                break
+            for quote in drawn:
+                if not weights or random.random() * top < weights.get(quote.author, 1.0):
+                    chosen[int(quote.id)] = quote
+        if len(chosen) >= n or not window:
+            break
+    recent.extend(chosen)
+    return list(chosen.values())
+
+
 class QuoteDB:
     """A class to manage a database of quotes. API for quotes.
     """    
-    def __init__(self, db_path):
+    def __init__(self, db_path, http: HttpClient | None = None):
         """initialize the QuoteDB instance.
 
         Args:
             db_path (_type_): Path to the database file.
+            http (HttpClient | None, optional): client for upstream quotes APIs. Defaults to None.
         """        
         self._db_path = db_path
-        self._db = DB(db_path, "quotes", ["timestep",'text', 'author'])
+        self.http = http if http is not None else HttpClient()
+        self._db = DB(db_path, "quotes", ["timestep",'text', 'author'], key=row_hash)
+        self._recent: deque[int] = deque(maxlen=RECENT_LIMIT)  # ids served by random()
 
-    def add_quote(self, quote: Quote) -> int:
+    def add_quote(self, quote: Quote) -> int | None:
         """Add a quote, return the id of quote.
 
+        A quote with the same text and author (ignoring case and spacing)
+        is not added again.
+
         Args:
             quote (Quote): Quote instance.
 
@@ -87,16 +150,37 @@ class QuoteDB:
             MissingText: if quote.text is None.
 
         Returns:
-            int: id of the added quote.
+            int | None: id of the added quote, None if it is a duplicate.
         """        
         if not quote.text:
             raise MissingText
         if quote.author is None:
             quote.author = ""
-        id = self._db.create(quote.to_dict())
-        self._db.update(id, {"id": id,
-                             "timestep":datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z') })
-        return id
+        item = quote.to_dict()
+        item["timestep"] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
+        return self._db.create(item)
+
+    def add_quotes(self, quotes: Iterable[Quote]) -> list[int | None]:
+        """Add many quotes with a single append, return their ids.
+
+        Args:
+            quotes (Iterable[Quote]): Quote instances.
+
+        Raises:
+            MissingText: if any quote has no text, nothing is added then.
+
+        Returns:
+            list[int | None]: ids of the added quotes in the same order, None for duplicates.
+        """
+        timestep = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
+        items = []
+        for quote in quotes:
+            if not quote.text:
+                raise MissingText
+            if quote.author is None:
+                quote.author = ""
+            items.append({**quote.to_dict(), "timestep": timestep})
+        return self._db.create_many(items)
     
     def get_quote(self, quote_id: int) -> Quote:
         """Return a quote with given quote_id.
@@ -135,10 +219,86 @@ class QuoteDB:
         else:
             return [Quote.from_dict(t) for t in all]
 
+    def iter_quotes(self, author=None) -> Iterator[Quote]:
+        """Yield quotes one by one without loading the whole db.
+
+        Args:
+            author (_type_, optional): Author name to filter quotes. Defaults to None.
+
+        Yields:
+            Quote: Quote instance.
+        """
+        for t in self._db.iter_rows(None if author is None else {"author": author}):
+            yield Quote.from_dict(t)
+
+    def search(self, query: str, limit: int = 10) -> list[Quote]:
+        """Return quotes containing all words of the query, best matches first.
+
+        Args:
+            query (str): words to search for in text and author.
+            limit (int, optional): max number of quotes. Defaults to 10.
+
+        Returns:
+            list[Quote]: List of Quote instances ranked by BM25.
+        """
+        return [Quote.from_dict(t) for t in self._db.search(query, limit)]
+
+    def random(self, n: int = 1, author=None, weights: dict[str, float] | None = None,
+               no_repeat: int = 0) -> list[Quote]:
+        """Return n distinct random quotes without reading the whole db.
+
+        Quotes are drawn through the offset index, every quote is equally
+        likely unless weights are given.
+
+        Args:
+            n (int, optional): number of quotes. Defaults to 1.
+            author (_type_, optional): Author name to filter quotes. Defaults to None.
+            weights (dict[str, float] | None, optional): author -> relative weight,
+                authors not in it weigh 1, 0 - never picked. Defaults to None.
+            no_repeat (int, optional): skip quotes served by this object among the
+                last no_repeat ones while others are left. Defaults to 0.
+
+        Returns:
+            list[Quote]: List of Quote instances, fewer than n if the db is smaller.
+        """
+        match = None if author is None else {"author": author}
+        def sample(k: int, exclude: set[int]) -> list[Quote]:
+            return [Quote.from_dict(t) for t in self._db.sample(k, match, exclude)]
+        return _random_quotes(sample, self._recent, n, weights, no_repeat)
+
     def count(self) -> int:
         """Return the number of quotes in db."""
         return self._db.count()
 
+    def dedupe(self) -> int:
+        """Remove quotes repeating the text and author of an earlier quote.
+
+        Returns:
+            int: number of removed quotes.
+        """
+        return self._db.dedupe()
+
+    def near_duplicates(self, threshold: float = 0.8, merge: bool = False) -> list[list[Quote]]:
+        """Group quotes with nearly the same text, found by MinHash/LSH.
+
+        Quotes are streamed once, so the store does not have to fit in memory.
+
+        Args:
+            threshold (float, optional): min similarity of texts, 0..1. Defaults to 0.8.
+            merge (bool, optional): keep the earliest quote of every group and
+                remove the others. Defaults to False.
+
+        Returns:
+            list[list[Quote]]: groups of two or more quotes ordered by id.
+        """
+        clusters = near_duplicate_clusters(((int(q.id), q.text) for q in self.iter_quotes()), threshold)
+        groups = [[self.get_quote(quote_id) for quote_id in ids] for ids in clusters]
+        if merge:
+            for ids in clusters:
+                for quote_id in ids[1:]:
+                    self.delete_quote(quote_id)
+        return groups
+
     def update_quote(self, quote_id: int, quote_mods: Quote) -> None:
         """update a quote with modifications.
 
@@ -154,41 +314,60 @@ class QuoteDB:
         except KeyError as exc:
             raise InvalidQuoteId(quote_id) from exc
         
-    def start(self, url: str, pause: float):
-        """get quotes from url and add them to db every 'pause' seconds.
+    def start(self, url: str, pause: float, limiter: RateLimiter | None = None,
+              concurrency: int = 1):
+        """get quotes from url and add them to db, at most one request every 'pause' seconds.
 
         Args:
             url (str): _url to get quotes from if not given use "https://zenquotes.io/api/random"
-            pause (float): pause between requests in seconds.
+            pause (float): pause between requests in seconds, used when no limiter is given.
+            limiter (RateLimiter | None, optional): rate limiter for requests. Defaults to None.
+            concurrency (int, optional): requests in flight, more than 1 runs the
+                asyncio ingest engine. Defaults to 1.
         """
+        import requests
 
+        if limiter is None:
+            limiter = RateLimiter(1 / pause if pause > 0 else 0)
 
-        # url = "https://zenquotes.io/api/random"    
-                                                                                                                                                                           
-        print("For stop taking quotes press 'Ctrl + C'") 
-                                                                                                                                                                                                                   
-        while True:                                                                                                                                                                                                   
-            try:                                                                                                                                                                                                      
-                response = requests.get(url)                                                                                                                                                                          
-                response.raise_for_status()                                                                                                                           
-                data = response.json()                                                                                                                                                                                
-                                                                                                                                                                                                                    
-                if data:                                                                                                                                                                                              
-                    quote = data[0]["q"]                                                                                                                                                                              
+        print("For stop taking quotes press 'Ctrl + C'")
+
+        if concurrency > 1:
+            import asyncio
+            from .ingest import Ingest
+            http = self.http if self.http.pool_size >= concurrency else HttpClient(pool_size=concurrency)
+            try:
+                asyncio.run(Ingest(self, url, concurrency, limiter, http=http).run())
+            except KeyboardInterrupt:
+                print("\nОстановка запроса цитат пользователем.")
+            finally:
+                if http is not self.http:
+                    http.close()
+            return
+
+        duplicates = 0
+        while True:
+            try:
+                data = self.http.fetch_quotes(url, limiter)
+                if data:
+                    quote = data[0]["q"]
                     author = data[0]["a"]
-                    self.add_quote(Quote(text=quote, author=author))                                                                                                                                                                             
-                    print(f"Added Quote: {quote} - Author: {author}")                                                                                                                                                       
-                else:                                                                                                                                                                                                 
+                    if self.add_quote(Quote(text=quote, author=author)) is None:
+                        duplicates += 1
+                        print(f"Skipped duplicate: {quote} - Author: {author} (duplicates: {duplicates})")
+                    else:
+                        print(f"Added Quote: {quote} - Author: {author}")
+                else:
                     print("No data received.")
-                print("For stop taking quotes press 'Ctrl + C'")                                                                                                                                                                        
-                time.sleep(pause)  
+                print(limiter)
+                print("For stop taking quotes press 'Ctrl + C'")
 
-            except requests.exceptions.RequestException as e:                                                                                                                                                         
-                print(f"Error fetching quote: {e}")                                                                                                                                                                   
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching quote: {e}")
 
-            except KeyboardInterrupt:                                                                                                                                                                                     
+            except KeyboardInterrupt:
                 print("\nОстановка запроса цитат пользователем.")
-                break   
+                break
 
     def delete_quote(self, quote_id: int) -> None:
         """Delete a quote with given quote_id.
@@ -208,26 +387,86 @@ class QuoteDB:
         """Remove all quotes from db."""
         self._db.delete_all()
 
+    def compact(self) -> int:
+        """Rewrite the db file without deleted and outdated quote versions.
+
+        Returns:
+            int: number of dropped records.
+        """
+        return self._db.compact()
+
     def path(self):
         """Return the path to the database file."""
         return self._db_path
 
+
+class QuoteDBsqlite(QuoteDB):
+    """QuoteDB stored in quotes.sqlite3 (SQLite in WAL mode) instead of quotes.csv.
+
+    Same API as QuoteDB. On the first start quotes from an existing quotes.csv
+    in the same directory are imported with their ids.
+    """
+    def __init__(self, db_path, http: HttpClient | None = None):
+        """initialize the QuoteDBsqlite instance.
+
+        Args:
+            db_path (Path): directory of the database file.
+            http (HttpClient | None, optional): client for upstream quotes APIs. Defaults to None.
+        """
+        from .db_sqlite import DBsqlite  # SQLAlchemy is loaded only for this backend
+        self._db_path = db_path
+        self.http = http if http is not None else HttpClient()
+        self._db = DBsqlite(db_path, "quotes")
+        self._recent: deque[int] = deque(maxlen=RECENT_LIMIT)
+
+
+def local_db(db_path, backend: str | None = None, http: HttpClient | None = None) -> QuoteDB:
+    """Open the local quotes store.
+
+    Args:
+        db_path (Path): directory of the store.
+        backend (str | None, optional): "csv" or "sqlite", by default env
+            QUOTES_BACKEND or "csv". Defaults to None.
+        http (HttpClient | None, optional): client for upstream quotes APIs. Defaults to None.
+
+    Raises:
+        ValueError: if the backend is unknown.
+
+    Returns:
+        QuoteDB: QuoteDB or QuoteDBsqlite instance.
+    """
+    backend = backend or os.getenv("QUOTES_BACKEND") or "csv"
+    if backend == "csv":
+        return QuoteDB(db_path, http)
+    if backend == "sqlite":
+        return QuoteDBsqlite(db_path, http)
+    raise ValueError(f"Unknown backend {backend!r}, use csv or sqlite")
+
+
 class QuoteDBsql:
     """A class to manage a database of quotes using MySQL. API for quotes.
     """    
-    def __init__(self, user, password, host = "localhost", port = 3306,  database = "quotes_db"):
+    def __init__(self, user=None, password=None, host = "localhost", port = 3306,  database = "quotes_db",
+                 http: HttpClient | None = None, url: str | None = None, **pool):
         """initialize the QuoteDBsql instance.
 
         Args:
-            user (str): username for the database.
-            password (str): password for the database.
+            user (str, optional): username for the database. Defaults to None.
+            password (str, optional): password for the database. Defaults to None.
             host (str, optional): hpstname for the database. Defaults to "localhost".
             port (int, optional): port for the database. Defaults to 3306.
             database (str, optional): database name. Defaults to "quotes_db".
+            http (HttpClient | None, optional): client for upstream quotes APIs. Defaults to None.
+            url (str | None, optional): SQLAlchemy url, used instead of user/password/host/port/database,
+                by default taken from QUOTES_DB_URL or quotes.ini. Defaults to None.
+            **pool: pool_size, max_overflow, pool_recycle, pool_pre_ping of the engine.
         """        
-        self._db = DBsql(user, password, host, port, database)
+        from .db_sql import DBsql  # SQLAlchemy is loaded only for mySQL commands
+        self._db = DBsql(user, password, host, port, database, url=url, **pool)
+        self.http = http if http is not None else HttpClient()
+        self._recent: deque[int] = deque(maxlen=RECENT_LIMIT)  # ids served by random()
 
-    def add_quote_sql(self, quote: Quote) -> None:
+    def add_quote_sql(self, quote: Quote) -> int | None:
         """Add a quote to the database.
 
         Args:
@@ -235,59 +474,128 @@ class QuoteDBsql:
 
         Raises:
             MissingText: if quote.text is None.
+
+        Returns:
+            int | None: id of the added quote, None if it is a duplicate or on error.
         """ 
         if not quote.text:
             raise MissingText
         if quote.author is None:
             quote.author = ""
-        self._db.create(quote.to_dict())
-        
+        return self._db.create(quote.to_dict())
+
+    def add_quotes(self, quotes: Iterable[Quote]) -> list[int | None]:
+        """Add many quotes in one transaction with a single INSERT.
+
+        Quotes whose content hash is already stored are skipped.
+
+        Args:
+            quotes (Iterable[Quote]): Quote instances.
+
+        Raises:
+            MissingText: if any quote has no text, nothing is added then.
+
+        Returns:
+            list[int | None]: ids of the added quotes in the same order, None for duplicates.
+        """
+        items = []
+        for quote in quotes:
+            if not quote.text:
+                raise MissingText
+            if quote.author is None:
+                quote.author = ""
+            items.append(quote.to_dict())
+        return self._db.bulk_create(items)
  
-    def list_quote(self, author=None) -> list[Quote]:
-        """Return a list of quotes.
+    def list_quote(self, author=None, limit: int | None = None, after: int | None = None) -> list[Quote]:
+        """Return a list of quotes ordered by id, filtering is done by the database.
 
         Args:
             author (str, optional): Author name to filter quotes. Defaults to None.
+            limit (int | None, optional): max number of quotes. Defaults to None.
+            after (int | None, optional): return quotes with id greater than this
+                (id of the last quote of the previous page). Defaults to None.
 
         Returns:
             list[Quote]: List of Quote instances.
         """        
-        all = self._db.read_all()
-        if author is not None:
-            return [
-                Quote.from_dict(t)
-                for t in all
-                if (t["author"] == author)
-            ]
-        else:
-            return [Quote.from_dict(t) for t in all]
+        return [Quote.from_row(row) for row in self._db.read_all(author=author, limit=limit, after=after)]
+
+    def iter_quotes(self, author=None, limit: int | None = None, after: int | None = None) -> Iterator[Quote]:
+        """Stream quotes ordered by id from a server-side cursor.
+
+        Args:
+            author (str, optional): Author name to filter quotes. Defaults to None.
+            limit (int | None, optional): max number of quotes. Defaults to None.
+            after (int | None, optional): return quotes with id greater than this. Defaults to None.
+
+        Yields:
+            Quote: Quote instance.
+        """
+        for row in self._db.iter_all(author=author, limit=limit, after=after):
+            yield Quote.from_row(row)
 
         
-    def get_some_quotes(self, url: str):
+    def get_some_quotes(self, url: str, limiter: RateLimiter | None = None):
         """Get 50 quotes from url and add them to db.
 
         Args:
             url (str): _url to get quotes from if not given use "https://zenquotes.io/api/quotes"
-        """        
+            limiter (RateLimiter | None, optional): rate limiter for requests. Defaults to None.
+        """
+        import requests
 
-        # url = "https://zenquotes.io/api/quotes"    
-                                                                                                                                                                           
-        try:                                                                                                                                                                                                      
-            response = requests.get(url)                                                                                                                                                                          
-            response.raise_for_status()                                                                                                                      
-            data = response.json()                                                                                                                                                                                
+        try:
+            data = self.http.fetch_quotes(url, limiter)
             if data:
-                for item in data:                                                                                                                                                                                              
-                    quote = item["q"]                                                                                                                                                                              
-                    author = item["a"]
-                    self.add_quote_sql(Quote(text=quote, author=author))                                                                                                                                                                            
-                    print(f"Added Quote: {quote} - Author: {author}") 
-                    time.sleep(0.5)   
-                print('Added 50 quotes, you can see them using the "art_studio_t list_sql" command')                                                                                                                                               
-            else:                                                                                                                                                                                                 
+                quotes = [Quote(text=item["q"], author=item["a"]) for item in data]
+                ids = self.add_quotes(quotes)
+                added = 0
+                for quote, quote_id in zip(quotes, ids):
+                    if quote_id is None:
+                        print(f"Skipped duplicate: {quote.text} - Author: {quote.author}")
+                    else:
+                        added += 1
+                        print(f"Added Quote: {quote.text} - Author: {quote.author}")
+                print(f'Added {added} quotes, skipped {len(ids) - added} duplicates, '
+                      f'you can see them using the "art_studio_t list_sql" command')
+                if limiter is not None:
+                    print(limiter)
+            else:
                 print("No data received.")
-        except requests.exceptions.RequestException as err:                                                                                                                                                         
-            print(f"Error fetching quote: {err}")                                                                                                                                                                   
+        except requests.exceptions.RequestException as err:
+            print(f"Error fetching quote: {err}")
+
+    def search(self, query: str, limit: int = 10) -> list[Quote]:
+        """Return quotes found by words of their text, best matches first.
+
+        Args:
+            query (str): words to search for.
+            limit (int, optional): max number of quotes. Defaults to 10.
+
+        Returns:
+            list[Quote]: List of Quote instances.
+        """
+        return [Quote.from_row(row) for row in self._db.search(query, limit)]
+
+    def random(self, n: int = 1, author=None, weights: dict[str, float] | None = None,
+               no_repeat: int = 0) -> list[Quote]:
+        """Return n distinct random quotes by id-range sampling, without ORDER BY RAND().
+
+        Args:
+            n (int, optional): number of quotes. Defaults to 1.
+            author (str, optional): Author name to filter quotes. Defaults to None.
+            weights (dict[str, float] | None, optional): author -> relative weight,
+                authors not in it weigh 1, 0 - never picked. Defaults to None.
+            no_repeat (int, optional): skip quotes served by this object among the
+                last no_repeat ones while others are left. Defaults to 0.
+
+        Returns:
+            list[Quote]: List of Quote instances, fewer than n if the table is smaller.
+        """
+        def sample(k: int, exclude: set[int]) -> list[Quote]:
+            return [Quote.from_row(row) for row in self._db.sample(k, author, exclude)]
+        return _random_quotes(sample, self._recent, n, weights, no_repeat)
 
     def get_latest(self, number) -> list[Quote]:
         """Return the latest 'number' quotes default 5
@@ -298,14 +606,156 @@ class QuoteDBsql:
         Returns:
             list[Quote]: List of Quote instances.
         """        
-        all = self._db.get_latest(number)
-        return [Quote.from_dict(t) for t in all]
+        return [Quote.from_row(row) for row in self._db.get_latest(number)]
 
     def delete_all(self) -> None:
         """Remove all quotes from db mySQL.
         """        
         self._db.delete_all()
 
+    def dedupe(self) -> int:
+        """Remove duplicates among quotes stored before the content hash was added.
+
+        Returns:
+            int: number of removed quotes.
+        """
+        return self._db.dedupe()
+
+    def near_duplicates(self, threshold: float = 0.8, merge: bool = False) -> list[list[Quote]]:
+        """Group quotes with nearly the same text, found by MinHash/LSH.
+
+        Quotes are streamed from a server-side cursor, so the table does not
+        have to fit in memory.
+
+        Args:
+            threshold (float, optional): min similarity of texts, 0..1. Defaults to 0.8.
+            merge (bool, optional): keep the earliest quote of every group and
+                delete the others. Defaults to False.
+
+        Returns:
+            list[list[Quote]]: groups of two or more quotes ordered by id.
+        """
+        clusters = near_duplicate_clusters(((q.id, q.text) for q in self.iter_quotes()), threshold)
+        found = [i for ids in clusters for i in ids]
+        extra = [i for ids in clusters for i in ids[1:]]
+        quotes = {}
+        for start in range(0, len(found), 1000):  # bounded IN lists
+            for row in self._db.read_ids(found[start:start + 1000]):
+                quotes[row.id] = Quote.from_row(row)
+        if merge:
+            for start in range(0, len(extra), 1000):
+                self._db.delete_ids(extra[start:start + 1000])
+        return [[quotes[i] for i in ids if i in quotes] for ids in clusters]
+
+    def migrate(self) -> list[str]:
+        """Create indexes missing in an existing mySQL schema.
+
+        Returns:
+            list[str]: names of created indexes.
+        """
+        return self._db.migrate()
+
+class AsyncQuoteDBsql:
+    """asyncio version of QuoteDBsql, for ingest pipelines and web servers
+    which run many queries concurrently without a thread per request.
+    """
+    def __init__(self, user=None, password=None, host = "localhost", port = 3306,  database = "quotes_db",
+                 url: str | None = None, **pool):
+        """initialize the AsyncQuoteDBsql instance, arguments are the same as of QuoteDBsql.
+
+        Needs an async driver: asyncmy for MySQL, aiosqlite for SQLite.
+
+        Args:
+            user (str, optional): username for the database. Defaults to None.
+            password (str, optional): password for the database. Defaults to None.
+            host (str, optional): hostname for the database. Defaults to "localhost".
+            port (int, optional): port for the database. Defaults to 3306.
+            database (str, optional): database name. Defaults to "quotes_db".
+            url (str | None, optional): SQLAlchemy url, sync drivers are replaced with async ones. Defaults to None.
+            **pool: pool_size, max_overflow, pool_recycle, pool_pre_ping of the engine.
+        """
+        from .db_sql_async import AsyncDBsql
+        self._db = AsyncDBsql(user, password, host, port, database, url=url, **pool)
+
+    async def add_quote_sql(self, quote: Quote) -> int | None:
+        """Add a quote to the database.
+
+        Args:
+            quote (Quote): Quote instance.
+
+        Raises:
+            MissingText: if quote.text is None.
+
+        Returns:
+            int | None: id of the added quote, None if it is a duplicate or on error.
+        """
+        if not quote.text:
+            raise MissingText
+        if quote.author is None:
+            quote.author = ""
+        return await self._db.create(quote.to_dict())
+
+    async def add_quotes(self, quotes: Iterable[Quote]) -> list[int | None]:
+        """Add many quotes in one transaction with a single INSERT.
+
+        Args:
+            quotes (Iterable[Quote]): Quote instances.
+
+        Raises:
+            MissingText: if any quote has no text, nothing is added then.
+
+        Returns:
+            list[int | None]: ids of the added quotes in the same order, None for duplicates.
+        """
+        items = []
+        for quote in quotes:
+            if not quote.text:
+                raise MissingText
+            if quote.author is None:
+                quote.author = ""
+            items.append(quote.to_dict())
+        return await self._db.bulk_create(items)
+
+    async def list_quote(self, author=None, limit: int | None = None, after: int | None = None) -> list[Quote]:
+        """Return a list of quotes ordered by id, filtering is done by the database.
+
+        Args:
+            author (str, optional): Author name to filter quotes. Defaults to None.
+            limit (int | None, optional): max number of quotes. Defaults to None.
+            after (int | None, optional): return quotes with id greater than this. Defaults to None.
+
+        Returns:
+            list[Quote]: List of Quote instances.
+        """
+        return [Quote.from_row(row) for row in await self._db.read_all(author=author, limit=limit, after=after)]
+
+    async def get_latest(self, number=5) -> list[Quote]:
+        """Return the latest 'number' quotes default 5
+
+        Args:
+            number (int, optional): number of quotes to return. Defaults to 5.
+
+        Returns:
+            list[Quote]: List of Quote instances.
+        """
+        return [Quote.from_row(row) for row in await self._db.get_latest(number)]
+
+    async def delete_all(self) -> None:
+        """Remove all quotes from db."""
+        await self._db.delete_all()
+
+    async def migrate(self) -> list[str]:
+        """Create the table and indexes missing in the schema.
+
+        Returns:
+            list[str]: names of created indexes.
+        """
+        return await self._db.migrate()
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        await self._db.dispose()
+
 # todo: uncomment for testing
 # if __name__ == "__main__":
 #     ob = QuoteDB(Path(os.getcwd()))
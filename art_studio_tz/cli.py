@@ -1,12 +1,10 @@
 """Command Line Interface (CLI) for quotes project."""
 import os
 from io import StringIO
-from sqlalchemy.engine import Engine
 import pathlib
-import rich
-from rich.table import Table
 from contextlib import contextmanager
-from typing import List
+from itertools import islice
+from typing import Any, Iterable, List
 
 import art_studio_tz
 
@@ -24,13 +22,16 @@ def version():
 
 @app.command()
 def start(url: str = typer.Option("https://zenquotes.io/api/random", "-u", "--url", help="URL for get quotes, default https://zenquotes.io/api/random"),
-          pause: float = typer.Option(5, "-p", "--pause", help="pause between requests quotes in seconds, default 5 seconds")):
+          pause: float = typer.Option(5, "-p", "--pause", help="pause between requests quotes in seconds, default 5 seconds"),
+          burst: int = typer.Option(1, "-b", "--burst", help="requests allowed without pause, default 1"),
+          concurrency: int = typer.Option(1, "-c", "--concurrency", help="requests in flight, default 1")):
     """Get quote from url and add to db. with pause between requests.
     url - URL for get quotes, default https://zenquotes.io/api/random
     pause - pause between requests quotes in seconds, default 5 seconds"""
-    with quote_db() as db:
+    limiter = art_studio_tz.RateLimiter(1 / pause if pause > 0 else 0, burst)
+    with quote_db(local=True) as db:
         try:
-            db.start(url, pause)
+            db.start(url, pause, limiter, concurrency)
         except art_studio_tz.BadReqest:
             print(f"Could not get quote from {url}")
 
@@ -42,18 +43,28 @@ def list_quote(
     List quotes in db.
     """
     with quote_db() as db:
-        the_quote = db.list_quote(author=author)
-        table = Table(box=rich.box.SIMPLE)
-        table.add_column("ID")
-        table.add_column("TimeStep")
-        table.add_column("Quote")
-        table.add_column("Author")
-        for t in the_quote:
-            author = "" if t.author is None else t.author
-            table.add_row(str(t.id),t.timestep, t.text, author)
-        out = StringIO()
-        rich.print(table, file=out)
-        print(out.getvalue())
+        print_quotes(db.iter_quotes(author=author))
+
+@app.command()
+def search(
+    query: List[str],
+    limit: int = typer.Option(10, "-n", "--limit", help="max number of quotes, default 10")
+):
+    """Find quotes in db containing all given words, best matches first."""
+    with quote_db() as db:
+        print_quotes(db.search(" ".join(query), limit))
+
+@app.command("random")
+def random_quote(
+    number: int = typer.Option(1, "-n", "--number", help="number of quotes, default 1"),
+    author: str = typer.Option(None, "-a", "--author", help="only quotes of this author"),
+    weight: List[str] = typer.Option(None, "-w", "--weight", help="AUTHOR=WEIGHT, relative weight of an author's quotes, default 1, may be repeated"),
+    no_repeat: int = typer.Option(0, "--no-repeat", help="do not repeat quotes among the last N served, kept by the server (QUOTES_SERVER)"),
+):
+    """Show random quotes from db, sampled through the index without reading the whole db."""
+    weights = parse_weights(weight)
+    with quote_db() as db:
+        print_quotes(db.random(number, author, weights, no_repeat))
 
 @app.command()
 def add(
@@ -63,7 +74,8 @@ def add(
     """Add a quote to db."""
     text = " ".join(text) if text else None
     with quote_db() as db:
-        db.add_quote(art_studio_tz.Quote(text=text, author=author))
+        if db.add_quote(art_studio_tz.Quote(text=text, author=author)) is None:
+            print("Quote is already in db")
 
 @app.command()
 def delete(quote_id: int):
@@ -104,49 +116,99 @@ def count():
         print(db.count())
 
 @app.command()
-def get(user: str = typer.Option(..., "-u", "--user", help="Database user"),
-        password: str = typer.Option(..., "-p", "--password", help="Database password"),
+def compact():
+    """Rewrite db file without deleted and old versions of quotes."""
+    with quote_db() as db:
+        print(f"Dropped {db.compact()} old records")
+
+@app.command()
+def dedupe(
+    fuzzy: bool = typer.Option(False, "--fuzzy", help="find quotes with nearly the same text (MinHash/LSH)"),
+    threshold: float = typer.Option(0.8, "-t", "--threshold", help="min similarity of texts for --fuzzy, 0..1, default 0.8"),
+    merge: bool = typer.Option(False, "--merge", help="with --fuzzy keep the earliest quote of every group and remove the others"),
+):
+    """Remove quotes repeating the text and author of an earlier quote (ignoring case and spacing)."""
+    with quote_db() as db:
+        if fuzzy:
+            print_clusters(db.near_duplicates(threshold, merge))
+        else:
+            print(f"Removed {db.dedupe()} duplicates")
+
+@app.command()
+def get(user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+        password: str = typer.Option(None, "-p", "--password", help="Database password"),
         host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
         port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
         database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
         url: str = typer.Option("https://zenquotes.io/api/quotes", "--url", help="URL for get quotes, default https://zenquotes.io/api/random"),
+        rate: float = typer.Option(1, "-r", "--rate", help="max requests per second, 0 - no limit, default 1"),
           ):
     """Get 50 quotes from url and add to mySQL"""
-    with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
+    limiter = art_studio_tz.RateLimiter(rate)
+    with quote_db_sql(user=user, password=password, host=host, port=port, database=database,
+                      local=True) as db_sql:
         try:
-            db_sql.get_some_quotes(url)
+            db_sql.get_some_quotes(url, limiter)
         except art_studio_tz.BadReqest:
             print(f"Could not get quote from {url}")
 
 @app.command()
 def list_sql(
-    user: str = typer.Option(..., "-u", "--user", help="Database user"),
-    password: str = typer.Option(..., "-p", "--password", help="Database password"),
+    user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+    password: str = typer.Option(None, "-p", "--password", help="Database password"),
     host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
     port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
     database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
-    author: str = typer.Option(None, "-a", "--author", help="sort for author")
+    author: str = typer.Option(None, "-a", "--author", help="sort for author"),
+    limit: int = typer.Option(None, "-l", "--limit", help="max number of quotes on a page"),
+    after: int = typer.Option(None, "--after", help="show quotes with id greater than this (next page)"),
 ):
     """
     List quotes in mySQL
     """
     with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
-        the_quote = db_sql.list_quote(author=author)
-        table = Table(box=rich.box.SIMPLE)
-        table.add_column("ID")
-        table.add_column("TimeStep")
-        table.add_column("Quote")
-        table.add_column("Author")
-        for t in the_quote:
-            author = "" if t.author is None else t.author
-            table.add_row(str(t.id), str(t.timestep), t.text, author)
-        out = StringIO()
-        rich.print(table, file=out)
-        print(out.getvalue())
+        printed, last = print_quotes(db_sql.iter_quotes(author=author, limit=limit, after=after))
+        if limit is not None and printed == limit:
+            print(f"Next page: --after {last.id}")
 
 @app.command()
-def delete_all_sql(user: str = typer.Option(..., "-u", "--user", help="Database user"),
-        password: str = typer.Option(..., "-p", "--password", help="Database password"),
+def random_sql(
+    user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+    password: str = typer.Option(None, "-p", "--password", help="Database password"),
+    host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
+    port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
+    database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
+    number: int = typer.Option(1, "-n", "--number", help="number of quotes, default 1"),
+    author: str = typer.Option(None, "-a", "--author", help="only quotes of this author"),
+    weight: List[str] = typer.Option(None, "-w", "--weight", help="AUTHOR=WEIGHT, relative weight of an author's quotes, default 1, may be repeated"),
+    no_repeat: int = typer.Option(0, "--no-repeat", help="do not repeat quotes among the last N served, kept by the server (QUOTES_SERVER)"),
+):
+    """
+    Show random quotes from mySQL, sampled by id ranges instead of ORDER BY RAND()
+    """
+    weights = parse_weights(weight)
+    with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
+        print_quotes(db_sql.random(number, author, weights, no_repeat))
+
+@app.command()
+def search_sql(
+    query: List[str],
+    user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+    password: str = typer.Option(None, "-p", "--password", help="Database password"),
+    host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
+    port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
+    database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
+    limit: int = typer.Option(10, "-n", "--limit", help="max number of quotes, default 10"),
+):
+    """
+    Find quotes in mySQL by words of their text, best matches first
+    """
+    with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
+        print_quotes(db_sql.search(" ".join(query), limit))
+
+@app.command()
+def delete_all_sql(user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+        password: str = typer.Option(None, "-p", "--password", help="Database password"),
         host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
         port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
         database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
@@ -158,10 +220,42 @@ def delete_all_sql(user: str = typer.Option(..., "-u", "--user", help="Database
         except Exception as err:
             print(f"Could not delete quotes in {database} because {err}")
         
+@app.command()
+def dedupe_sql(user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+        password: str = typer.Option(None, "-p", "--password", help="Database password"),
+        host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
+        port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
+        database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
+        fuzzy: bool = typer.Option(False, "--fuzzy", help="find quotes with nearly the same text (MinHash/LSH)"),
+        threshold: float = typer.Option(0.8, "-t", "--threshold", help="min similarity of texts for --fuzzy, 0..1, default 0.8"),
+        merge: bool = typer.Option(False, "--merge", help="with --fuzzy keep the earliest quote of every group and delete the others"),
+        ):
+    """Hash quotes stored in mySQL before duplicate detection and remove the duplicates"""
+    with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
+        if fuzzy:
+            print_clusters(db_sql.near_duplicates(threshold, merge))
+        else:
+            print(f"Removed {db_sql.dedupe()} duplicates")
+
+@app.command()
+def migrate_sql(user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+        password: str = typer.Option(None, "-p", "--password", help="Database password"),
+        host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
+        port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
+        database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
+        ):
+    """Create the table and missing indexes in mySQL, other commands then skip the schema check"""
+    with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
+        created = db_sql.migrate()
+        if created:
+            print(f"Created indexes: {', '.join(created)}")
+        else:
+            print("Schema is up to date")
+
 @app.command()
 def list_latest_5(
-    user: str = typer.Option(..., "-u", "--user", help="Database user"),
-    password: str = typer.Option(..., "-p", "--password", help="Database password"),
+    user: str = typer.Option(None, "-u", "--user", help="Database user, without it the url from QUOTES_DB_URL or quotes.ini is used"),
+    password: str = typer.Option(None, "-p", "--password", help="Database password"),
     host: str = typer.Option("localhost", "-H", "--host", help="Database host, default localhost"),
     port: int = typer.Option(3306, "-P", "--port", help="Database port, default 3306"),
     database: str = typer.Option("quotes_db", "-d", "--database", help="Database name, default quotes_db"),
@@ -171,18 +265,27 @@ def list_latest_5(
     list latest 'number' quotes in mySQL, default 5
     """
     with quote_db_sql(user=user, password=password, host=host, port=port, database=database) as db_sql:
-        the_quote = db_sql.get_latest(number)
-        table = Table(box=rich.box.SIMPLE)
-        table.add_column("ID")
-        table.add_column("TimeStep")
-        table.add_column("Quote")
-        table.add_column("Author")
-        for t in the_quote:
-            author = "" if t.author is None else t.author
-            table.add_row(str(t.id), str(t.timestep), t.text, author)
-        out = StringIO()
-        rich.print(table, file=out)
-        print(out.getvalue())
+        print_quotes(db_sql.get_latest(number))
+
+@app.command()
+def serve(host: str = typer.Option("127.0.0.1", "-H", "--host", help="Loopback interface to listen on, default 127.0.0.1"),
+          port: int = typer.Option(8765, "-P", "--port", help="Port to listen on, default 8765")):
+    """Run a local server which keeps databases open for other commands.
+    Commands use it when QUOTES_SERVER is set, e.g. QUOTES_SERVER=http://127.0.0.1:8765"""
+    from .server import QuoteServer
+
+    try:
+        server = QuoteServer(get_path(), host, port)
+    except (ValueError, OSError) as err:
+        print(f"Error: {err}")
+        raise typer.Exit(1)
+    print(f"Serving quotes on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Server stopped")
+    finally:
+        server.server_close()
 
 @app.callback(invoke_without_command=True)
 def main(ctx: typer.Context):
@@ -192,6 +295,77 @@ def main(ctx: typer.Context):
     if ctx.invoked_subcommand is None:
         list_quote(author=None)
 
+def print_quotes(quotes: Iterable[Any], chunk: int = 100) -> tuple[int, Any]:
+    """Print quotes as a table chunk by chunk, rows show up while they are read.
+
+    Columns have fixed widths so the chunks line up as one table.
+
+    Args:
+        quotes (Iterable[Any]): quotes to print
+        chunk (int, optional): rows rendered at once. Defaults to 100.
+
+    Returns:
+        tuple[int, Any]: number of printed quotes and the last one
+    """
+    import rich
+    from rich.table import Table
+
+    quotes = iter(quotes)
+    printed, last = 0, None
+    while True:
+        rows = list(islice(quotes, chunk))
+        if not rows and printed:
+            break
+        table = Table(box=rich.box.SIMPLE, expand=True, show_header=printed == 0)
+        table.add_column("ID", width=6)
+        table.add_column("TimeStep", width=23)
+        table.add_column("Quote", ratio=1)
+        table.add_column("Author", width=18)
+        for t in rows:
+            author = "" if t.author is None else t.author
+            table.add_row(str(t.id), str(t.timestep), t.text, author)
+        out = StringIO()
+        rich.print(table, file=out)
+        print(out.getvalue(), end="", flush=True)
+        printed += len(rows)
+        if rows:
+            last = rows[-1]
+        if len(rows) < chunk:
+            break
+    return printed, last
+
+def print_clusters(groups: Iterable[list[Any]]) -> None:
+    """print groups of near duplicate quotes, the first quote of a group is the one --merge keeps"""
+    number = 0
+    for number, group in enumerate(groups, 1):
+        print(f"Group {number}:")
+        print_quotes(group)
+    print(f"Found {number} groups of near duplicates")
+
+def parse_weights(values: List[str] | None) -> dict[str, float] | None:
+    """parse AUTHOR=WEIGHT options of random, exit with a message if one is malformed"""
+    weights = {}
+    for value in values or []:
+        author, sep, weight = value.rpartition("=")
+        try:
+            weights[author] = float(weight)
+        except ValueError:
+            sep = ""
+        if not sep:
+            print(f"Error: weight must be AUTHOR=WEIGHT, got {value!r}")
+            raise typer.Exit(1)
+    return weights or None
+
+def local_db(db_path: pathlib.Path):
+    """open the local store chosen by QUOTES_BACKEND, exit with a message if it is unknown"""
+    from art_studio_tz.api import local_db as open_local_db
+
+    try:
+        return open_local_db(db_path)
+    except ValueError as err:
+        print(f"Error: {err}")
+        raise typer.Exit(1)
+
 def get_path():
 
     db_path_env = os.getenv("QUOTES_DB_DIR", "")
@@ -203,18 +377,48 @@ def get_path():
 
 
 @contextmanager
-def quote_db():
+def remote_db(sql: dict[str, Any] | None = None):
+    """Context manager for a thin client of the server from QUOTES_SERVER.
+
+    Args:
+        sql (dict[str, Any] | None, optional): QuoteDBsql connection params,
+            None - the CSV db. Defaults to None.
+
+    Yields:
+        RemoteQuoteDB: RemoteQuoteDB instance
+    """
+    from .server import RemoteQuoteDB
+
+    db = RemoteQuoteDB(os.environ["QUOTES_SERVER"], sql)
+    try:
+        yield db
+    finally:
+        db.close()
+
+@contextmanager
+def quote_db(local: bool = False):
     """Context manager for QuoteDB.
 
+    Args:
+        local (bool, optional): do not use the server from QUOTES_SERVER. Defaults to False.
+
     Yields:
         QuoteDB: QuoteDB instance
     """    
+    if not local and os.getenv("QUOTES_SERVER"):
+        with remote_db() as db:
+            yield db
+        return
     db_path = get_path()
-    db = art_studio_tz.QuoteDB(db_path)
-    yield db
+    db = local_db(db_path)
+    try:
+        yield db
+    finally:
+        db.http.close()
 
 @contextmanager
-def quote_db_sql(user: str, password: str, host: str, port: int, database: str):
+def quote_db_sql(user: str, password: str, host: str, port: int, database: str,
+                 local: bool = False):
     """
     Context manager for QuoteDBsql.
 
@@ -224,13 +428,26 @@ def quote_db_sql(user: str, password: str, host: str, port: int, database: str):
         host (str): hostname for database
         port (int): port for database
         database (str): database name
+        local (bool, optional): do not use the server from QUOTES_SERVER. Defaults to False.
 
     Yields:
         QuoteDBsql: QuoteDBsql instance
     """    
-    db = art_studio_tz.QuoteDBsql(user=user, password=password, host=host, port=port, database=database)
+    if not local and os.getenv("QUOTES_SERVER"):
+        params = dict(user=user, password=password, host=host, port=port, database=database)
+        with remote_db(params) as db:
+            yield db
+        return
+    from sqlalchemy.engine import Engine
+
+    try:
+        db = art_studio_tz.QuoteDBsql(user=user, password=password, host=host, port=port, database=database)
+    except ValueError as err:
+        print(f"Error: {err}")
+        raise typer.Exit(1)
     try:
         yield db
     finally:
+        db.http.close()
         if hasattr(db, "engine") and isinstance(db.engine, Engine):
             db.engine.dispose()
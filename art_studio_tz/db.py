@@ -2,59 +2,498 @@
 DB for the quotes project
 """
 import csv
+import io
+import json
+import mmap
+import os
+import random
+from array import array
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Callable, Collection, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+ENTRY_SIZE = 3 * array('q').itemsize  # one (id, offset, length) triple of the index log
 
 class DB:
     """CSV file based DB class
+
+    The CSV file is append-only: an update appends a new version of the row
+    with the same id and a delete appends a tombstone row with the negated id,
+    the last record for an id wins. ``compact`` rewrites the file without the
+    garbage.
+
+    Two sidecar files live next to the CSV file:
+    ``<prefix>.meta`` - last issued id, number of live and physical records
+    together with the CSV size and mtime they were computed for;
+    ``<prefix>.idx`` - log of (id, byte offset, length) of every record.
+    Both are rebuilt with a single scan when the CSV was changed by someone else.
+
+    Parsed data is cached in memory while the CSV keeps its (size, mtime_ns,
+    inode): meta data, the index and, after read_all, a snapshot of all live
+    rows. Own writes update the caches in place, so repeated reads in a long
+    lived process cost a stat() instead of a parse.
+
+    Several processes may use the same files: writes hold an exclusive
+    flock on ``<prefix>.lock``, reads a shared one, and files which are not
+    appended to are replaced with write-to-temp-and-rename.
+
+    ``search`` keeps a full-text index in ``<prefix>.fts`` (see fts.FtsIndex),
+    it is created on the first search and catches up with the index log on
+    every later one.
+
+    With a ``key`` function rows are unique by their key: creating a row
+    whose key a live row already has is skipped. Keys of live rows are kept
+    in ``<prefix>.keys`` (see sidecar.HashSet), which follows the index log
+    the same way.
     """
-    def __init__(self, db_path: Path, db_file_prefix: str, fieldnames: list[str]):
+    compact_min_garbage = 1000  # do not bother compacting small files
+
+    def __init__(self, db_path: Path, db_file_prefix: str, fieldnames: list[str],
+                 compact_ratio: float | None = 0.5,
+                 key: Callable[[dict[str, Any]], str] | None = None):
         """initialize DB
 
         Args:
             db_path (Path): path to the db directory
             db_file_prefix (str): prefix for the db file name
             fieldnames (list[str]): list of field names (without 'id' field)
-        """        
+            compact_ratio (float | None, optional): compact the file automatically
+                when this share of records is garbage, None disables. Defaults to 0.5.
+            key (Callable[[dict[str, Any]], str] | None, optional): content key of a
+                row, rows with equal keys are duplicates. Defaults to None.
+        """
         self.file = db_path / f"{db_file_prefix}.csv"
+        self.meta_file = db_path / f"{db_file_prefix}.meta"  # high-water mark of ids
+        self.index_file = db_path / f"{db_file_prefix}.idx"  # id -> offset of the row
+        self.lock_file = db_path / f"{db_file_prefix}.lock"
         self.fieldnames = ['id', *fieldnames]  # первая колонка — id
+        self.compact_ratio = compact_ratio
+        self.key = key
+        self._index: dict[int, tuple[int, int]] | None = None
+        self._index_key: tuple[int, int, int] | None = None
+        self._meta_cache: dict[str, int] | None = None
+        self._meta_key: tuple[int, int, int] | None = None
+        self._rows: dict[int, dict[str, Any]] | None = None  # snapshot of live rows
+        self._rows_key: tuple[int, int, int] | None = None
+        self._lock_depth = 0
+        self._fts = None  # fts.FtsIndex, opened by the first search
+        self._keys = None  # sidecar.HashSet, opened by the first create with a key
         if not self.file.exists():
             self.file.parent.mkdir(parents=True, exist_ok=True)
-            with self.file.open('w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-                writer.writeheader()
+            with self._locked(exclusive=True):
+                if not self.file.exists():  # another process may have been first
+                    self._rewrite([], last_id=0)
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False) -> Iterator[None]:
+        """hold a shared or exclusive lock on the lock file
+
+        The lock is re-entrant within one DB object: nested calls run under
+        the outermost lock, writes always take the exclusive one first.
+
+        Args:
+            exclusive (bool, optional): lock for writing. Defaults to False.
+        """
+        if fcntl is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(self.lock_file, 'ab') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth = 1
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _replace_file(path: Path, data: bytes) -> None:
+        """write data to a temporary file and rename it over path"""
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _stat_key(self) -> tuple[int, int, int]:
+        """size, mtime and inode of the CSV file, used to detect external changes
 
-    def _read_all_rows(self) -> list[dict[str, Any]]:
+        Returns:
+            tuple[int, int, int]: (size, mtime_ns, inode)
+        """
+        st = self.file.stat()
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def _encode_row(self, row: dict[str, Any]) -> bytes:
+        """serialize one row exactly as csv.DictWriter writes it to the file"""
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=self.fieldnames).writerow(row)
+        return buf.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _needles(match: dict[str, str]) -> list[bytes]:
+        """bytes a raw record with the matching values contains, quotes doubled as csv writes them"""
+        return [v.replace('"', '""').encode('utf-8') for v in match.values() if v]
+
+    def _decode_row(self, raw: bytes) -> dict[str, Any]:
+        """parse one raw CSV record into a row dictionary"""
+        return dict(zip(self.fieldnames, next(csv.reader([raw.decode('utf-8')]))))
+
+    @staticmethod
+    def _scan_records(mm: mmap.mmap, chunk_size: int = 1 << 20) -> Iterator[tuple[int, int, bytes]]:
+        """split a memory mapped CSV file into records
+
+        The file is scanned in chunks ending at a newline and split with a
+        single ``split`` call per chunk. A record ends at a newline outside of
+        a quoted field, so quotes with line breaks inside stay one record;
+        quotes are only counted in chunks which have any or which continue
+        a quoted field.
+
+        Args:
+            mm (mmap.mmap): mapped file
+            chunk_size (int, optional): bytes scanned at once. Defaults to 1 MiB.
+
+        Yields:
+            tuple[int, int, bytes]: offset and length of every record, the header
+                included, and the first line of the record
+        """
+        size = len(mm)
+        pos = start = 0
+        head = None
+        quotes = 0
+        while pos < size:
+            end = mm.rfind(b'\n', pos, min(pos + chunk_size, size)) + 1
+            if end <= pos:  # no newline in the window: a long record or the tail
+                end = min(pos + chunk_size, size)
+            chunk = mm[pos:end]
+            has_quotes = b'"' in chunk
+            lines = chunk.split(b'\n')
+            tail = lines.pop()  # b'' if the chunk ends with a newline
+            offset = pos
+            for line in lines:
+                if head is None:
+                    head = line
+                offset += len(line) + 1
+                if has_quotes or quotes % 2:
+                    quotes += line.count(b'"')
+                    if quotes % 2:
+                        continue  # newline inside a quoted field
+                    quotes = 0
+                yield start, offset - start, head
+                start, head = offset, None
+            if tail:
+                if head is None:
+                    head = tail
+                quotes += tail.count(b'"')
+            pos = end
+        if start < size:
+            yield start, size - start, head if head is not None else b''
+
+    def _map(self, f: BinaryIO) -> mmap.mmap | None:
+        """map an open CSV file read-only, None if it is empty"""
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_all_rows(self) -> dict[int, dict[str, Any]]:
         """read all rows from the CSV file
 
+        Only the last version of every row is returned, deleted rows are skipped.
+
         Returns:
-            list[dict[str, Any]]: list of dictionaries with row data
-        """        
-        rows = []
+            dict[int, dict[str, Any]]: id -> row data, in order of first appearance
+        """
+        rows = {}
         with self.file.open('r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            return rows
+            for r in csv.DictReader(f):
+                id = int(r['id'])
+                if id < 0:
+                    rows.pop(-id, None)
+                else:
+                    rows[id] = r
+        return rows
+
+    def _snapshot(self) -> dict[int, dict[str, Any]] | None:
+        """Return the cached rows if they are valid for the current CSV file."""
+        if self._rows is not None and self._rows_key == self._stat_key():
+            return self._rows
+        return None
+
+    def _load_meta(self) -> dict[str, int] | None:
+        """read the sidecar meta file
+
+        Returns:
+            dict[str, int] | None: meta data or None if missing or broken
+        """
+        try:
+            return json.loads(self.meta_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self, last_id: int, count: int, records: int) -> tuple[int, int, int]:
+        """persist the last issued id and records count with the current CSV stat
+
+        Args:
+            last_id (int): biggest id ever written to the file
+            count (int): number of live records
+            records (int): number of physical records including old versions and tombstones
+
+        Returns:
+            tuple[int, int, int]: CSV stat the meta data was saved for
+        """
+        key = self._stat_key()
+        meta = {"last_id": last_id, "count": count, "records": records}
+        self._replace_file(self.meta_file, json.dumps(
+            {**meta, "size": key[0], "mtime_ns": key[1], "ino": key[2]}).encode('utf-8'))
+        self._meta_cache, self._meta_key = meta, key
+        return key
+
+    def _meta(self) -> dict[str, int]:
+        """Return meta data which is valid for the current CSV file.
+
+        Returns:
+            dict[str, int]: meta data, rebuilt by a scan if the CSV was changed
+        """
+        key = self._stat_key()
+        if self._meta_cache is not None and self._meta_key == key:
+            return self._meta_cache
+        meta = self._load_meta()
+        if (meta is not None and "records" in meta
+                and (meta.get("size"), meta.get("mtime_ns"), meta.get("ino")) == key):
+            self._meta_cache, self._meta_key = meta, key
+            return meta
+        return self._rebuild(meta.get("last_id", 0) if meta else 0)
+
+    def _rebuild(self, last_id: int) -> dict[str, int]:
+        """scan the CSV file once and rebuild the index and meta sidecars
+
+        Readers may rebuild concurrently under the shared lock, they write the
+        same data and every sidecar is replaced atomically.
+
+        Args:
+            last_id (int): previous high-water mark, ids are never handed out twice
+
+        Returns:
+            dict[str, int]: new meta data
+        """
+        entries = array('q')
+        with self.file.open('rb') as f:
+            mm = self._map(f)
+            if mm is not None:
+                with mm:
+                    records = self._scan_records(mm)
+                    next(records, None)  # header
+                    for offset, length, head in records:
+                        comma = head.find(b',')  # id is never quoted
+                        if comma == -1:
+                            continue  # blank line
+                        entries.extend((int(head[:comma]), offset, length))
+        self._replace_file(self.index_file, entries.tobytes())
+        index = self._replay(entries)
+        last_id = max(last_id, max(map(abs, entries[0::3]), default=0))
+        meta = {"last_id": last_id, "count": len(index), "records": len(entries) // 3}
+        key = self._save_meta(**meta)
+        self._index, self._index_key = index, key
+        return meta
+
+    @staticmethod
+    def _replay(entries: array, index: dict[int, tuple[int, int]] | None = None
+                ) -> dict[int, tuple[int, int]]:
+        """apply index log entries, negative ids are tombstones
+
+        Args:
+            entries (array): flat (id, offset, length) triples
+            index (dict[int, tuple[int, int]] | None, optional): index to update. Defaults to None.
+
+        Returns:
+            dict[int, tuple[int, int]]: id -> (offset, length) of the live version
+        """
+        index = {} if index is None else index
+        for id, offset, length in zip(entries[0::3], entries[1::3], entries[2::3]):
+            if id < 0:
+                index.pop(-id, None)
+            else:
+                index[id] = (offset, length)
+        return index
+
+    def _get_index(self) -> dict[int, tuple[int, int]]:
+        """Return the id -> (offset, length) map for the current CSV file.
+
+        Returns:
+            dict[int, tuple[int, int]]: index, cached while the CSV does not change
+        """
+        key = self._stat_key()
+        if self._index is not None and self._index_key == key:
+            return self._index
+        meta = self._meta()
+        if self._index is not None and self._index_key == key:
+            return self._index  # just rebuilt
+        entries = array('q')
+        try:
+            entries.frombytes(self.index_file.read_bytes())
+        except (OSError, ValueError):
+            entries = array('q')
+        index = self._replay(entries)
+        if len(entries) != 3 * meta["records"] or len(index) != meta["count"]:
+            self._rebuild(meta["last_id"])
+            return self._index
+        self._index, self._index_key = index, key
+        return index
 
-    def create(self, item: dict[str, Any]) -> int:
+    def _rewrite(self, rows: list[dict[str, Any]], last_id: int) -> None:
+        """rewrite the whole CSV file and its sidecars atomically
+
+        The new files are written next to the old ones and renamed over them,
+        so a crash never leaves a half written CSV behind.
+
+        Args:
+            rows (list[dict[str, Any]]): rows to keep
+            last_id (int): high-water mark of ids to keep
+        """
+        entries = array('q')
+        tmp_file = self.file.with_name(f"{self.file.name}.{os.getpid()}.tmp")
+        with tmp_file.open('wb') as f:
+            buf = io.StringIO()
+            csv.DictWriter(buf, fieldnames=self.fieldnames).writeheader()
+            offset = f.write(buf.getvalue().encode('utf-8'))
+            for r in rows:
+                raw = self._encode_row(r)
+                entries.extend((int(r['id']), offset, len(raw)))
+                offset += f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_index = self.index_file.with_name(f"{self.index_file.name}.{os.getpid()}.tmp")
+        tmp_index.write_bytes(entries.tobytes())
+        os.replace(tmp_file, self.file)
+        os.replace(tmp_index, self.index_file)
+        key = self._save_meta(last_id, len(rows), len(rows))
+        self._index, self._index_key = self._replay(entries), key
+        self._rows, self._rows_key = {int(r['id']): r for r in rows}, key
+
+    def _append(self, rows: list[dict[str, Any]], last_id: int, count: int) -> None:
+        """append records to the CSV file and to the index log
+
+        Args:
+            rows (list[dict[str, Any]]): new rows, new versions or tombstones
+            last_id (int): high-water mark of ids after the append
+            count (int): number of live records after the append
+        """
+        before = self._stat_key()
+        records = self._meta()["records"]
+        entries = array('q')
+        chunk = bytearray()
+        raws = []
+        with self.file.open('ab') as f:
+            offset = f.seek(0, io.SEEK_END)
+            for r in rows:
+                raw = self._encode_row(r)
+                entries.extend((int(r['id']), offset + len(chunk), len(raw)))
+                chunk += raw
+                raws.append(raw)
+            f.write(chunk)
+        with self.index_file.open('ab') as f:
+            f.write(entries.tobytes())
+        key = self._save_meta(last_id, count, records + len(rows))
+        if self._index is not None and self._index_key == before:
+            self._replay(entries, self._index)
+            self._index_key = key
+        else:
+            self._index = None
+        if self._rows is not None and self._rows_key == before:
+            for id, raw in zip(entries[0::3], raws):
+                if id < 0:
+                    self._rows.pop(-id, None)
+                else:
+                    self._rows[id] = self._decode_row(raw)  # same values as a re-read
+            self._rows_key = key
+        else:
+            self._rows = None
+        garbage = records + len(rows) - count
+        if (self.compact_ratio is not None and garbage >= self.compact_min_garbage
+                and garbage > self.compact_ratio * (records + len(rows))):
+            self.compact()
+
+    def compact(self) -> int:
+        """Rewrite the file without old versions and tombstones.
+
+        Returns:
+            int: number of dropped garbage records
+        """
+        with self._locked(exclusive=True):
+            meta = self._meta()
+            rows = self._snapshot()
+            self._rewrite(list((rows if rows is not None else self._read_all_rows()).values()),
+                          meta["last_id"])
+            return meta["records"] - meta["count"]
+
+    def _key_set(self):
+        """Return the synced set of keys of live rows, must run under the lock."""
+        from .sidecar import HashSet
+
+        if self._keys is None:
+            self._keys = HashSet(self)
+        self._keys.sync()
+        return self._keys
+
+    def create(self, item: dict[str, Any]) -> int | None:
         """create a new quote record
 
+        The row is appended once with its final id, the file is never re-read.
+
         Args:
             item (dict[str, Any]): dictionary with quote data
 
         Returns:
-            int: new record id
-        """        
-        rows = self._read_all_rows()
-        if rows == []:
-            new_id = 1
-        else:    
-            new_id = max([int(r['id']) for r in rows], default=0) + 1
-        row = {**item, 'id': new_id}
-        with self.file.open('a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            writer.writerow(row)
-        return new_id
+            int | None: new record id, None if a row with the same key exists
+        """
+        with self._locked(exclusive=True):  # the id is taken and written atomically
+            if self.key is not None and self._key_set().existing([self.key(item)]):
+                return None
+            meta = self._meta()
+            new_id = meta["last_id"] + 1
+            self._append([{**item, 'id': new_id}], new_id, meta["count"] + 1)
+            return new_id
+
+    def create_many(self, items: list[dict[str, Any]]) -> list[int | None]:
+        """create many quote records with one append
+
+        Args:
+            items (list[dict[str, Any]]): dictionaries with quote data
+
+        Returns:
+            list[int | None]: new records ids, contiguous, None for items whose
+                key a row or an earlier item already has
+        """
+        if not items:
+            return []
+        with self._locked(exclusive=True):
+            new = items
+            if self.key is not None:
+                keys = [self.key(item) for item in items]
+                seen = self._key_set().existing(set(keys))
+                new = []
+                for key, item in zip(keys, items):
+                    new.append(None if key in seen else item)
+                    seen.add(key)
+            rows = [item for item in new if item is not None]
+            if not rows:
+                return [None] * len(items)
+            meta = self._meta()
+            next_id = meta["last_id"] + 1
+            ids: list[int | None] = []
+            for item in new:
+                ids.append(None if item is None else next_id)
+                next_id += item is not None
+            self._append([{**item, 'id': id} for id, item in zip(ids, new) if item is not None],
+                         next_id - 1, meta["count"] + len(rows))
+            return ids
 
     def read(self, id: int) -> dict[str, Any] | None:
         """read a quote record by id
@@ -64,20 +503,177 @@ class DB:
 
         Returns:
             dict[str, Any] | None: dictionary with record data or None if not found
-        """        
-        rows = self._read_all_rows()
-        for r in rows:
-            if int(r['id']) == id:
-                return r
-        return None
+        """
+        with self._locked():
+            rows = self._snapshot()
+            if rows is not None:
+                row = rows.get(id)
+                return None if row is None else dict(row)
+            entry = self._get_index().get(id)
+            if entry is None:
+                return None
+            offset, length = entry
+            with self.file.open('rb') as f:
+                f.seek(offset)
+                return self._decode_row(f.read(length))
+
+    def iter_rows(self, match: dict[str, str] | None = None) -> Iterator[dict[str, Any]]:
+        """Yield live quote records one by one in id order.
+
+        Rows come from the cached snapshot if there is one, otherwise they are
+        read through the index from the memory mapped file, so superseded
+        versions are never parsed. With ``match`` a record is parsed only if
+        the raw bytes contain every wanted value.
+
+        Args:
+            match (dict[str, str] | None, optional): field -> value the rows
+                must have. Defaults to None.
+
+        The lock is held only while the index is taken and the file is
+        opened: records are never changed in place and rewrites replace the
+        file, so the opened file stays consistent with the index.
+
+        Yields:
+            dict[str, Any]: dictionary with quote data
+        """
+        match = match or {}
+        with self._locked():
+            rows = self._snapshot()
+            if rows is None:
+                entries = list(self._get_index().values())
+                f = self.file.open('rb')
+        if rows is not None:
+            for row in list(rows.values()):
+                if all(row.get(k) == v for k, v in match.items()):
+                    yield row
+            return
+        needles = self._needles(match)
+        with f:
+            mm = self._map(f)
+            if mm is None:
+                return
+            with mm:
+                find = mm.find
+                for offset, length in entries:
+                    end = offset + length
+                    for needle in needles:
+                        if find(needle, offset, end) == -1:
+                            break
+                    else:
+                        row = self._decode_row(mm[offset:end])
+                        if all(row.get(k) == v for k, v in match.items()):
+                            yield row
 
     def read_all(self) -> list[dict[str, Any]]:
         """Read all quote records
 
+        The parsed rows are kept as a snapshot for later reads. The returned
+        dictionaries are shared with the snapshot and must not be modified.
+
         Returns:
             list[dict[str, Any]]: list of dictionary with quote data
-        """        
-        return self._read_all_rows()
+        """
+        with self._locked():
+            rows = self._snapshot()
+            if rows is None:
+                key = self._stat_key()
+                rows = self._read_all_rows()
+                self._rows, self._rows_key = rows, key
+            return list(rows.values())
+
+    def sample(self, k: int, match: dict[str, str] | None = None,
+               exclude: Collection[int] = ()) -> list[dict[str, Any]]:
+        """Return up to k distinct random live records, every record equally likely.
+
+        A random entry of the index log is read by its position and kept if
+        it is the live version of a matching record which is not excluded.
+        Superseded versions and tombstones are rejected, so a record is
+        found in records / count tries on average, which compaction keeps
+        small. The index is not loaded for it: an entry is live when no later
+        entry of the memory mapped log has its id (see _superseded), unless
+        the index is cached anyway. When rejections dominate (a rare author,
+        most records excluded) the rest is picked by reservoir sampling in
+        one pass over iter_rows.
+
+        Args:
+            k (int): number of records
+            match (dict[str, str] | None, optional): field -> value the records
+                must have. Defaults to None.
+            exclude (Collection[int], optional): ids not to return. Defaults to ().
+
+        Returns:
+            list[dict[str, Any]]: records in random order, fewer than k if
+                there are not enough of them
+        """
+        match = match or {}
+        needles = self._needles(match)
+        chosen: dict[int, dict[str, Any]] = {}
+        with self._locked():
+            meta = self._meta()  # rebuilds the log if the CSV was changed by someone else
+            records = meta["records"]
+            if not meta["count"]:
+                return []
+            index = self._index if self._index_key == self._stat_key() else None
+            if index is None and self.index_file.stat().st_size != records * ENTRY_SIZE:
+                index = self._get_index()  # the log is rebuilt from the CSV file
+            tries = min(64 * k + 1024, 8 * records + 64)  # far cheaper than the scan
+            with self.index_file.open('rb') as log, self.file.open('rb') as f, \
+                    mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as entries:
+                while len(chosen) < k and tries:
+                    tries -= 1
+                    position = random.randrange(records)
+                    id, offset, length = array('q', entries[position * ENTRY_SIZE:(position + 1) * ENTRY_SIZE])
+                    if id <= 0 or id in chosen or id in exclude:
+                        continue
+                    if (index.get(id) != (offset, length) if index is not None
+                            else self._superseded(entries, position, id)):
+                        continue
+                    f.seek(offset)
+                    raw = f.read(length)
+                    if not all(needle in raw for needle in needles):
+                        continue
+                    row = self._decode_row(raw)
+                    if all(row.get(key) == value for key, value in match.items()):
+                        chosen[id] = row
+            if len(chosen) < k:
+                need, seen = k - len(chosen), 0
+                extra: list[dict[str, Any]] = []
+                for row in self.iter_rows(match):
+                    id = int(row['id'])
+                    if id in chosen or id in exclude:
+                        continue
+                    seen += 1
+                    if len(extra) < need:
+                        extra.append(row)
+                    elif (j := random.randrange(seen)) < need:
+                        extra[j] = row
+                chosen.update((int(row['id']), dict(row)) for row in extra)
+        rows = list(chosen.values())
+        random.shuffle(rows)
+        return rows
+
+    @staticmethod
+    def _superseded(entries: mmap.mmap, position: int, id: int) -> bool:
+        """Return True if an index log entry after position updates or deletes id.
+
+        The log is searched for the bytes of id and -id in C, hits inside
+        offset or length fields are skipped by their alignment.
+
+        Args:
+            entries (mmap.mmap): memory mapped index log
+            position (int): number of the entry of id
+            id (int): record id
+
+        Returns:
+            bool: True if the entry is not the live version of the record
+        """
+        for needle in (array('q', [id]).tobytes(), array('q', [-id]).tobytes()):
+            at = entries.find(needle, (position + 1) * ENTRY_SIZE)
+            while at != -1:
+                if at % ENTRY_SIZE == 0:
+                    return True
+                at = entries.find(needle, at + 1)
+        return False
 
     def update(self, id: int, mods: dict[str, Any]) -> None:
         """Update a quote record by id
@@ -85,44 +681,79 @@ class DB:
         Args:
             id (int): id of the record to update
             mods (dict[str, Any]): dictionary with fields to update
-        """        
-        rows = self._read_all_rows()
-        changed = False
-        for r in rows:
-            if int(r['id']) == id:
-                for k, v in mods.items():
-                    if v is not None and k in r:
-                        r[k] = v
-                changed = True
-        if changed:
-            with self.file.open('w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
+        """
+        with self._locked(exclusive=True):
+            row = self.read(id)
+            if row is None:
+                return
+            for k, v in mods.items():
+                if v is not None and k in row:
+                    row[k] = v
+            meta = self._meta()
+            self._append([row], meta["last_id"], meta["count"])
 
     def delete(self, id: int) -> None:
         """Delete a quote record by id
 
         Args:
             id (int): id of the record to delete
-        """        
-        rows = [r for r in self._read_all_rows() if int(r['id']) != id]
-        with self.file.open('w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        """
+        with self._locked(exclusive=True):
+            if id not in self._get_index():
+                return
+            meta = self._meta()
+            self._append([{'id': -id}], meta["last_id"], meta["count"] - 1)
 
     def delete_all(self) -> None:
         """Delete all quote records
         """
-        with self.file.open('w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            writer.writeheader()  
+        with self._locked(exclusive=True):
+            self._rewrite([], last_id=0)
+
+    def search(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
+        """Find records containing all words of the query, best matches first.
+
+        Records appended since the previous search are indexed first, after
+        a compact or delete_all the index is rebuilt once.
+
+        Args:
+            query (str): words to search for in text and author
+            limit (int, optional): max number of records. Defaults to 10.
+
+        Returns:
+            list[dict[str, Any]]: dictionaries with quote data ranked by BM25
+        """
+        from .fts import FtsIndex  # sqlite3 is loaded only for search
+
+        with self._locked():
+            if self._fts is None:
+                self._fts = FtsIndex(self)
+            self._fts.sync()
+            return self._fts.search(query, limit)
+
+    def dedupe(self) -> int:
+        """Delete records whose key repeats the key of a record with a smaller id.
+
+        Raises:
+            ValueError: if the DB has no key function
+
+        Returns:
+            int: number of deleted records
+        """
+        if self.key is None:
+            raise ValueError("DB has no key function")
+        with self._locked(exclusive=True):
+            ids = self._key_set().duplicates()
+            if ids:
+                meta = self._meta()
+                self._append([{'id': -id} for id in ids], meta["last_id"], meta["count"] - len(ids))
+            return len(ids)
 
     def count(self) -> int:
         """Get number of records in the DB
 
         Returns:
             int: number of records
-        """        
-        return len(self._read_all_rows())
\ No newline at end of file
+        """
+        with self._locked():
+            return self._meta()["count"]
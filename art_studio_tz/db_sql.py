@@ -1,46 +1,441 @@
 """db_sql.py - SQLAlchemy based DB module"""
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, func, desc
+import configparser
+import json
+import os
+import random
+from pathlib import Path
+
+from sqlalchemy import (URL, create_engine, Column, Engine, Integer, String, DateTime, Index, Row,
+                        Select, bindparam, delete, func, desc, insert, inspect, select, update)
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.exc import SQLAlchemyError
-from typing import Any, Dict, List, Optional, Callable, cast
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from typing import Any, Collection, Dict, Iterator, List, Optional, Callable, Tuple, cast
+
+from .dedupe import HASH_LENGTH, content_hash
 
 Base = declarative_base()
 
+# bump when QuoteModel changes, so cached "schema verified" markers are ignored
+SCHEMA_VERSION = 5
+
+# indexes of older schemas which migrate_schema drops, ix_quotes_author_timestep covers author
+OBSOLETE_INDEXES = ("ix_quotes_author",)
+
+
+def cache_dir() -> Path:
+    """return the directory of cached state, QUOTES_CACHE_DIR or ~/.cache/art_studio_tz"""
+    path = os.getenv("QUOTES_CACHE_DIR")
+    return Path(path) if path else Path.home() / ".cache" / "art_studio_tz"
+
+
+def schema_marker_file() -> Path:
+    """return the file with DSNs whose schema is known to be up to date"""
+    return cache_dir() / "schema_verified.json"
+
+
+POOL_OPTIONS = {"pool_size": int, "max_overflow": int, "pool_recycle": int,
+                "pool_pre_ping": lambda v: str(v).lower() in ("1", "true", "yes", "on")}
+
+
+def sql_config(path: Optional[Path] = None) -> Dict[str, Any]:
+    """Read the database url and pool options.
+
+    Values come from the ``[sql]`` section of an INI file (``path``, env
+    QUOTES_DB_CONFIG or quotes.ini in the current directory) and are
+    overridden by env QUOTES_DB_URL, QUOTES_DB_POOL_SIZE, QUOTES_DB_MAX_OVERFLOW,
+    QUOTES_DB_POOL_RECYCLE and QUOTES_DB_POOL_PRE_PING.
+
+    Args:
+        path (Optional[Path], optional): INI file. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: url and pool options which are set
+    """
+    parser = configparser.ConfigParser()
+    parser.read(path or os.getenv("QUOTES_DB_CONFIG", "quotes.ini"))
+    raw = dict(parser["sql"]) if parser.has_section("sql") else {}
+    for key in ("url", *POOL_OPTIONS):
+        env = os.getenv(f"QUOTES_DB_{key.upper()}")
+        if env:
+            raw[key] = env
+    config: Dict[str, Any] = {}
+    if raw.get("url"):
+        config["url"] = raw["url"]
+    for key, convert in POOL_OPTIONS.items():
+        if raw.get(key):
+            config[key] = convert(raw[key])
+    return config
+
+
+def engine_args(user: Optional[str], password: Optional[str], host: str, port: int,
+                database: str, url: Optional[str], drivername: str = "mysql+pymysql",
+                **options: Any) -> Tuple[Any, Dict[str, Any]]:
+    """Resolve the url and pool options of an engine.
+
+    The url is taken from ``url``, else built for MySQL from ``user`` and
+    ``password``, else read by sql_config. Options which are None come from
+    sql_config too, unset ones keep the SQLAlchemy defaults.
+
+    Raises:
+        ValueError: if neither url nor user is given or configured
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: url and keyword arguments for create_engine
+    """
+    config = sql_config()
+    if url is None and user is not None:
+        url = URL.create(drivername, username=user, password=password,
+                         host=host, port=port, database=database)
+    url = url if url is not None else config.get("url")
+    if url is None:
+        raise ValueError("Database url is not set: pass user and password, "
+                         "set QUOTES_DB_URL or url in the [sql] section of quotes.ini")
+    pool = {k: config[k] if v is None else v for k, v in options.items()
+            if v is not None or k in config}
+    return url, pool
+
+
+def dialect_index(index: Index, dialect: str) -> Index:
+    """Mark an index to be created only on one dialect, by create_all and migrate_schema."""
+    index.info["dialect"] = dialect
+    return index.ddl_if(dialect=dialect)
+
 
 class QuoteModel(Base):
     """SQLAlchemy model for the quotes table."""
     __tablename__ = "quotes"
+    __table_args__ = (
+        Index("ix_quotes_author_timestep", "author", "timestep"),  # latest quotes of an author
+        dialect_index(Index("ix_quotes_text_fulltext", "text", mysql_prefix="FULLTEXT"), "mysql"),
+        {"sqlite_autoincrement": True},  # SQLite never reuses ids of deleted quotes, as MySQL
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     text = Column(String(1024), nullable=False)
     author = Column(String(255), nullable=True)
-    timestep = Column(DateTime(timezone=True), server_default=func.now())  # время создания записи
+    timestep = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # время создания записи
+    # dedupe.content_hash of text and author, NULL for rows stored before it was added
+    content_hash = Column(String(HASH_LENGTH), nullable=True, unique=True, index=True)
+
+
+# read paths select plain rows in the field order of api.Quote, no ORM objects are built
+QUOTE_COLUMNS = (QuoteModel.text, QuoteModel.author, QuoteModel.timestep, QuoteModel.id)
+
+
+def _execute_ddl(bind: Any, statement: str) -> None:
+    """run a DDL statement on an engine or a connection"""
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            conn.exec_driver_sql(statement)
+    else:
+        bind.exec_driver_sql(statement)
+
+
+def migrate_schema(bind: Any) -> List[str]:
+    """Bring an existing schema up to date with QuoteModel.
+
+    create_all skips tables which already exist, so nullable columns and
+    indexes added to the model later have to be created here, and indexes
+    of OBSOLETE_INDEXES are dropped. Indexes of other dialects are skipped.
+
+    Args:
+        bind (Any): engine or connection
+
+    Returns:
+        List[str]: names of created indexes
+    """
+    Base.metadata.create_all(bind)
+    table = QuoteModel.__table__
+    columns = {c["name"] for c in inspect(bind).get_columns(table.name)}
+    quote = bind.dialect.identifier_preparer.quote
+    for column in table.columns:
+        if column.name not in columns:
+            _execute_ddl(bind, f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                               f"{column.type.compile(dialect=bind.dialect)}")
+    existing = {ix["name"] for ix in inspect(bind).get_indexes(QuoteModel.__tablename__)}
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            on_table = f" ON {quote(table.name)}" if bind.dialect.name == "mysql" else ""
+            _execute_ddl(bind, f"DROP INDEX {quote(name)}{on_table}")
+    created = []
+    for index in sorted(QuoteModel.__table__.indexes, key=lambda ix: ix.name):
+        if index.info.get("dialect", bind.dialect.name) != bind.dialect.name:
+            continue
+        if index.name not in existing:
+            index.create(bind)
+            created.append(index.name)
+    return created
+
+
+def existing_hashes(hashes: Any) -> Select:
+    """build SELECT of the given content hashes which are already stored"""
+    return select(QuoteModel.content_hash).where(QuoteModel.content_hash.in_(list(hashes)))
+
+
+def hash_ids(hashes: Any) -> Select:
+    """build SELECT of (content_hash, id) pairs of the given content hashes"""
+    return select(QuoteModel.content_hash, QuoteModel.id).where(QuoteModel.content_hash.in_(list(hashes)))
+
+
+def hashed_rows(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """column values of items with their content_hash, None values are dropped"""
+    return [{**{k: v for k, v in item.items() if v is not None},
+             "content_hash": content_hash(item.get("text"), item.get("author"))} for item in items]
+
+
+def unique_rows(rows: List[Dict[str, Any]], existing: Any) -> List[Optional[Dict[str, Any]]]:
+    """rows in the same order, None for the ones whose hash is stored or repeats an earlier row"""
+    seen = set(existing)
+    unique: List[Optional[Dict[str, Any]]] = []
+    for row in rows:
+        unique.append(None if row["content_hash"] in seen else row)
+        seen.add(row["content_hash"])
+    return unique
+
+
+def backfill_hashes(engine: Engine, batch_size: int = 1000) -> int:
+    """Set content_hash of rows stored without it, delete the ones which are duplicates.
+
+    Rows are processed in id order, one transaction per batch. Of two
+    rows with the same content the one with the smaller id is kept, as
+    DB.dedupe does, also when the later one already has the hash (a row
+    updated to repeat another gets NULL).
+
+    Args:
+        engine (Engine): engine of the database
+        batch_size (int, optional): rows hashed per transaction. Defaults to 1000.
+
+    Returns:
+        int: number of deleted rows
+    """
+    table = QuoteModel.__table__
+    set_hash = update(table).where(table.c.id == bindparam("_id")).values(content_hash=bindparam("_hash"))
+    removed = after = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select(table.c.id, table.c.text, table.c.author)
+                                .where(table.c.content_hash.is_(None), table.c.id > after)
+                                .order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                return removed
+            after = rows[-1].id
+            owners = dict(conn.execute(  # hash -> id of the row which has it
+                select(table.c.content_hash, table.c.id)
+                .where(table.c.content_hash.in_({content_hash(r.text, r.author) for r in rows}))).all())
+            keep, duplicates = [], []
+            for r in rows:
+                row_hash = content_hash(r.text, r.author)
+                owner = owners.get(row_hash)
+                if owner is not None and owner < r.id:
+                    duplicates.append(r.id)
+                    continue
+                if owner is not None:
+                    duplicates.append(owner)  # a later copy, deleted before its hash is taken over
+                owners[row_hash] = r.id
+                keep.append({"_id": r.id, "_hash": row_hash})
+            if duplicates:
+                conn.execute(delete(table).where(table.c.id.in_(duplicates)))
+                removed += len(duplicates)
+            if keep:
+                conn.execute(set_hash, keep)
+
+
+def sample_rows(conn: Any, k: int, filter_by: Optional[Dict[str, Any]] = None,
+                exclude: Collection[int] = (), rounds: int = 4) -> List[Row]:
+    """Pick up to k distinct random quotes, every quote equally likely, without ORDER BY RAND().
+
+    Random ids between MIN(id) and MAX(id) are looked up through the primary
+    key with one ``IN`` query per round, ids left by deletes simply miss.
+    When ids are sparse or few rows match, the rest comes from one
+    ``ORDER BY RANDOM() LIMIT`` query over the matching rows, which the
+    author index narrows down.
+
+    Args:
+        conn (Any): Connection or Session
+        k (int): number of quotes
+        filter_by (Optional[Dict[str, Any]], optional): column -> value the quotes
+            must have. Defaults to None.
+        exclude (Collection[int], optional): ids not to return. Defaults to ().
+        rounds (int, optional): id-range lookups before OFFSET is used. Defaults to 4.
+
+    Returns:
+        List[Row]: rows of (text, author, timestep, id) in random order, fewer
+            than k if there are not enough quotes
+    """
+    table = QuoteModel.__table__
+    where = [table.c[column] == value for column, value in (filter_by or {}).items()]
+    # separate subqueries: SQLite reads MIN and MAX from the primary key only one per SELECT
+    low, high = conn.execute(select(select(func.min(table.c.id)).scalar_subquery(),
+                                    select(func.max(table.c.id)).scalar_subquery())).one()
+    if low is None:
+        return []
+    chosen: Dict[int, Row] = {}
+    for _ in range(rounds):
+        need = k - len(chosen)
+        if need <= 0:
+            break
+        ids = set(random.sample(range(low, high + 1), min(high - low + 1, 2 * need + 8)))
+        ids -= chosen.keys()
+        ids.difference_update(exclude)
+        if not ids:
+            continue
+        rows = conn.execute(select(*QUOTE_COLUMNS).where(table.c.id.in_(ids), *where)).all()
+        random.shuffle(rows)
+        chosen.update((row.id, row) for row in rows[:need])
+    if len(chosen) < k:
+        dialect = conn.get_bind().dialect if hasattr(conn, "get_bind") else conn.dialect
+        shuffled = func.rand() if dialect.name == "mysql" else func.random()
+        skip = chosen.keys() | set(exclude)
+        if skip:
+            where.append(table.c.id.not_in(skip))
+        rest = conn.execute(select(*QUOTE_COLUMNS).where(*where).order_by(shuffled).limit(k - len(chosen)))
+        chosen.update((row.id, row) for row in rest)
+    rows = list(chosen.values())
+    random.shuffle(rows)
+    return rows
+
+
+class SchemaMarker:
+    """Schema verified marker for the DSN of ``self.engine``, used by sync and async handlers."""
+    engine: Any
+
+    def _schema_key(self) -> Optional[str]:
+        """DSN without password, None for databases which do not outlive the engine
+
+        A file database is keyed by its absolute path, so relative SQLite
+        urls used in different directories do not share a marker.
+        """
+        url = self.engine.url
+        if url.database in (None, "", ":memory:"):
+            return None
+        if url.get_backend_name() == "sqlite":
+            url = url.set(database=str(Path(url.database).resolve()))
+        return url.render_as_string(hide_password=True)
+
+    def schema_verified(self) -> bool:
+        """Check the marker file, True if migrate already ran for this DSN and schema version."""
+        key = self._schema_key()
+        if key is None:
+            return False
+        try:
+            markers = json.loads(schema_marker_file().read_text())
+        except (OSError, ValueError):
+            return False
+        return markers.get(key) == SCHEMA_VERSION
+
+    def _write_marker(self, verified: bool) -> None:
+        """add this DSN to the marker file or remove it"""
+        key = self._schema_key()
+        if key is None:
+            return
+        marker = schema_marker_file()
+        try:
+            markers = json.loads(marker.read_text())
+        except (OSError, ValueError):
+            markers = {}
+        if verified:
+            markers[key] = SCHEMA_VERSION
+        elif markers.pop(key, None) is None:
+            return
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            tmp = marker.with_name(f"{marker.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(markers))
+            os.replace(tmp, marker)
+        except OSError:
+            pass  # no cache, the schema is checked again next time
+
+    def _mark_verified(self) -> None:
+        """remember in the marker file that the schema of this DSN is up to date"""
+        self._write_marker(True)
+
+    def _forget_verified(self) -> None:
+        """drop a stale marker, e.g. the table was deleted after migrate"""
+        self._write_marker(False)
+
+
+def table_missing(bind: Any) -> bool:
+    """True if the quotes table does not exist, a marked schema may have been dropped"""
+    return not inspect(bind).has_table(QuoteModel.__tablename__)
+
 
-class DBsql:
+class DBsql(SchemaMarker):
     """SQLAlchemy based database handler
     """
-    def __init__(self, user: str, password: str, host: str, port: int, database: str):
-        db_url = f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}"
-        self.engine = create_engine(db_url, echo=False, future=True)
-        Base.metadata.create_all(self.engine)
+    def __init__(self, user: Optional[str] = None, password: Optional[str] = None,
+                 host: str = "localhost", port: int = 3306, database: str = "quotes_db",
+                 url: Optional[str] = None, pool_size: Optional[int] = None,
+                 max_overflow: Optional[int] = None, pool_recycle: Optional[int] = None,
+                 pool_pre_ping: Optional[bool] = None):
+        """connect to the database, the url and pool options are resolved by engine_args
+
+        Args:
+            user (Optional[str], optional): MySQL user. Defaults to None.
+            password (Optional[str], optional): MySQL password. Defaults to None.
+            host (str, optional): MySQL host. Defaults to "localhost".
+            port (int, optional): MySQL port. Defaults to 3306.
+            database (str, optional): MySQL database. Defaults to "quotes_db".
+            url (Optional[str], optional): any SQLAlchemy url. Defaults to None.
+            pool_size (Optional[int], optional): connections kept in the pool. Defaults to None.
+            max_overflow (Optional[int], optional): connections allowed above pool_size. Defaults to None.
+            pool_recycle (Optional[int], optional): seconds after which a connection is replaced. Defaults to None.
+            pool_pre_ping (Optional[bool], optional): test connections before use. Defaults to None.
+
+        Raises:
+            ValueError: if neither url nor user is given or configured
+        """
+        url, pool = engine_args(user, password, host, port, database, url,
+                                pool_size=pool_size, max_overflow=max_overflow,
+                                pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+        self.engine = create_engine(url, echo=False, future=True, **pool)
         self.Session = sessionmaker(bind=self.engine)
+        if not self.schema_verified():
+            self.migrate()
 
     def _execute(self, func: Callable, commit: bool = True, default=None):
         """
         unified method to handle session lifecycle and errors
         """
-        session = self.Session()
+        for attempt in range(2):
+            session = self.Session()
+            try:
+                result = func(session)
+                if commit:
+                    session.commit()
+                return result
+            except SQLAlchemyError as e:
+                session.rollback()
+                if attempt == 0 and self._recover_schema():
+                    continue
+                print(f"Database error: {e}")
+                return default
+            finally:
+                session.close()
+
+    def _recover_schema(self) -> bool:
+        """after a failed statement: create the schema if its table is gone, True to retry"""
         try:
-            result = func(session)
-            if commit:
-                session.commit()
-            return result
-        except SQLAlchemyError as e:
-            session.rollback()
-            print(f"Database error: {e}")
-            return default
-        finally:
-            session.close()
+            if not table_missing(self.engine):
+                return False
+            self._forget_verified()
+            self.migrate()
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def migrate(self) -> List[str]:
+        """Bring an existing schema up to date with QuoteModel.
+
+        Afterwards the DSN is marked as verified and later connections skip
+        the schema check.
+
+        Returns:
+            List[str]: names of created indexes
+        """
+        created = migrate_schema(self.engine)
+        self._mark_verified()
+        return created
 
     def create(self, item: Dict[str, Any]) -> Optional[int]:
         """create a new quote record
@@ -49,24 +444,177 @@ class DBsql:
             item (Dict[str, Any]): quote data
 
         Returns:
-            Optional[int]: new record id or None if error
+            Optional[int]: new record id or None if error or the same quote is stored
         """        
+        row = hashed_rows([item])[0]
         def _create(session):
-            quote = QuoteModel(**item)
-            session.add(quote)
-            return quote.id
+            if session.scalar(existing_hashes([row["content_hash"]])) is not None:
+                return None
+            return self._insert_row(session, row)
         return self._execute(_create)
 
-    def read_all(self) -> List[Dict[str, Any]]:
-        """Read all quote records
+    @staticmethod
+    def _insert_row(session: Any, row: Dict[str, Any]) -> Optional[int]:
+        """insert one row in a savepoint, None if its content_hash was stored concurrently"""
+        try:
+            with session.begin_nested():
+                return session.execute(insert(QuoteModel).values(row)).inserted_primary_key[0]
+        except IntegrityError:
+            return None
+
+    def _insert_rows(self, session: Any, rows: List[Dict[str, Any]]) -> List[int]:
+        """insert rows with one statement and return their ids in order"""
+        if self.engine.dialect.insert_executemany_returning:
+            stmt = insert(QuoteModel).returning(QuoteModel.id, sort_by_parameter_order=True)
+            return list(session.scalars(stmt, rows))
+        keys = {k for r in rows for k in r}
+        session.execute(insert(QuoteModel.__table__).values([{k: r.get(k) for k in keys} for r in rows]))
+        ids = {h: id for h, id in session.execute(hash_ids(r["content_hash"] for r in rows))}
+        return [ids[r["content_hash"]] for r in rows]
+
+    def bulk_create(self, items: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """create many quote records in one transaction
+
+        Dialects with INSERT ... RETURNING get the ids back directly. MySQL gets
+        a single multi-row INSERT and the ids are selected by the UNIQUE
+        content_hash of the rows, as auto-increment ids of concurrent inserts
+        interleave (innodb_autoinc_lock_mode=2). Quotes whose content_hash
+        is stored or repeats an earlier item are skipped, one SELECT finds them.
+        If another writer stores one of the hashes between the SELECT and the
+        INSERT, the batch is inserted again row by row and only that quote is
+        skipped.
+
+        Args:
+            items (List[Dict[str, Any]]): quotes data
 
         Returns:
-            List[Dict[str, Any]]: list of dictionary with quote data
+            List[Optional[int]]: new records ids in the order of items, None for
+                skipped duplicates, or empty list if error
+        """
+        rows = hashed_rows(items)
+        if not rows:
+            return []
+        def _bulk_create(session):
+            unique = unique_rows(rows, session.scalars(existing_hashes({r["content_hash"] for r in rows})))
+            new = [r for r in unique if r is not None]
+            ids: Iterator[Optional[int]] = iter([])
+            if new:
+                try:
+                    with session.begin_nested():
+                        ids = iter(self._insert_rows(session, new))
+                except IntegrityError:
+                    ids = iter([self._insert_row(session, r) for r in new])
+            return [None if r is None else next(ids) for r in unique]
+        return cast(List[Optional[int]], self._execute(_bulk_create, default=[]))
+
+    @staticmethod
+    def _select(author: Optional[str], limit: Optional[int], after: Optional[int]) -> Select:
+        """build SELECT of quote columns ordered by id with filter and keyset pagination"""
+        stmt = select(*QUOTE_COLUMNS)
+        if author is not None:
+            stmt = stmt.where(QuoteModel.author == author)
+        if after is not None:
+            stmt = stmt.where(QuoteModel.id > after)
+        stmt = stmt.order_by(QuoteModel.id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    def read_all(self, author: Optional[str] = None, limit: Optional[int] = None,
+                 after: Optional[int] = None) -> List[Row]:
+        """Read quote records ordered by id, filtered and paginated in SQL
+
+        Args:
+            author (Optional[str], optional): only quotes of this author. Defaults to None.
+            limit (Optional[int], optional): max number of records. Defaults to None.
+            after (Optional[int], optional): only records with id greater than this,
+                the last id of the previous page. Defaults to None.
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id)
         """        
         def _read_all(session):
-            quotes = session.query(QuoteModel).all()
-            return [{c.name: getattr(q, c.name) for c in q.__table__.columns} for q in quotes]
-        return cast(List[Dict[str, Any]], self._execute(_read_all, commit=False, default=[]))
+            return session.execute(self._select(author, limit, after)).all()
+        return cast(List[Row], self._execute(_read_all, commit=False, default=[]))
+
+    def iter_all(self, author: Optional[str] = None, limit: Optional[int] = None,
+                 after: Optional[int] = None, batch_size: int = 1000) -> Iterator[Row]:
+        """Stream quote records ordered by id
+
+        Rows are fetched from a server-side cursor ``batch_size`` at a time,
+        the session stays open until the iterator is exhausted or closed.
+
+        Args:
+            author (Optional[str], optional): only quotes of this author. Defaults to None.
+            limit (Optional[int], optional): max number of records. Defaults to None.
+            after (Optional[int], optional): only records with id greater than this. Defaults to None.
+            batch_size (int, optional): rows fetched per round trip. Defaults to 1000.
+
+        Yields:
+            Row: row of (text, author, timestep, id)
+        """
+        stmt = self._select(author, limit, after).execution_options(yield_per=batch_size)
+        for attempt in range(2):
+            with self.Session() as session:
+                try:
+                    result = session.execute(stmt)
+                except SQLAlchemyError as e:
+                    if attempt == 0 and self._recover_schema():
+                        continue
+                    print(f"Database error: {e}")
+                    return
+                try:
+                    yield from result
+                except SQLAlchemyError as e:
+                    print(f"Database error: {e}")
+                return
+
+    def read_ids(self, ids: List[int]) -> List[Row]:
+        """Read quote records with the given ids
+
+        Args:
+            ids (List[int]): record ids, missing ones are skipped
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id) ordered by id
+        """
+        if not ids:
+            return []
+        def _read_ids(session):
+            stmt = select(*QUOTE_COLUMNS).where(QuoteModel.id.in_(ids)).order_by(QuoteModel.id)
+            return session.execute(stmt).all()
+        return cast(List[Row], self._execute(_read_ids, commit=False, default=[]))
+
+    def delete_ids(self, ids: List[int]) -> int:
+        """Delete quote records with the given ids in one transaction
+
+        Args:
+            ids (List[int]): record ids
+
+        Returns:
+            int: number of deleted records, 0 if error
+        """
+        if not ids:
+            return 0
+        def _delete_ids(session):
+            return session.execute(delete(QuoteModel).where(QuoteModel.id.in_(ids))).rowcount
+        return cast(int, self._execute(_delete_ids, default=0))
+
+    def sample(self, k: int, author: Optional[str] = None, exclude: Collection[int] = ()) -> List[Row]:
+        """Get up to k distinct random quotes by id-range sampling (see sample_rows)
+
+        Args:
+            k (int): number of quotes
+            author (Optional[str], optional): only quotes of this author. Defaults to None.
+            exclude (Collection[int], optional): ids not to return. Defaults to ().
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id) in random order
+        """
+        filter_by = None if author is None else {"author": author}
+        def _sample(session):
+            return sample_rows(session, k, filter_by, exclude)
+        return cast(List[Row], self._execute(_sample, commit=False, default=[]))
 
     def delete_all(self) -> bool:
         def _delete_all(session):
@@ -74,16 +622,68 @@ class DBsql:
             return True
         return cast(bool, self._execute(_delete_all, default=False))
 
-    def get_latest(self, n: int = 5) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _search(query: str, limit: int, dialect: str) -> Select:
+        """build SELECT of quotes matching the query, by relevance on MySQL"""
+        stmt = select(*QUOTE_COLUMNS)
+        if dialect == "mysql":  # served by the FULLTEXT index
+            score = match(QuoteModel.text, against=query).in_natural_language_mode()
+            return stmt.where(score).order_by(desc(score)).limit(limit)
+        for word in query.split():  # no full-text index, scan for every word
+            stmt = stmt.where(QuoteModel.text.icontains(word, autoescape=True))
+        return stmt.order_by(QuoteModel.id).limit(limit)
+
+    def search(self, query: str, limit: int = 10) -> List[Row]:
+        """Find quotes by words of their text, best matches first
+
+        MySQL ranks matches of the FULLTEXT index ix_quotes_text_fulltext by
+        relevance, other databases return quotes containing every word.
+
+        Args:
+            query (str): words to search for
+            limit (int, optional): max number of quotes. Defaults to 10.
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id)
+        """
+        if not query.split():
+            return []
+        def _search(session):
+            return session.execute(self._search(query, limit, self.engine.dialect.name)).all()
+        return cast(List[Row], self._execute(_search, commit=False, default=[]))
+
+    def dedupe(self, batch_size: int = 1000) -> int:
+        """Delete duplicates among quotes stored before content_hash was added
+
+        New quotes are unique by the UNIQUE index on content_hash, old ones get
+        their hash here batch by batch.
+
+        Args:
+            batch_size (int, optional): rows hashed per transaction. Defaults to 1000.
+
+        Returns:
+            int: number of deleted quotes
+        """
+        try:
+            return backfill_hashes(self.engine, batch_size)
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return 0
+
+    @staticmethod
+    def _latest(n: int) -> Select:
+        """build SELECT of the latest n quotes"""
+        return select(*QUOTE_COLUMNS).order_by(desc(QuoteModel.timestep)).limit(n)
+
+    def get_latest(self, n: int = 5) -> List[Row]:
         """ Get latest n quotes
 
         Args:
             n (int, optional): Number of quotes to get. Defaults to 5.
 
         Returns:
-            List[Dict[str, Any]]: list of dictionary with quote data
+            List[Row]: rows of (text, author, timestep, id)
         """        
         def _latest(session):
-            quotes = session.query(QuoteModel).order_by(desc(QuoteModel.timestep)).limit(n).all()
-            return [{c.name: getattr(q, c.name) for c in q.__table__.columns} for q in quotes]
-        return cast(List[Dict[str, Any]], self._execute(_latest, commit=False, default=[]))
+            return session.execute(self._latest(n)).all()
+        return cast(List[Row], self._execute(_latest, commit=False, default=[]))
@@ -0,0 +1,210 @@
+"""db_sql_async.py - asyncio SQLAlchemy based DB module"""
+import asyncio
+
+from sqlalchemy import Row, delete, insert, make_url
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, cast
+
+from .db_sql import (DBsql, QuoteModel, SchemaMarker, engine_args, existing_hashes, hash_ids,
+                     hashed_rows, migrate_schema, table_missing, unique_rows)
+
+# sync drivers from QUOTES_DB_URL / quotes.ini are replaced with async ones
+ASYNC_DRIVERS = {
+    "mysql": "mysql+asyncmy",
+    "mysql+pymysql": "mysql+asyncmy",
+    "mysql+mysqldb": "mysql+asyncmy",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+class AsyncDBsql(SchemaMarker):
+    """asyncio SQLAlchemy based database handler
+
+    Queries do not block the event loop, so many of them can run concurrently
+    on the connections of the pool. The schema is checked on first use.
+    """
+    def __init__(self, user: Optional[str] = None, password: Optional[str] = None,
+                 host: str = "localhost", port: int = 3306, database: str = "quotes_db",
+                 url: Optional[str] = None, pool_size: Optional[int] = None,
+                 max_overflow: Optional[int] = None, pool_recycle: Optional[int] = None,
+                 pool_pre_ping: Optional[bool] = None):
+        """create the async engine, arguments are the same as of DBsql
+
+        Args:
+            user (Optional[str], optional): MySQL user. Defaults to None.
+            password (Optional[str], optional): MySQL password. Defaults to None.
+            host (str, optional): MySQL host. Defaults to "localhost".
+            port (int, optional): MySQL port. Defaults to 3306.
+            database (str, optional): MySQL database. Defaults to "quotes_db".
+            url (Optional[str], optional): any SQLAlchemy url, sync drivers are
+                replaced with async ones. Defaults to None.
+            pool_size (Optional[int], optional): connections kept in the pool. Defaults to None.
+            max_overflow (Optional[int], optional): connections allowed above pool_size. Defaults to None.
+            pool_recycle (Optional[int], optional): seconds after which a connection is replaced. Defaults to None.
+            pool_pre_ping (Optional[bool], optional): test connections before use. Defaults to None.
+
+        Raises:
+            ValueError: if neither url nor user is given or configured
+        """
+        url, pool = engine_args(user, password, host, port, database, url, "mysql+asyncmy",
+                                pool_size=pool_size, max_overflow=max_overflow,
+                                pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+        url = make_url(url)
+        url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+        self.engine = create_async_engine(url, echo=False, **pool)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self._schema_checked = False
+        self._schema_lock = asyncio.Lock()
+
+    async def _execute(self, func: Callable[[Any], Awaitable[Any]], commit: bool = True, default=None):
+        """
+        unified method to handle session lifecycle and errors
+        """
+        if not self._schema_checked:
+            async with self._schema_lock:  # concurrent first queries check it once
+                if not self._schema_checked and not self.schema_verified():
+                    await self.migrate()
+                self._schema_checked = True
+        for attempt in range(2):
+            async with self.Session() as session:
+                try:
+                    result = await func(session)
+                    if commit:
+                        await session.commit()
+                    return result
+                except SQLAlchemyError as e:
+                    await session.rollback()
+                    if attempt == 0 and await self._recover_schema():
+                        continue
+                    print(f"Database error: {e}")
+                    return default
+
+    async def _recover_schema(self) -> bool:
+        """after a failed statement: create the schema if its table is gone, True to retry"""
+        try:
+            async with self.engine.connect() as conn:
+                if not await conn.run_sync(table_missing):
+                    return False
+            self._forget_verified()
+            await self.migrate()
+            return True
+        except SQLAlchemyError:
+            return False
+
+    async def migrate(self) -> List[str]:
+        """Bring an existing schema up to date with QuoteModel.
+
+        Returns:
+            List[str]: names of created indexes
+        """
+        async with self.engine.begin() as conn:
+            created = await conn.run_sync(migrate_schema)
+        self._schema_checked = True
+        self._mark_verified()
+        return created
+
+    async def create(self, item: Dict[str, Any]) -> Optional[int]:
+        """create a new quote record
+
+        Args:
+            item (Dict[str, Any]): quote data
+
+        Returns:
+            Optional[int]: new record id or None if error or the same quote is stored
+        """
+        row = hashed_rows([item])[0]
+        async def _create(session):
+            if await session.scalar(existing_hashes([row["content_hash"]])) is not None:
+                return None
+            return await self._insert_row(session, row)
+        return await self._execute(_create)
+
+    @staticmethod
+    async def _insert_row(session: Any, row: Dict[str, Any]) -> Optional[int]:
+        """insert one row in a savepoint, None if its content_hash was stored concurrently"""
+        try:
+            async with session.begin_nested():
+                result = await session.execute(insert(QuoteModel).values(row))
+                return result.inserted_primary_key[0]
+        except IntegrityError:
+            return None
+
+    async def _insert_rows(self, session: Any, rows: List[Dict[str, Any]]) -> List[int]:
+        """insert rows with one statement and return their ids in order"""
+        if self.engine.dialect.insert_executemany_returning:
+            stmt = insert(QuoteModel).returning(QuoteModel.id, sort_by_parameter_order=True)
+            return list(await session.scalars(stmt, rows))
+        keys = {k for r in rows for k in r}
+        await session.execute(insert(QuoteModel.__table__).values([{k: r.get(k) for k in keys} for r in rows]))
+        ids = {h: id for h, id in await session.execute(hash_ids(r["content_hash"] for r in rows))}
+        return [ids[r["content_hash"]] for r in rows]
+
+    async def bulk_create(self, items: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """create many quote records in one transaction, see DBsql.bulk_create
+
+        Args:
+            items (List[Dict[str, Any]]): quotes data
+
+        Returns:
+            List[Optional[int]]: new records ids in the order of items, None for
+                skipped duplicates, or empty list if error
+        """
+        rows = hashed_rows(items)
+        if not rows:
+            return []
+        async def _bulk_create(session):
+            stored = await session.scalars(existing_hashes({r["content_hash"] for r in rows}))
+            unique = unique_rows(rows, stored)
+            new = [r for r in unique if r is not None]
+            ids: Iterator[Optional[int]] = iter([])
+            if new:
+                try:
+                    async with session.begin_nested():
+                        ids = iter(await self._insert_rows(session, new))
+                except IntegrityError:  # a hash was stored after the check, skip only that quote
+                    ids = iter([await self._insert_row(session, r) for r in new])
+            return [None if r is None else next(ids) for r in unique]
+        return cast(List[Optional[int]], await self._execute(_bulk_create, default=[]))
+
+    async def read_all(self, author: Optional[str] = None, limit: Optional[int] = None,
+                       after: Optional[int] = None) -> List[Row]:
+        """Read quote records ordered by id, filtered and paginated in SQL
+
+        Args:
+            author (Optional[str], optional): only quotes of this author. Defaults to None.
+            limit (Optional[int], optional): max number of records. Defaults to None.
+            after (Optional[int], optional): only records with id greater than this. Defaults to None.
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id)
+        """
+        async def _read_all(session):
+            return (await session.execute(DBsql._select(author, limit, after))).all()
+        return cast(List[Row], await self._execute(_read_all, commit=False, default=[]))
+
+    async def get_latest(self, n: int = 5) -> List[Row]:
+        """ Get latest n quotes
+
+        Args:
+            n (int, optional): Number of quotes to get. Defaults to 5.
+
+        Returns:
+            List[Row]: rows of (text, author, timestep, id)
+        """
+        async def _latest(session):
+            return (await session.execute(DBsql._latest(n))).all()
+        return cast(List[Row], await self._execute(_latest, commit=False, default=[]))
+
+    async def delete_all(self) -> bool:
+        async def _delete_all(session):
+            await session.execute(delete(QuoteModel))
+            return True
+        return cast(bool, await self._execute(_delete_all, default=False))
+
+    async def dispose(self) -> None:
+        """Close all pooled connections."""
+        await self.engine.dispose()
@@ -0,0 +1,381 @@
+"""db_sqlite.py - local SQLite (WAL) DB module with the interface of db.DB"""
+import os
+import tempfile
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, delete, event, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+
+from .db import DB
+from .db_sql import (QUOTE_COLUMNS, QuoteModel, backfill_hashes, existing_hashes, migrate_schema,
+                     sample_rows, unique_rows)
+from .dedupe import content_hash
+from .fts import TOKENIZE, fts_query
+
+TIMESTEP_FORMAT = '%Y-%m-%d %H:%M:%S %Z'  # as QuoteDB writes it to quotes.csv
+# formats of hand edited or older CSV files, ISO 8601 is tried as well
+LEGACY_TIMESTEP_FORMATS = ('%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y')
+
+# external content FTS5 index of quotes, kept in sync by triggers
+FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(text, author, content='quotes', "
+    f"content_rowid='id', tokenize='{TOKENIZE}')",
+    "CREATE TRIGGER IF NOT EXISTS quotes_fts_ai AFTER INSERT ON quotes BEGIN "
+    "INSERT INTO quotes_fts (rowid, text, author) VALUES (new.id, new.text, new.author); END",
+    "CREATE TRIGGER IF NOT EXISTS quotes_fts_ad AFTER DELETE ON quotes BEGIN "
+    "INSERT INTO quotes_fts (quotes_fts, rowid, text, author) "
+    "VALUES ('delete', old.id, old.text, old.author); END",
+    "CREATE TRIGGER IF NOT EXISTS quotes_fts_au AFTER UPDATE OF text, author ON quotes BEGIN "
+    "INSERT INTO quotes_fts (quotes_fts, rowid, text, author) "
+    "VALUES ('delete', old.id, old.text, old.author); "
+    "INSERT INTO quotes_fts (rowid, text, author) VALUES (new.id, new.text, new.author); END",
+)
+
+SEARCH = text(
+    "SELECT quotes.id, quotes.timestep, quotes.text, quotes.author FROM quotes_fts "
+    "JOIN quotes ON quotes.id = quotes_fts.rowid "
+    "WHERE quotes_fts MATCH :match ORDER BY quotes_fts.rank LIMIT :limit"
+).columns(QuoteModel.id, QuoteModel.timestep, QuoteModel.text, QuoteModel.author)
+
+
+def _set_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL lets readers work while a writer commits, busy_timeout waits for the write lock"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """parse a CSV timestep, datetimes and None are returned as they are
+
+    Besides TIMESTEP_FORMAT ISO 8601 and LEGACY_TIMESTEP_FORMATS are accepted,
+    times without a zone are UTC.
+
+    Raises:
+        ValueError: if value matches none of the formats
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, TIMESTEP_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        for fmt in LEGACY_TIMESTEP_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(f"timestep {value!r} matches none of the known formats") from None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    """format a timestep the way quotes.csv stores it"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).strftime(TIMESTEP_FORMAT)
+
+
+class DBsqlite:
+    """SQLite file based DB class, a drop-in replacement of db.DB
+
+    Uses the quotes table of QuoteModel in ``<prefix>.sqlite3`` in WAL mode,
+    so lookups go through the primary key and indexes and readers do not
+    wait for writers. When the file is created, live rows of an existing
+    ``<prefix>.csv`` are imported once with their ids; the file appears
+    only after a complete import, so a failed one runs again. Text and author are
+    indexed for ``search`` by the FTS5 table quotes_fts. Quotes are unique
+    by content_hash, inserts of duplicates are skipped.
+    """
+    def __init__(self, db_path: Path, db_file_prefix: str = "quotes"):
+        """initialize DBsqlite
+
+        Args:
+            db_path (Path): path to the db directory
+            db_file_prefix (str, optional): prefix for the db file name. Defaults to "quotes".
+        """
+        self.file = db_path / f"{db_file_prefix}.sqlite3"
+        db_path.mkdir(parents=True, exist_ok=True)
+        csv_file = db_path / f"{db_file_prefix}.csv"
+        if not self.file.exists() and csv_file.exists():
+            self._build_from_csv(csv_file)
+        self.engine = create_engine(f"sqlite:///{self.file}", echo=False, future=True)
+        event.listen(self.engine, "connect", _set_pragmas)
+        migrate_schema(self.engine)
+        self._create_fts()
+
+    def _build_from_csv(self, csv_file: Path) -> None:
+        """import csv_file into a temporary file and link it as self.file once it is complete
+
+        If another process links its copy first, this one is dropped.
+
+        Args:
+            csv_file (Path): quotes.csv of QuoteDB
+        """
+        fd, name = tempfile.mkstemp(prefix=f"{self.file.name}.", suffix=".tmp", dir=self.file.parent)
+        os.close(fd)
+        tmp = Path(name)
+        self.engine = create_engine(f"sqlite:///{tmp}", echo=False, future=True)  # no WAL, one file
+        try:
+            migrate_schema(self.engine)
+            self.import_csv(csv_file)
+            self._create_fts()  # after the import, one rebuild is faster than a trigger per row
+            self.engine.dispose()
+            try:
+                os.link(tmp, self.file)
+            except FileExistsError:
+                pass
+        finally:
+            self.engine.dispose()
+            tmp.unlink(missing_ok=True)
+
+    def _create_fts(self) -> None:
+        """create the full-text index and its triggers, existing rows are indexed once"""
+        with self.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'quotes_fts'")).first()
+            for statement in FTS_SCHEMA:
+                conn.exec_driver_sql(statement)
+            if exists is None:
+                conn.exec_driver_sql("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')")
+
+    def import_csv(self, csv_file: Path, batch_size: int = 10_000) -> int:
+        """Copy live rows of a CSV store into the table, ids are kept.
+
+        Duplicates of an earlier row are skipped, as rows with ids another
+        process has already imported. A timestep in an unknown format is
+        stored as NULL with a warning instead of failing the import.
+
+        Args:
+            csv_file (Path): quotes.csv of QuoteDB
+            batch_size (int, optional): rows inserted at once. Defaults to 10_000.
+
+        Returns:
+            int: number of imported rows
+        """
+        source = DB(csv_file.parent, csv_file.stem, ["timestep", "text", "author"],
+                    compact_ratio=None)
+        stmt = insert(QuoteModel.__table__).on_conflict_do_nothing().returning(QuoteModel.id)
+        imported = 0
+        with self.engine.begin() as conn:
+            batch = []
+            for row in source.iter_rows():
+                try:
+                    batch.append(self._new_row(row))
+                except ValueError as e:  # the id is checked again, only the timestep may be dropped
+                    warnings.warn(f"quote {row.get('id')} imported without timestep: {e}")
+                    batch.append(self._new_row({**row, "timestep": None}))
+                if len(batch) >= batch_size:
+                    imported += len(conn.execute(stmt, batch).all())
+                    batch = []
+            if batch:
+                imported += len(conn.execute(stmt, batch).all())
+        return imported
+
+    @staticmethod
+    def _to_values(item: Dict[str, Any]) -> Dict[str, Any]:
+        """column values of a row, as DB takes and returns them"""
+        values = {k: v for k, v in item.items() if k in QuoteModel.__table__.c}
+        if "timestep" in values:
+            values["timestep"] = _to_datetime(values["timestep"])
+        if values.get("id") is not None:
+            values["id"] = int(values["id"])
+        return values
+
+    @classmethod
+    def _new_row(cls, item: Dict[str, Any]) -> Dict[str, Any]:
+        """column values of a new row with its content_hash"""
+        values = cls._to_values(item)
+        values["content_hash"] = content_hash(item.get("text"), item.get("author"))
+        return values
+
+    @staticmethod
+    def _to_row(row: Any) -> Dict[str, Any]:
+        """row dictionary in the shape db.DB returns"""
+        return {"id": row.id, "timestep": _to_text(row.timestep), "text": row.text, "author": row.author}
+
+    def create(self, item: Dict[str, Any]) -> Optional[int]:
+        """create a new quote record
+
+        Args:
+            item (Dict[str, Any]): dictionary with quote data
+
+        Returns:
+            Optional[int]: new record id, None if the same quote is stored
+        """
+        return self.create_many([item])[0]
+
+    def create_many(self, items: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """create many quote records in one transaction
+
+        Args:
+            items (List[Dict[str, Any]]): dictionaries with quote data
+
+        Returns:
+            List[Optional[int]]: new records ids, None for duplicates of a stored
+                quote or an earlier item
+        """
+        if not items:
+            return []
+        rows = [self._new_row({**item, "id": None}) for item in items]
+        # a conflict would use up an AUTOINCREMENT id, so stored hashes are filtered first
+        stmt = (insert(QuoteModel.__table__).on_conflict_do_nothing()
+                .returning(QuoteModel.id, QuoteModel.content_hash))
+        with self.engine.begin() as conn:
+            unique = unique_rows(rows, conn.scalars(existing_hashes({r["content_hash"] for r in rows})))
+            new = [r for r in unique if r is not None]
+            ids = dict((h, id) for id, h in conn.execute(stmt, new)) if new else {}
+        return [None if r is None else ids.get(r["content_hash"]) for r in unique]
+
+    def read(self, id: int) -> Optional[Dict[str, Any]]:
+        """read a quote record by id
+
+        Args:
+            id (int): record id
+
+        Returns:
+            Optional[Dict[str, Any]]: dictionary with record data or None if not found
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*QUOTE_COLUMNS).where(QuoteModel.id == id)).first()
+        return None if row is None else self._to_row(row)
+
+    def iter_rows(self, match: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield live quote records one by one in id order.
+
+        Args:
+            match (Optional[Dict[str, str]], optional): field -> value the rows
+                must have, filtered in SQL. Defaults to None.
+
+        Yields:
+            Dict[str, Any]: dictionary with quote data
+        """
+        stmt = select(*QUOTE_COLUMNS)
+        for k, v in (match or {}).items():
+            stmt = stmt.where(QuoteModel.__table__.c[k] == v)
+        stmt = stmt.order_by(QuoteModel.id).execution_options(yield_per=1000)
+        with self.engine.connect() as conn:
+            for row in conn.execute(stmt):
+                yield self._to_row(row)
+
+    def sample(self, k: int, match: Optional[Dict[str, str]] = None,
+               exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+        """Return up to k distinct random records by id-range sampling (see db_sql.sample_rows)
+
+        Args:
+            k (int): number of records
+            match (Optional[Dict[str, str]], optional): field -> value the records
+                must have. Defaults to None.
+            exclude (Collection[int], optional): ids not to return. Defaults to ().
+
+        Returns:
+            List[Dict[str, Any]]: dictionaries with quote data in random order
+        """
+        with self.engine.connect() as conn:
+            return [self._to_row(row) for row in sample_rows(conn, k, match, exclude)]
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        """Read all quote records
+
+        Returns:
+            List[Dict[str, Any]]: list of dictionary with quote data
+        """
+        return list(self.iter_rows())
+
+    def update(self, id: int, mods: Dict[str, Any]) -> None:
+        """Update a quote record by id, a missing id is ignored like in db.DB
+
+        If the new content repeats another quote, content_hash is cleared and
+        the next dedupe deletes the one with the greater id.
+
+        Args:
+            id (int): id of the record to update
+            mods (Dict[str, Any]): dictionary with fields to update
+        """
+        values = self._to_values({k: v for k, v in mods.items() if v is not None and k != "id"})
+        if not values:
+            return
+        with self.engine.begin() as conn:
+            row = conn.execute(select(QuoteModel.text, QuoteModel.author).where(QuoteModel.id == id)).first()
+            if row is None:
+                return
+            new_hash = content_hash(values.get("text", row.text), values.get("author", row.author))
+            taken = conn.scalar(select(QuoteModel.id).where(QuoteModel.content_hash == new_hash,
+                                                            QuoteModel.id != id))
+            values["content_hash"] = None if taken is not None else new_hash
+            conn.execute(update(QuoteModel.__table__).where(QuoteModel.id == id).values(values))
+
+    def delete(self, id: int) -> None:
+        """Delete a quote record by id
+
+        Args:
+            id (int): id of the record to delete
+        """
+        with self.engine.begin() as conn:
+            conn.execute(delete(QuoteModel.__table__).where(QuoteModel.id == id))
+
+    def delete_all(self) -> None:
+        """Delete all quote records, ids start from 1 again like in db.DB
+        """
+        with self.engine.begin() as conn:
+            conn.execute(delete(QuoteModel.__table__))
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"),
+                         {"name": QuoteModel.__tablename__})
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Find records containing all words of the query, best matches first.
+
+        Args:
+            query (str): words to search for in text and author
+            limit (int, optional): max number of records. Defaults to 10.
+
+        Returns:
+            List[Dict[str, Any]]: dictionaries with quote data ranked by BM25
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        with self.engine.connect() as conn:
+            return [self._to_row(row) for row in conn.execute(SEARCH, {"match": match, "limit": limit})]
+
+    def dedupe(self) -> int:
+        """Delete duplicates among quotes stored before content_hash was added
+
+        Returns:
+            int: number of deleted quotes
+        """
+        return backfill_hashes(self.engine)
+
+    def count(self) -> int:
+        """Get number of records in the DB
+
+        Returns:
+            int: number of records
+        """
+        with self.engine.connect() as conn:
+            return conn.scalar(select(func.count()).select_from(QuoteModel.__table__))
+
+    def compact(self) -> int:
+        """Checkpoint the WAL and VACUUM the file.
+
+        Returns:
+            int: always 0, SQLite keeps no old versions of rows
+        """
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.exec_driver_sql("VACUUM")
+        return 0
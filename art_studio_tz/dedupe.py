@@ -0,0 +1,194 @@
+"""dedupe.py - duplicate detection of quotes: exact by content hash, near by MinHash/LSH"""
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+import unicodedata
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Iterable
+
+HASH_LENGTH = 32  # hex digits of content_hash, the width of QuoteModel.content_hash
+
+
+def normalize(value: str | None) -> str:
+    """Normalize text for comparison: unicode compatibility form, case folded, single spaces.
+
+    Args:
+        value (str | None): text or author
+
+    Returns:
+        str: normalized text, "" for None
+    """
+    if not value:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+
+def content_hash(text: str | None, author: str | None) -> str:
+    """Hash of normalized text and author, equal for quotes which differ only in case and spacing.
+
+    Args:
+        text (str | None): quote text
+        author (str | None): quote author
+
+    Returns:
+        str: 128 bit BLAKE2b digest in hex
+    """
+    data = f"{normalize(text)}\x1f{normalize(author)}".encode("utf-8")
+    return hashlib.blake2b(data, digest_size=HASH_LENGTH // 2).hexdigest()
+
+
+def row_hash(row: dict[str, Any]) -> str:
+    """content_hash of a row dictionary, the key function of the quotes DB"""
+    return content_hash(row.get("text"), row.get("author"))
+
+
+_PRIME = (1 << 31) - 1  # modulus of the universal hash functions of MinHash
+_SQL_VARIABLES = 500  # ids per IN (...) query, below SQLITE_MAX_VARIABLE_NUMBER of old builds
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+class MinHash:
+    """MinHash signatures of quote texts over character shingles.
+
+    The text is normalized and stripped of punctuation, so quotes which
+    differ in punctuation, case or spacing get equal signatures. The share
+    of equal values of two signatures estimates the Jaccard similarity of
+    the shingle sets.
+    """
+    def __init__(self, num_perm: int = 32, shingle_size: int = 5, seed: int = 1):
+        """choose the hash functions
+
+        Args:
+            num_perm (int, optional): values in a signature. Defaults to 32.
+            shingle_size (int, optional): characters in a shingle. Defaults to 5.
+            seed (int, optional): seed of the hash functions. Defaults to 1.
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.perms = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(num_perm)]
+
+    def shingles(self, text: str | None) -> set[int]:
+        """Return crc32 hashes of the overlapping character shingles of the normalized text."""
+        text = " ".join(_PUNCTUATION.sub(" ", normalize(text)).split())
+        k = self.shingle_size
+        if len(text) <= k:
+            return {zlib.crc32(text.encode("utf-8"))}
+        return {zlib.crc32(text[i:i + k].encode("utf-8")) for i in range(len(text) - k + 1)}
+
+    def signature(self, text: str | None) -> array:
+        """Return the MinHash signature of a text.
+
+        Args:
+            text (str | None): quote text
+
+        Returns:
+            array: num_perm minimal hash values
+        """
+        xs = self.shingles(text)
+        return array('q', [min([(a * x + b) % _PRIME for x in xs]) for a, b in self.perms])
+
+    @staticmethod
+    def similarity(sig1: array, sig2: array) -> float:
+        """Return the estimated Jaccard similarity of two signatures."""
+        return sum(x == y for x, y in zip(sig1, sig2)) / len(sig1)
+
+
+def near_duplicate_clusters(items: Iterable[tuple[int, str | None]], threshold: float = 0.8,
+                            num_perm: int = 32, bands: int = 8, batch_size: int = 10_000,
+                            tmp_dir: str | None = None) -> list[list[int]]:
+    """Group ids of texts which are near duplicates of each other.
+
+    Items are streamed once: signatures and LSH buckets (``bands`` slices
+    of the signature) go to a temporary SQLite file, so memory does not
+    grow with the store. Only ids sharing a bucket are compared, and a pair
+    is joined when the estimated similarity reaches ``threshold``. Clusters
+    are connected components of joined pairs. An id is compared with the
+    members of a cluster only until one of them joins it and never with
+    its own cluster, so a bucket of m copies of one text costs m - 1
+    comparisons.
+
+    Args:
+        items (Iterable[tuple[int, str | None]]): (id, text) pairs
+        threshold (float, optional): min Jaccard similarity of shingles. Defaults to 0.8.
+        num_perm (int, optional): values in a signature. Defaults to 32.
+        bands (int, optional): LSH bands, num_perm must be divisible by it. Defaults to 8.
+        batch_size (int, optional): rows written to the temporary file at once. Defaults to 10_000.
+        tmp_dir (str | None, optional): directory of the temporary file. Defaults to None.
+
+    Returns:
+        list[list[int]]: clusters of two or more ids, ids and clusters in ascending order
+    """
+    import sqlite3
+    import tempfile
+
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    rows = num_perm // bands
+    minhash = MinHash(num_perm)
+    parent: dict[int, int] = {}  # union-find over ids which have near duplicates
+
+    def find(id: int) -> int:
+        root = id
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while id != root:
+            parent[id], id = root, parent.get(id, id)
+        return root
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        conn = sqlite3.connect(Path(tmp) / "lsh.sqlite3")
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE sig (id INTEGER PRIMARY KEY, sig BLOB)")
+            conn.execute("CREATE TABLE bucket (key INTEGER, id INTEGER)")
+            batch: list[tuple[int, array]] = []
+
+            def flush() -> None:
+                conn.executemany("INSERT INTO sig VALUES (?, ?)", ((id, s.tobytes()) for id, s in batch))
+                conn.executemany("INSERT INTO bucket VALUES (?, ?)",
+                                 ((hash((band, *s[band * rows:(band + 1) * rows])), id)
+                                  for id, s in batch for band in range(bands)))
+                batch.clear()
+
+            for id, text in items:
+                batch.append((id, minhash.signature(text)))
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+            conn.commit()
+            candidates = conn.execute(
+                "SELECT group_concat(id) FROM bucket GROUP BY key HAVING count(*) > 1")
+            for (ids,) in candidates:
+                ids = sorted(int(i) for i in ids.split(","))
+                sigs = {}
+                for start in range(0, len(ids), _SQL_VARIABLES):
+                    chunk = ids[start:start + _SQL_VARIABLES]
+                    for id, blob in conn.execute(
+                            f"SELECT id, sig FROM sig WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                        sigs[id] = array('q')
+                        sigs[id].frombytes(blob)
+                groups: dict[int, list[int]] = {}  # root -> ids of the bucket in its cluster
+                for b in ids:
+                    root_b = find(b)
+                    members = groups.pop(root_b, [])
+                    members.append(b)
+                    for root_a in list(groups):
+                        if any(MinHash.similarity(sigs[a], sigs[b]) >= threshold for a in groups[root_a]):
+                            root = min(root_a, root_b)
+                            parent[root] = root
+                            parent[max(root_a, root_b)] = root
+                            members += groups.pop(root_a)
+                            root_b = root
+                    groups[root_b] = members
+        finally:
+            conn.close()
+    clusters: dict[int, list[int]] = {}
+    for id in parent:
+        clusters.setdefault(find(id), []).append(id)
+    return sorted(sorted(ids) for ids in clusters.values())
@@ -0,0 +1,74 @@
+"""fts.py - full-text index of the CSV DB kept in an SQLite FTS5 sidecar"""
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from .sidecar import LogSidecar
+
+# case and accent insensitive words, the same tokenizer is used by DBsqlite
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+
+def fts_query(query: str) -> str | None:
+    """Turn user input into an FTS5 query.
+
+    Every word becomes a quoted phrase, so FTS5 operators and punctuation in
+    the input are never parsed as syntax and all words must match.
+
+    Args:
+        query (str): words to search for
+
+    Returns:
+        str | None: FTS5 MATCH expression, None if there are no words
+    """
+    words = [w.replace('"', '') for w in query.split()]
+    words = [w for w in words if w]
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words)
+
+
+class FtsIndex(LogSidecar):
+    """Inverted index of the CSV DB in ``<prefix>.fts``, an SQLite FTS5 table.
+
+    Follows the index log of the DB (see LogSidecar), search ranks matches
+    with BM25.
+    """
+    suffix = ".fts"
+    search_fields = ("text", "author")  # other fields are stored, not indexed
+
+    def _create(self) -> None:
+        """create the FTS5 table, fields of the DB are its columns"""
+        self.fields = self.db.fieldnames[1:]
+        columns = ", ".join(f if f in self.search_fields else f"{f} UNINDEXED" for f in self.fields)
+        self.conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS records USING fts5({columns}, "
+                          f"tokenize='{TOKENIZE}')")
+
+    def _reset(self) -> None:
+        self.conn.execute("DELETE FROM records")
+
+    def _insert(self, rows: Iterable[tuple[int, dict[str, Any]]]) -> None:
+        sql = (f"INSERT INTO records (rowid, {', '.join(self.fields)}) "
+               f"VALUES ({', '.join('?' * (len(self.fields) + 1))})")
+        self.conn.executemany(sql, ((id, *(row.get(f) for f in self.fields)) for id, row in rows))
+
+    def _remove(self, id: int) -> None:
+        self.conn.execute("DELETE FROM records WHERE rowid = ?", (id,))
+
+    def search(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
+        """Find rows containing all words of the query, best matches first.
+
+        Args:
+            query (str): words to search for
+            limit (int, optional): max number of rows. Defaults to 10.
+
+        Returns:
+            list[dict[str, Any]]: rows in the shape DB.read returns them
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        cursor = self.conn.execute(
+            f"SELECT rowid, {', '.join(self.fields)} FROM records "
+            f"WHERE records MATCH ? ORDER BY rank LIMIT ?", (match, limit))
+        return [dict(zip(self.db.fieldnames, (str(r[0]), *r[1:]))) for r in cursor]
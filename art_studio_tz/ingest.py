@@ -0,0 +1,144 @@
+"""
+Concurrent ingest engine for the quotes project
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import requests
+
+from .api import Quote
+from .net import HttpClient, RateLimiter
+
+
+class Ingest:
+    """Fetch quotes with several concurrent requests and store them in batches.
+
+    ``concurrency`` fetcher tasks share one rate limiter and push quotes into a
+    bounded queue, a single writer task drains it and stores the quotes with
+    ``add_quotes`` of any backend (QuoteDB or QuoteDBsql). Requests run in
+    a pool of ``concurrency`` worker threads, so a slow response only holds
+    up its own fetcher. Quotes the backend skips as duplicates are counted
+    in ``duplicates``; failed requests and batches the backend could not
+    store are counted in ``errors``.
+    """
+    def __init__(self, db: Any, url: str, concurrency: int = 4,
+                 limiter: RateLimiter | None = None, batch_size: int = 50,
+                 queue_size: int = 500, http: HttpClient | None = None):
+        """initialize the Ingest engine
+
+        Args:
+            db (Any): API object with add_quotes method
+            url (str): url to get quotes from
+            concurrency (int, optional): number of requests in flight. Defaults to 4.
+            limiter (RateLimiter | None, optional): rate limit for all fetchers. Defaults to None.
+            batch_size (int, optional): max quotes stored with one add_quotes call. Defaults to 50.
+            queue_size (int, optional): max quotes waiting for the writer. Defaults to 500.
+            http (HttpClient | None, optional): client with a pool for all fetchers,
+                by default one sized for concurrency. Defaults to None.
+        """
+        self.db = db
+        self.url = url
+        self.concurrency = max(concurrency, 1)
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.http = http if http is not None else HttpClient(pool_size=self.concurrency)
+        self.added = 0
+        self.duplicates = 0
+        self.errors = 0
+        self._left: int | None = None
+        self._executor: ThreadPoolExecutor | None = None  # threads of the fetchers, set by run
+
+    def _claim(self) -> bool:
+        """take a slot for one more request, False when the limit is reached"""
+        if self._left is None:
+            return True
+        if self._left <= 0:
+            return False
+        self._left -= 1
+        return True
+
+    async def _fetcher(self, queue: asyncio.Queue) -> None:
+        """request quotes until stopped and put them into the queue"""
+        while self._claim():
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.http.fetch_quotes, self.url, self.limiter)
+            except requests.exceptions.RequestException as e:
+                self.errors += 1
+                print(f"Error fetching quote: {e}")
+                continue
+            if not data:
+                print("No data received.")
+                continue
+            for item in data:
+                if not item.get("q"):  # add_quotes would reject the whole batch
+                    print("Skipped quote without text.")
+                    continue
+                await queue.put(Quote(text=item["q"], author=item.get("a")))
+
+    async def _writer(self, queue: asyncio.Queue) -> None:
+        """store quotes from the queue in batches until None is received"""
+        done = False
+        while not done:
+            batch = []
+            item = await queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            done = item is None
+            if batch:
+                try:
+                    ids = await asyncio.to_thread(self.db.add_quotes, batch)
+                except Exception as e:  # MissingText, database errors: drop the batch, keep going
+                    self.errors += 1
+                    print(f"Error storing {len(batch)} quotes: {e!r}")
+                    continue
+                if len(ids) != len(batch):  # QuoteDBsql returns [] on a database error
+                    self.errors += 1
+                    print(f"Error storing {len(batch)} quotes")
+                    continue
+                for quote, quote_id in zip(batch, ids):
+                    if quote_id is None:
+                        self.duplicates += 1
+                        print(f"Skipped duplicate: {quote.text} - Author: {quote.author}")
+                    else:
+                        self.added += 1
+                        print(f"Added Quote: {quote.text} - Author: {quote.author}")
+                print(f"Added {self.added} quotes, skipped {self.duplicates} duplicates")
+                if self.limiter is not None:
+                    print(self.limiter)
+
+    async def run(self, max_requests: int | None = None) -> int:
+        """Run fetchers and the writer.
+
+        Args:
+            max_requests (int | None, optional): stop after this many requests,
+                None - run until cancelled. Defaults to None.
+
+        Returns:
+            int: number of added quotes
+        """
+        self._left = max_requests
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        writer = asyncio.create_task(self._writer(queue))
+        fetchers = [asyncio.create_task(self._fetcher(queue)) for _ in range(self.concurrency)]
+        fetching = asyncio.gather(*fetchers)
+        try:
+            # a dead writer would leave the fetchers blocked on the full queue
+            await asyncio.wait([fetching, writer], return_when=asyncio.FIRST_COMPLETED)
+            if not writer.done():
+                await fetching
+        finally:
+            for task in fetchers:
+                task.cancel()
+            await asyncio.gather(*fetchers, return_exceptions=True)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if not writer.done():
+                await queue.put(None)  # the writer stores what is left and stops
+            await writer
+        return self.added
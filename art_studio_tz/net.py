@@ -0,0 +1,146 @@
+"""
+Network layer for the quotes project: requests to the free quotes APIs
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import requests
+
+
+class RateLimiter:
+    """Token bucket rate limiter.
+
+    The bucket holds up to ``burst`` tokens and is refilled with ``rate``
+    tokens per second, every request takes one token.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        """initialize the RateLimiter
+
+        Args:
+            rate (float): requests per second, 0 or less means no limit
+            burst (int, optional): how many requests may go without waiting. Defaults to 1.
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.waited = 0.0  # seconds spent waiting for the last token
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """add tokens for the time passed since the last refill"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        """Return the number of tokens available right now."""
+        with self._lock:
+            if self.rate > 0:
+                self._refill()
+            return self._tokens
+
+    def acquire(self) -> float:
+        """Take one token, wait for it if the bucket is empty.
+
+        Returns:
+            float: seconds spent waiting
+        """
+        if self.rate <= 0:
+            self.waited = 0.0
+            return self.waited
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        self.waited = wait
+        return wait
+
+    def __str__(self) -> str:
+        if self.rate <= 0:
+            return "Rate limit: off"
+        return (f"Rate limit: {self.rate:g} req/s, burst {self.burst}, "
+                f"tokens {max(self.tokens, 0):.1f}, waited {self.waited:.2f}s")
+
+
+class HttpClient:
+    """HTTP client for the upstream quotes APIs.
+
+    Owns one requests.Session, so connections are kept alive and reused
+    between requests. Every request has connect/read timeouts, and 429/5xx
+    answers and connection errors are retried with exponential backoff.
+    """
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 10, timeout: tuple[float, float] = (3.05, 10),
+                 retries: int = 3, backoff: float = 0.5):
+        """initialize the HttpClient
+
+        Args:
+            pool_size (int, optional): max kept-alive connections per host. Defaults to 10.
+            timeout (tuple[float, float], optional): connect and read timeouts in seconds. Defaults to (3.05, 10).
+            retries (int, optional): retries of failed requests. Defaults to 3.
+            backoff (float, optional): backoff factor between retries in seconds. Defaults to 0.5.
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session: requests.Session | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Return the session, it is created on first use."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._make_session()
+            return self._session
+
+    def _make_session(self) -> requests.Session:
+        """build a session with a sized connection pool and retries"""
+        import requests  # imported on first request, not at CLI start
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=self.retries, backoff_factor=self.backoff,
+                      status_forcelist=self.retry_statuses,
+                      allowed_methods=frozenset({"GET"}))
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def fetch_quotes(self, url: str, limiter: RateLimiter | None = None) -> list[dict[str, Any]]:
+        """Get quotes json from url, throttled by limiter.
+
+        Args:
+            url (str): url of the quotes API
+            limiter (RateLimiter | None, optional): rate limiter to take a token from. Defaults to None.
+
+        Raises:
+            requests.exceptions.RequestException: if the request failed after all retries
+
+        Returns:
+            list[dict[str, Any]]: quotes in zenquotes format, {"q": text, "a": author}
+        """
+        if limiter is not None:
+            limiter.acquire()
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -0,0 +1,272 @@
+"""
+Local JSON server for the quotes project: keeps db objects warm between commands
+"""
+import hmac
+import http.client
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+from . import api
+from .db_sql import cache_dir
+
+# methods which may be called remotely, long running ones (start, get) stay local
+CSV_METHODS = {"add_quote", "add_quotes", "get_quote", "list_quote", "iter_quotes", "search",
+               "random", "count", "update_quote", "delete_quote", "delete_all", "compact", "dedupe",
+               "near_duplicates", "path"}
+SQL_METHODS = {"add_quote_sql", "add_quotes", "list_quote", "iter_quotes", "search", "random",
+               "get_latest", "delete_all", "dedupe", "near_duplicates", "migrate"}
+# QuoteDBsql params a client may pass, others (url, pool options) are refused
+SQL_PARAMS = {"user", "password", "host", "port", "database"}
+
+
+class RemoteError(Exception):
+    """Error raised by the server which is not a QuoteException."""
+
+
+def is_loopback(host: str) -> bool:
+    """Return True if host is localhost or a loopback address, the only interfaces QuoteServer binds."""
+    if host.rstrip(".").lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+def token_file(port: int) -> Path:
+    """return the file with the access token of the server listening on port"""
+    return cache_dir() / f"server-{port}.token"
+
+
+def _encode(value: Any) -> Any:
+    """make value json serializable, quotes are tagged to be restored on the other side"""
+    if isinstance(value, api.Quote):
+        return {"__quote__": _encode(value.to_dict())}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)  # datetime, Path
+
+
+def _decode(value: Any) -> Any:
+    """restore values encoded by _encode"""
+    if isinstance(value, dict):
+        if "__quote__" in value:
+            return api.Quote.from_dict(value["__quote__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class QuoteServer(ThreadingHTTPServer):
+    """HTTP JSON server which owns QuoteDB and QuoteDBsql objects.
+
+    The CSV db with its parsed index and the SQLAlchemy engines with their
+    connection pools live as long as the server, so thin clients skip all
+    start up work. Every request is ``POST /call`` with
+    ``{"backend": "csv" | "sql", "sql": {...}, "method": ..., "args": [...], "kwargs": {...}}``.
+    Requests may delete quotes or open MySQL connections, so the server
+    only listens on loopback interfaces and accepts a request only with
+    the per-run token of its token_file (readable by the user alone) as
+    ``Authorization: Bearer ...``, Content-Type application/json, the Host
+    it listens on and no Origin, which keeps web pages from calling it.
+    """
+    daemon_threads = True
+
+    def __init__(self, db_path: Path, host: str = "127.0.0.1", port: int = 8765):
+        """initialize the QuoteServer
+
+        Args:
+            db_path (Path): directory of the CSV db
+            host (str, optional): interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port to listen on, 0 - any free port. Defaults to 8765.
+
+        Raises:
+            ValueError: if host is not a loopback interface
+            OSError: if the address can not be bound
+        """
+        if not is_loopback(host):
+            raise ValueError(f"host {host!r} is not a loopback interface")
+        self.address_family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.sql_dbs: dict[tuple, api.QuoteDBsql] = {}
+        self.sql_lock = threading.Lock()
+        super().__init__((host, port), _Handler)
+        port = self.server_address[1]
+        self.hosts = {_host_header(h, port) for h in (host, self.server_address[0])}
+        self.token = secrets.token_urlsafe(32)
+        self.token_file = token_file(port)
+        try:
+            self.token_file.parent.mkdir(parents=True, exist_ok=True)
+            self.token_file.unlink(missing_ok=True)  # left by a killed server, O_EXCL keeps the mode 0600
+            with os.fdopen(os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+                f.write(self.token)
+            self.quote_db = api.local_db(db_path)  # CSV or SQLite store, by QUOTES_BACKEND
+        except Exception:
+            self.server_close()
+            raise
+        self.csv_lock = threading.Lock()  # the CSV db is not thread safe
+
+    @property
+    def url(self) -> str:
+        """Return the url clients should use."""
+        return f"http://{_host_header(*self.server_address[:2])}"
+
+    def authorized(self, headers: Any) -> bool:
+        """Return True if request headers carry the token and come from a local client, not a web page."""
+        given = headers.get("Authorization", "")
+        return (hmac.compare_digest(given.encode("utf-8"), f"Bearer {self.token}".encode("utf-8"))
+                and headers.get("Host") in self.hosts and headers.get("Origin") is None)
+
+    def _sql_db(self, params: dict[str, Any]) -> "api.QuoteDBsql":
+        """return a cached QuoteDBsql for the connection params"""
+        unknown = set(params) - SQL_PARAMS
+        if unknown:
+            raise RemoteError(f"sql params {sorted(unknown)} can not be passed remotely")
+        key = tuple(sorted(params.items()))
+        with self.sql_lock:
+            if key not in self.sql_dbs:
+                self.sql_dbs[key] = api.QuoteDBsql(**params)
+            return self.sql_dbs[key]
+
+    def call(self, request: dict[str, Any]) -> Any:
+        """Run one request against the warm db objects.
+
+        Args:
+            request (dict[str, Any]): decoded request body
+
+        Raises:
+            RemoteError: if the method or the sql params may not be passed remotely
+
+        Returns:
+            Any: result of the method
+        """
+        method = request["method"]
+        args = _decode(request.get("args", []))
+        kwargs = _decode(request.get("kwargs", {}))
+        if request.get("backend", "csv") == "sql":
+            if method not in SQL_METHODS:
+                raise RemoteError(f"method {method!r} can not be called remotely")
+            result = getattr(self._sql_db(request["sql"]), method)(*args, **kwargs)
+            return list(result) if method == "iter_quotes" else result
+        if method not in CSV_METHODS:
+            raise RemoteError(f"method {method!r} can not be called remotely")
+        with self.csv_lock:
+            result = getattr(self.quote_db, method)(*args, **kwargs)
+            return list(result) if method == "iter_quotes" else result
+
+    def server_close(self) -> None:
+        super().server_close()  # also called by __init__ when binding fails
+        if hasattr(self, "token_file"):
+            self.token_file.unlink(missing_ok=True)
+        if hasattr(self, "quote_db"):
+            self.quote_db.http.close()
+        for db in self.sql_dbs.values():
+            db.http.close()
+            db._db.engine.dispose()
+
+
+def _host_header(host: str, port: int) -> str:
+    """return host:port as in urls and Host headers, IPv6 addresses in brackets"""
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """request handler of QuoteServer"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path != "/call":
+            self.send_error(404)
+            return
+        if self.headers.get_content_type() != "application/json":
+            self.send_error(415)
+            return
+        if not self.server.authorized(self.headers):
+            self.send_error(403)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = {"result": _encode(self.server.call(request))}
+        except api.QuoteException as e:
+            body = {"error": type(e).__name__, "message": str(e)}
+        except Exception as e:  # noqa: BLE001 the client gets every error
+            body = {"error": "RemoteError", "message": f"{type(e).__name__}: {e}"}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteQuoteDB:
+    """Thin client with the same methods as QuoteDB / QuoteDBsql.
+
+    Every method call is sent to a running QuoteServer. ``iter_quotes``
+    returns the whole list received from the server.
+    """
+    def __init__(self, url: str, sql: dict[str, Any] | None = None, timeout: float = 30,
+                 token: str | None = None):
+        """initialize the RemoteQuoteDB
+
+        Args:
+            url (str): url of the server, e.g. http://127.0.0.1:8765
+            sql (dict[str, Any] | None, optional): QuoteDBsql connection params,
+                None - use the CSV db of the server. Defaults to None.
+            timeout (float, optional): socket timeout in seconds. Defaults to 30.
+            token (str | None, optional): access token of the server, None - read
+                it from token_file of the port. Defaults to None.
+        """
+        parts = urlsplit(url)
+        port = parts.port or 80
+        self._conn = http.client.HTTPConnection(parts.hostname, port, timeout=timeout)
+        self._sql = sql
+        if token is None:
+            try:
+                token = token_file(port).read_text().strip()
+            except FileNotFoundError:
+                token = ""  # the server answers 403
+        self._token = token
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        """send one call to the server and return its decoded result"""
+        request = {"backend": "csv" if self._sql is None else "sql", "sql": self._sql,
+                   "method": method, "args": _encode(args), "kwargs": _encode(kwargs)}
+        data = json.dumps(request).encode("utf-8")
+        self._conn.request("POST", "/call", body=data, headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {self._token}"})
+        response = self._conn.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise RemoteError(f"server refused the call: {response.status} {response.reason}")
+        body = json.loads(payload)
+        if "error" in body:
+            exc = getattr(api, body["error"], None)
+            if isinstance(exc, type) and issubclass(exc, api.QuoteException):
+                raise exc(body["message"])
+            raise RemoteError(body["message"])
+        return _decode(body["result"])
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def close(self) -> None:
+        """Close the connection to the server."""
+        self._conn.close()
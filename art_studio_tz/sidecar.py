@@ -0,0 +1,175 @@
+"""sidecar.py - SQLite files next to the CSV DB which follow its index log"""
+from __future__ import annotations
+
+import sqlite3
+from abc import ABC, abstractmethod
+from array import array
+from typing import TYPE_CHECKING, Any, Iterable
+
+from .db import ENTRY_SIZE
+
+if TYPE_CHECKING:
+    from .db import DB
+
+
+class LogSidecar(ABC):
+    """Data derived from the live rows of a CSV DB, kept in ``<prefix><suffix>``.
+
+    ``sync`` applies only ``<prefix>.idx`` log entries added since the last
+    sync: a new version of a row replaces its data and a tombstone removes
+    it. Everything is rebuilt from the live rows when the CSV file was
+    replaced (compact, delete_all) or its log does not continue the synced
+    one. Subclasses implement _create, _reset, _insert and _remove; sync
+    and queries must run under the DB lock.
+    """
+    suffix = ".sidecar"
+
+    def __init__(self, db: DB):
+        """open or create the sidecar file next to the CSV file
+
+        Args:
+            db (DB): DB to follow
+        """
+        self.db = db
+        self.file = db.file.with_suffix(self.suffix)
+        # the server calls it from several threads, one at a time under its lock
+        self.conn = sqlite3.connect(self.file, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+        self._create()
+
+    @abstractmethod
+    def _create(self) -> None:
+        """create the tables of the sidecar if they do not exist"""
+
+    @abstractmethod
+    def _reset(self) -> None:
+        """remove all data"""
+
+    @abstractmethod
+    def _insert(self, rows: Iterable[tuple[int, dict[str, Any]]]) -> None:
+        """add data of (id, row) pairs, ids are not in the sidecar"""
+
+    @abstractmethod
+    def _remove(self, id: int) -> None:
+        """remove data of a row id if there is any"""
+
+    def close(self) -> None:
+        """Close the sidecar file."""
+        self.conn.close()
+
+    def _read_entries(self, start: int, stop: int) -> array:
+        """read (id, offset, length) triples number start..stop-1 of the index log"""
+        entries = array('q')
+        with self.db.index_file.open('rb') as f:
+            f.seek(start * ENTRY_SIZE)
+            entries.frombytes(f.read((stop - start) * ENTRY_SIZE))
+        return entries
+
+    def sync(self) -> int:
+        """Bring the sidecar up to date with the CSV file, must run under the DB lock.
+
+        Returns:
+            int: number of applied log entries or indexed rows, 0 if it was up to date
+        """
+        meta = self.db._meta()
+        records = meta["records"]
+        if self.db.index_file.stat().st_size != records * ENTRY_SIZE:
+            self.db._get_index()  # the log is rebuilt from the CSV file
+        ino = self.db._stat_key()[2]
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")  # another process may sync at the same time
+        try:
+            state = dict(conn.execute("SELECT key, value FROM state"))
+            synced = state.get("records", 0)
+            last = array('q', (state.get("id", 0), state.get("offset", 0), state.get("length", 0)))
+            if (state.get("ino") != ino or synced > records
+                    or (synced and self._read_entries(synced - 1, synced) != last)):
+                applied = self._rebuild()
+            else:
+                applied = self._apply(self._read_entries(synced, records))
+            if records:
+                last = self._read_entries(records - 1, records)
+            conn.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)",
+                             [("ino", ino), ("records", records), ("id", last[0]),
+                              ("offset", last[1]), ("length", last[2])])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return applied
+
+    def _rebuild(self) -> int:
+        """fill the sidecar from scratch with all live rows"""
+        self._reset()
+        count = 0
+        def rows():
+            nonlocal count
+            for row in self.db.iter_rows():
+                count += 1
+                yield int(row['id']), row
+        self._insert(rows())
+        return count
+
+    def _apply(self, entries: array) -> int:
+        """apply new log entries: versions replace the data of the row, tombstones remove it"""
+        if not entries:
+            return 0
+        with self.db.file.open('rb') as f:
+            for id, offset, length in zip(entries[0::3], entries[1::3], entries[2::3]):
+                self._remove(abs(id))
+                if id > 0:
+                    f.seek(offset)
+                    self._insert([(id, self.db._decode_row(f.read(length)))])
+        return len(entries) // 3
+
+
+class HashSet(LogSidecar):
+    """Content keys of the live rows of the CSV DB in ``<prefix>.keys``.
+
+    Follows the index log of the DB (see LogSidecar), a key is looked up
+    through an SQLite index instead of a scan of the CSV file.
+    """
+    suffix = ".keys"
+
+    def _create(self) -> None:
+        """create the id -> key table with an index on key"""
+        self.conn.execute("CREATE TABLE IF NOT EXISTS keys (id INTEGER PRIMARY KEY, key TEXT NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_keys_key ON keys (key)")
+
+    def _reset(self) -> None:
+        self.conn.execute("DELETE FROM keys")
+
+    def _insert(self, rows: Iterable[tuple[int, dict[str, Any]]]) -> None:
+        key = self.db.key
+        self.conn.executemany("INSERT INTO keys VALUES (?, ?)", ((id, key(row)) for id, row in rows))
+
+    def _remove(self, id: int) -> None:
+        self.conn.execute("DELETE FROM keys WHERE id = ?", (id,))
+
+    def existing(self, keys: Iterable[str]) -> set[str]:
+        """Return the keys which rows of the DB already have.
+
+        Args:
+            keys (Iterable[str]): keys to look up
+
+        Returns:
+            set[str]: keys found in the DB
+        """
+        found = set()
+        lookup = self.conn.execute
+        for key in keys:
+            if lookup("SELECT 1 FROM keys WHERE key = ? LIMIT 1", (key,)).fetchone():
+                found.add(key)
+        return found
+
+    def duplicates(self) -> list[int]:
+        """Return ids of rows whose key repeats the key of a row with a smaller id.
+
+        Returns:
+            list[int]: ids in ascending order
+        """
+        return [id for id, in self.conn.execute(
+            "SELECT id FROM keys WHERE id NOT IN (SELECT MIN(id) FROM keys GROUP BY key) ORDER BY id")]
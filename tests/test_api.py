@@ -4,7 +4,7 @@ from unittest.mock import MagicMock, patch
 import art_studio_tz
 import pytest
 from datetime import datetime, timezone
-from art_studio_tz import Quote, QuoteDB, MissingText, InvalidQuoteId, QuoteDBsql
+from art_studio_tz import Quote, QuoteDB, MissingText, InvalidQuoteId, QuoteDBsql, RateLimiter
 
 @pytest.fixture()
 def quote_db():
@@ -54,6 +54,18 @@ class TestQuote:
         assert q.timestep == "t1"
         assert q.id == 10
 
+    def test_from_row(self):
+        q = Quote.from_row(("Hello", "Alice", "t1", 10))
+        assert q == Quote(text="Hello", author="Alice", timestep="t1")
+        assert q.id == 10
+
+    def test_quote_is_slotted(self):
+        q = Quote(text="Hello")
+        assert not hasattr(q, "__dict__")
+        d = q.to_dict()
+        d["text"] = "Changed"
+        assert q.text == "Hello"
+
 
 class TestQuoteDB:
     @pytest.fixture(autouse=True)
@@ -75,17 +87,32 @@ class TestQuoteDB:
 
         quote_id = self.quote_db.add_quote(quote)
 
-        self.mock_db.create.assert_called_once_with(quote.to_dict())
+        self.mock_db.create.assert_called_once()
         assert quote_id == 1
-        args, kwargs = self.mock_db.update.call_args
-        assert args[0] == 1
-        assert "timestep" in args[1]
+        args, kwargs = self.mock_db.create.call_args
+        assert args[0]["text"] == text
+        assert args[0]["timestep"]
+        self.mock_db.update.assert_not_called()
 
     def test_add_quote_missing_text_raises(self):
         quote = Quote(text=None, author="Someone")
         with pytest.raises(MissingText):
             self.quote_db.add_quote(quote)
 
+    def test_add_quotes_single_append(self):
+        self.mock_db.create_many.return_value = [1, 2]
+        ids = self.quote_db.add_quotes([Quote(text="A", author="X"), Quote(text="B")])
+        assert ids == [1, 2]
+        items = self.mock_db.create_many.call_args[0][0]
+        assert [i["text"] for i in items] == ["A", "B"]
+        assert items[1]["author"] == ""
+        assert all(i["timestep"] for i in items)
+
+    def test_add_quotes_missing_text_adds_nothing(self):
+        with pytest.raises(MissingText):
+            self.quote_db.add_quotes([Quote(text="A"), Quote(text=None)])
+        self.mock_db.create_many.assert_not_called()
+
     @pytest.mark.parametrize("data", [
         {"text": "Hello", "author": "Someone", "id": 1},
         {"text": "Test", "author": "Alice", "id": 2},
@@ -124,6 +151,16 @@ class TestQuoteDB:
         quotes = self.quote_db.list_quote(author=author_filter)
         assert len(quotes) == expected_count
 
+    def test_iter_quotes_is_lazy(self):
+        self.mock_db.iter_rows.return_value = iter([
+            {"text": "A", "author": "X", "id": 1},
+            {"text": "C", "author": "X", "id": 3},
+        ])
+        quotes = self.quote_db.iter_quotes(author="X")
+        assert next(quotes).text == "A"
+        assert [q.text for q in quotes] == ["C"]
+        self.mock_db.iter_rows.assert_called_once_with({"author": "X"})  # фильтрует DB
+
     @pytest.mark.parametrize("count_val", [0, 1, 5, 42])
     def test_count_calls_db_count(self, count_val):
         self.mock_db.count.return_value = count_val
@@ -153,11 +190,34 @@ class TestQuoteDB:
         self.quote_db.delete_all()
         self.mock_db.delete_all.assert_called_once()
 
+    def test_compact_calls_db_compact(self):
+        self.mock_db.compact.return_value = 3
+        assert self.quote_db.compact() == 3
+
+    def test_start_uses_limiter(self, capsys):
+        self.quote_db.http = MagicMock()
+        mock_fetch = self.quote_db.http.fetch_quotes
+        mock_fetch.side_effect = [[{"q": "Quote1", "a": "Author1"}], KeyboardInterrupt]
+        limiter = RateLimiter(0)
+        self.quote_db.start("fake_url", 5, limiter)
+        mock_fetch.assert_called_with("fake_url", limiter)
+        self.mock_db.create.assert_called_once()
+        assert "Rate limit" in capsys.readouterr().out
+
+    def test_start_counts_duplicates(self, capsys):
+        self.quote_db.http = MagicMock()
+        self.quote_db.http.fetch_quotes.side_effect = [[{"q": "Q", "a": "A"}]] * 3 + [KeyboardInterrupt]
+        self.mock_db.create.side_effect = [1, None, None]
+        self.quote_db.start("fake_url", 0, RateLimiter(0))
+        out = capsys.readouterr().out
+        assert out.count("Added Quote: Q") == 1
+        assert "Skipped duplicate: Q - Author: A (duplicates: 2)" in out
+
 class TestQuoteDBsql:
     @pytest.fixture(autouse=True)
     def setup(self):
         # Патчим DBsql там, где QuoteDBsql его реально использует
-        with patch("art_studio_tz.api.DBsql") as MockDBsql:
+        with patch("art_studio_tz.db_sql.DBsql") as MockDBsql:
             self.mock_db = MagicMock()
             MockDBsql.return_value = self.mock_db
             self.db_sql = QuoteDBsql("user", "pass")
@@ -178,6 +238,12 @@ class TestQuoteDBsql:
         with pytest.raises(MissingText):
             self.db_sql.add_quote_sql(quote)
 
+    def test_add_quotes(self):
+        self.mock_db.bulk_create.return_value = [7, 8]
+        quotes = [Quote(text="A", author="X"), Quote(text="B")]
+        assert self.db_sql.add_quotes(quotes) == [7, 8]
+        self.mock_db.bulk_create.assert_called_once_with([q.to_dict() for q in quotes])
+
     @pytest.mark.parametrize("all_quotes,author_filter,expected_count", [
         (
             [{"text": "A", "author": "X", "id": 1},
@@ -196,36 +262,51 @@ class TestQuoteDBsql:
         ),
     ])
     def test_list_quote(self, all_quotes, author_filter, expected_count):
-        self.mock_db.read_all.return_value = all_quotes
+        filtered = [t for t in all_quotes if author_filter is None or t["author"] == author_filter]
+        # фильтрует сама БД и возвращает строки (text, author, timestep, id)
+        self.mock_db.read_all.return_value = [(t["text"], t["author"], None, t["id"]) for t in filtered]
         quotes = self.db_sql.list_quote(author=author_filter)
+        self.mock_db.read_all.assert_called_once_with(author=author_filter, limit=None, after=None)
         assert len(quotes) == expected_count
-        for q, data in zip(quotes, [t for t in all_quotes if author_filter is None or t["author"] == author_filter]):
+        for q, data in zip(quotes, filtered):
             assert q.text == data["text"]
             assert q.author == data["author"]
+            assert q.id == data["id"]
 
-    @patch("art_studio_tz.api.requests.get")
-    @patch("time.sleep", return_value=None)  # чтобы не ждать паузы
-    def test_get_some_quotes(self, mock_sleep, mock_get):
-        mock_get.return_value.json.return_value = [
+    def test_list_quote_page(self):
+        self.mock_db.read_all.return_value = []
+        self.db_sql.list_quote(author="X", limit=10, after=20)
+        self.mock_db.read_all.assert_called_once_with(author="X", limit=10, after=20)
+
+    def test_get_some_quotes(self):
+        self.db_sql.http = MagicMock()
+        self.db_sql.http.fetch_quotes.return_value = [
             {"q": "Quote1", "a": "Author1"},
             {"q": "Quote2", "a": "Author2"},
         ]
-        mock_get.return_value.raise_for_status = lambda: None
 
-        self.db_sql.add_quote_sql = MagicMock()  # Мокаем метод, чтобы проверить вызовы
+        self.db_sql.add_quotes = MagicMock()  # Мокаем метод, чтобы проверить вызовы
 
         self.db_sql.get_some_quotes("fake_url")
 
-        assert self.db_sql.add_quote_sql.call_count == 2
-        self.db_sql.add_quote_sql.assert_any_call(Quote(text="Quote1", author="Author1"))
-        self.db_sql.add_quote_sql.assert_any_call(Quote(text="Quote2", author="Author2"))
+        self.db_sql.add_quotes.assert_called_once_with(
+            [Quote(text="Quote1", author="Author1"), Quote(text="Quote2", author="Author2")])
+
+    def test_get_some_quotes_reports_duplicates(self, capsys):
+        self.db_sql.http = MagicMock()
+        self.db_sql.http.fetch_quotes.return_value = [{"q": "Quote1", "a": "A"}, {"q": "Quote2", "a": "B"}]
+        self.mock_db.bulk_create.return_value = [5, None]
+        self.db_sql.get_some_quotes("fake_url")
+        out = capsys.readouterr().out
+        assert "Skipped duplicate: Quote2 - Author: B" in out
+        assert "Added 1 quotes, skipped 1 duplicates" in out
 
     @pytest.mark.parametrize("number,return_data", [
         (1, [{"text": "A", "author": "X"}]),
         (3, [{"text": "A", "author": "X"}, {"text": "B", "author": "Y"}, {"text": "C", "author": "Z"}]),
     ])
     def test_get_latest(self, number, return_data):
-        self.mock_db.get_latest.return_value = return_data
+        self.mock_db.get_latest.return_value = [(t["text"], t["author"], None, None) for t in return_data]
         quotes = self.db_sql.get_latest(number)
         assert len(quotes) == len(return_data)
         for q, data in zip(quotes, return_data):
@@ -239,3 +320,64 @@ class TestQuoteDBsql:
 def test_empty(quote_db):
     assert quote_db.count() == 0 
 
+
+def test_duplicates_not_added(quote_db):
+    first = quote_db.add_quote(Quote(text="Life is short", author="Seneca"))
+    assert quote_db.add_quote(Quote(text="life  is SHORT", author="seneca")) is None
+    ids = quote_db.add_quotes([Quote(text="New", author="X"), Quote(text="Life is short", author="Seneca"),
+                               Quote(text="new", author="x")])
+    assert ids == [first + 1, None, None]
+    quote_db.delete_quote(first)
+    assert quote_db.add_quote(Quote(text="Life is short", author="Seneca")) == first + 2
+    assert quote_db.count() == 2
+
+
+NEAR_DUPLICATES = [
+    Quote(text="Life is what happens when you're busy making other plans.", author="Lennon"),
+    Quote(text="The only way to do great work is to love what you do.", author="Jobs"),
+    Quote(text="LIFE is what happens while you are busy making other plans!", author="J. Lennon"),
+    Quote(text="Simplicity is the ultimate sophistication.", author="Da Vinci"),
+    Quote(text="the only way to do great work is to love what you do", author="Steve Jobs"),
+]
+
+
+def test_near_duplicates_grouped_and_merged(quote_db):
+    quote_db.add_quotes(NEAR_DUPLICATES)
+    groups = quote_db.near_duplicates(threshold=0.5)
+    assert [[q.id for q in group] for group in groups] == [["1", "3"], ["2", "5"]]
+    assert groups[0][1].author == "J. Lennon"
+    # equal up to case and punctuation
+    assert [[q.id for q in group] for group in quote_db.near_duplicates(threshold=1.0)] == [["2", "5"]]
+    assert len(quote_db.near_duplicates(threshold=0.5, merge=True)) == 2
+    assert [q.id for q in quote_db.iter_quotes()] == ["1", "2", "4"]
+    assert quote_db.near_duplicates() == []
+
+
+def test_near_duplicates_sql(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path))
+    db = QuoteDBsql(url=f"sqlite:///{tmp_path / 'quotes.db'}")
+    db.add_quotes(NEAR_DUPLICATES)
+    groups = db.near_duplicates(threshold=0.5, merge=True)
+    assert [[q.id for q in group] for group in groups] == [[1, 3], [2, 5]]
+    assert [q.id for q in db.list_quote()] == [1, 2, 4]
+
+
+def test_random_weights_and_no_repeat(quote_db):
+    quote_db.add_quotes([Quote(text=f"Quote {i}", author="Rare" if i == 0 else "Common")
+                         for i in range(5)])
+    served = [quote_db.random(no_repeat=5)[0].id for _ in range(5)]
+    assert len(set(served)) == 5
+    assert len(quote_db.random(2, no_repeat=5)) == 2  # the window gives way when nothing else is left
+    assert len({q.id for q in quote_db.random(5)}) == 5
+    assert [q.author for q in quote_db.random(3, author="Rare")] == ["Rare"]
+    assert {q.author for _ in range(20) for q in quote_db.random(weights={"Common": 0})} == {"Rare"}
+    quote_db.add_quote(Quote(text="Quoted", author='Dwayne "The Rock" Johnson'))
+    assert [q.text for q in quote_db.random(author='Dwayne "The Rock" Johnson')] == ["Quoted"]
+
+
+def test_random_sql(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path))
+    db = QuoteDBsql(url=f"sqlite:///{tmp_path / 'quotes.db'}")
+    db.add_quotes([Quote(text=f"Quote {i}", author="X") for i in range(3)])
+    assert sorted(q.id for q in db.random(5)) == [1, 2, 3]
+    assert {db.random(no_repeat=2)[0].id for _ in range(3)} == {1, 2, 3}
@@ -35,6 +35,17 @@ def test_add(mock_quote_db):
     assert arg.text == "Hello world"
     assert arg.author == "Author"
 
+def test_add_duplicate(mock_quote_db):
+    mock_quote_db.add_quote.return_value = None
+    result = runner.invoke(app, ["add", "Hello"])
+    assert "already in db" in result.output
+
+def test_dedupe(mock_quote_db):
+    mock_quote_db.dedupe.return_value = 4
+    result = runner.invoke(app, ["dedupe"])
+    assert result.exit_code == 0
+    assert "Removed 4 duplicates" in result.output
+
 def test_delete_valid(mock_quote_db):
     result = runner.invoke(app, ["delete", "1"])
     assert result.exit_code == 0
@@ -52,7 +63,7 @@ def test_list_quote(mock_quote_db):
     quote.timestep = "2025-01-01"
     quote.text = "Hello"
     quote.author = "Author"
-    mock_quote_db.list_quote.return_value = [quote]
+    mock_quote_db.iter_quotes.return_value = iter([quote])
 
     result = runner.invoke(app, ["list"])
     assert result.exit_code == 0
@@ -124,3 +135,78 @@ def test_count(mock_quote_db):
     result = runner.invoke(app, ["count"])
     assert result.exit_code == 0
     assert "42" in result.output
+
+
+def test_compact(mock_quote_db):
+    mock_quote_db.compact.return_value = 3
+    result = runner.invoke(app, ["compact"])
+    assert result.exit_code == 0
+    assert "3" in result.output
+
+def test_sql_list_next_page(mock_quote_db_sql):
+    quote = MagicMock(id=7, timestep="2025-01-01", text="Hello", author="Author")
+    mock_quote_db_sql.iter_quotes.return_value = iter([quote])
+    result = runner.invoke(app, ["list-sql", "-u", "user", "-p", "pass", "-a", "Author", "-l", "1"])
+    assert result.exit_code == 0
+    mock_quote_db_sql.iter_quotes.assert_called_once_with(author="Author", limit=1, after=None)
+    assert "--after 7" in result.output
+
+def test_search(mock_quote_db):
+    quote = MagicMock(id=3, timestep="2025-01-01", text="Life is short", author="X")
+    mock_quote_db.search.return_value = [quote]
+    result = runner.invoke(app, ["search", "life", "short", "-n", "5"])
+    assert result.exit_code == 0
+    mock_quote_db.search.assert_called_once_with("life short", 5)
+    assert "Life is short" in result.output
+
+def test_search_sql(mock_quote_db_sql):
+    mock_quote_db_sql.search.return_value = []
+    result = runner.invoke(app, ["search-sql", "life", "-u", "user", "-p", "pass"])
+    assert result.exit_code == 0
+    mock_quote_db_sql.search.assert_called_once_with("life", 10)
+
+def test_migrate_sql(mock_quote_db_sql):
+    mock_quote_db_sql.migrate.return_value = ["ix_quotes_timestep"]
+    result = runner.invoke(app, ["migrate-sql", "-u", "user", "-p", "pass"])
+    assert result.exit_code == 0
+    assert "ix_quotes_timestep" in result.output
+
+def test_sql_commands_use_configured_url(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_DB_URL", f"sqlite:///{tmp_path / 'quotes.db'}")
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path))
+    result = runner.invoke(app, ["list-sql"])
+    assert result.exit_code == 0
+
+def test_sql_commands_without_url(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("QUOTES_DB_URL", raising=False)
+    monkeypatch.delenv("QUOTES_DB_CONFIG", raising=False)
+    result = runner.invoke(app, ["list-sql"])
+    assert result.exit_code == 1
+    assert "QUOTES_DB_URL" in result.output
+
+def test_list_renders_in_chunks(mock_quote_db):
+    quotes = [MagicMock(id=i, timestep="2025-01-01", text=f"Quote {i}", author="Author")
+              for i in range(250)]
+    mock_quote_db.iter_quotes.return_value = iter(quotes)
+    result = runner.invoke(app, ["list"])
+    assert result.exit_code == 0
+    assert result.output.count("TimeStep") == 1
+    assert "Quote 0 " in result.output and "Quote 249" in result.output
+
+def test_dedupe_fuzzy(mock_quote_db):
+    quote = MagicMock(id=1, timestep="2025-01-01", text="Hello", author="Author")
+    mock_quote_db.near_duplicates.return_value = [[quote, quote]]
+    result = runner.invoke(app, ["dedupe", "--fuzzy", "-t", "0.6", "--merge"])
+    assert result.exit_code == 0
+    mock_quote_db.near_duplicates.assert_called_once_with(0.6, True)
+    assert "Group 1:" in result.output
+    assert "Found 1 groups of near duplicates" in result.output
+
+def test_random(mock_quote_db):
+    mock_quote_db.random.return_value = [MagicMock(id=3, timestep="2025-01-01", text="Life is short", author="X")]
+    result = runner.invoke(app, ["random", "-n", "2", "-w", "X=2.5", "-w", "Seneca=0", "--no-repeat", "10"])
+    assert result.exit_code == 0
+    mock_quote_db.random.assert_called_once_with(2, None, {"X": 2.5, "Seneca": 0.0}, 10)
+    assert "Life is short" in result.output
+    assert runner.invoke(app, ["random", "-w", "X"]).exit_code == 1
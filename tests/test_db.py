@@ -1,5 +1,8 @@
 import csv
+import mmap
+import multiprocessing
 import pytest
+from unittest.mock import patch
 from pathlib import Path
 from art_studio_tz.api import DB
 
@@ -65,4 +68,284 @@ def test_update_non_existing(db):
 def test_delete_non_existing(db):
     db.create({"text": "A", "author": "X"})
     db.delete(999)  
-    assert db.count() == 1
\ No newline at end of file
+    assert db.count() == 1
+
+def test_create_does_not_rescan(db):
+    db.create({"text": "A", "author": "X"})
+    with patch.object(DB, "_read_all_rows", side_effect=AssertionError("scan")):
+        assert db.create({"text": "B", "author": "Y"}) == 2
+
+def test_ids_not_reused_after_delete(db):
+    db.create({"text": "A", "author": "X"})
+    id2 = db.create({"text": "B", "author": "Y"})
+    db.delete(id2)
+    assert db.create({"text": "C", "author": "Z"}) == id2 + 1
+
+def test_meta_rebuilt_after_external_edit(db):
+    db.create({"text": "A", "author": "X"})
+    with db.file.open('a', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow([7, "B", "Y"])
+    assert db.create({"text": "C", "author": "Z"}) == 8
+
+def test_read_uses_index(db):
+    db.create({"text": "A", "author": "X"})
+    id2 = db.create({"text": 'multi\nline "quoted"', "author": "Y"})
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    with patch.object(DB, "_read_all_rows", side_effect=AssertionError("scan")):
+        row = other.read(id2)
+        assert other.count() == 2
+    assert row["text"] == 'multi\nline "quoted"'
+    assert row["author"] == "Y"
+
+def test_index_rebuilt_after_external_edit(db):
+    db.create({"text": "A", "author": "X"})
+    with db.file.open('a', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow([5, "B,\nC", "Y"])
+    assert db.count() == 2
+    assert db.read(5)["text"] == "B,\nC"
+    assert db.read(1)["text"] == "A"
+
+def test_index_after_delete_and_update(db):
+    for i in range(3):
+        db.create({"text": f"Q{i}", "author": "X"})
+    db.delete(1)
+    db.update(3, {"text": "New"})
+    assert db.read(1) is None
+    assert db.read(2)["text"] == "Q1"
+    assert db.read(3)["text"] == "New"
+    assert db.count() == 2
+
+def test_update_and_delete_append_records(db):
+    id1 = db.create({"text": "A", "author": "X"})
+    id2 = db.create({"text": "B", "author": "Y"})
+    size = db.file.stat().st_size
+    db.update(id1, {"text": "A2"})
+    db.delete(id2)
+    assert db.file.stat().st_size > size
+    assert [r["text"] for r in db.read_all()] == ["A2"]
+    assert db.read(id1)["text"] == "A2"
+    assert db.read(id2) is None
+    assert db.count() == 1
+
+def test_compact(db):
+    id1 = db.create({"text": "A", "author": "X"})
+    id2 = db.create({"text": "B", "author": "Y"})
+    db.update(id1, {"text": "A2"})
+    db.delete(id2)
+    assert db.compact() == 3
+    with db.file.open(newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f)) == [["id", "text", "author"], [str(id1), "A2", "X"]]
+    assert db.read(id1)["text"] == "A2"
+    assert db.create({"text": "C", "author": "Z"}) == id2 + 1
+
+def test_auto_compact(db):
+    db.compact_min_garbage = 4
+    id1 = db.create({"text": "A", "author": "X"})
+    for i in range(4):
+        db.update(id1, {"text": f"A{i}"})
+    assert db.file.read_text(encoding='utf-8').count("A") == 1
+    assert db.read(id1)["text"] == "A3"
+
+def test_tombstones_survive_index_rebuild(db):
+    id1 = db.create({"text": "A", "author": "X"})
+    db.create({"text": "B", "author": "Y"})
+    db.delete(id1)
+    db.meta_file.unlink()
+    db.index_file.unlink()
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    assert other.count() == 1
+    assert other.read(id1) is None
+    assert other.create({"text": "C", "author": "Z"}) == 3
+
+def test_create_many(db):
+    db.create({"text": "A", "author": "X"})
+    ids = db.create_many([{"text": "B", "author": "Y"}, {"text": "C", "author": "Z"}])
+    assert ids == [2, 3]
+    assert db.count() == 3
+    assert db.read(3)["text"] == "C"
+    assert db.create_many([]) == []
+
+def test_iter_rows_streams_live_rows(db):
+    for i in range(4):
+        db.create({"text": f"Q{i}", "author": "X"})
+    db.update(2, {"text": "New"})
+    db.delete(3)
+    rows = db.iter_rows()
+    assert next(rows)["text"] == "Q0"
+    assert [r["text"] for r in rows] == ["New", "Q3"]
+    assert [r["id"] for r in db.iter_rows()] == [r["id"] for r in db.read_all()]
+
+def test_read_cache_survives_own_writes(db):
+    db.create({"text": "A", "author": "X"})
+    db.read_all()
+    with patch.object(DB, "_read_all_rows", side_effect=AssertionError("scan")), \
+         patch.object(DB, "_load_meta", side_effect=AssertionError("meta read")):
+        id2 = db.create({"text": "B", "author": "Y"})
+        db.update(1, {"text": "A2"})
+        assert [r["text"] for r in db.read_all()] == ["A2", "B"]
+        assert [r["text"] for r in db.iter_rows()] == ["A2", "B"]
+        assert db.read(id2)["author"] == "Y"
+        assert db.count() == 2
+        db.delete(id2)
+        assert [r["text"] for r in db.read_all()] == ["A2"]
+
+def test_read_cache_invalidated_by_external_write(db):
+    db.create({"text": "A", "author": "X"})
+    assert len(db.read_all()) == 1
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    other.create({"text": "B", "author": "Y"})
+    assert [r["text"] for r in db.read_all()] == ["A", "B"]
+    assert db.count() == 2
+    other.delete_all()  # replaced file, new inode
+    assert db.read_all() == []
+    assert db.read(1) is None
+
+def test_read_returns_copy(db):
+    db.create({"text": "A", "author": "X"})
+    db.read_all()
+    db.read(1)["text"] = "changed"
+    assert db.read(1)["text"] == "A"
+
+def test_scan_records_quote_aware(db):
+    db.create({"text": 'line\n"quoted", and,\ncommas', "author": "X"})
+    db.create({"text": "plain", "author": "Y"})
+    db.create({"text": "", "author": ""})
+    db.meta_file.unlink()
+    db.index_file.unlink()
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    assert other.count() == 3
+    assert other.read(1)["text"] == 'line\n"quoted", and,\ncommas'
+    assert other.read(3) == {"id": "3", "text": "", "author": ""}
+
+def test_scan_records_quoted_field_longer_than_chunk(tmp_path):
+    data = b'id,text\n1,"a\nb\nc\nd\ne\nf\ng\nh"\n2,"x"\n3,plain\n'
+    path = tmp_path / "quotes.csv"
+    path.write_bytes(data)
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        records = list(DB._scan_records(mm, chunk_size=8))
+    assert [data[o:o + n] for o, n, _ in records] == data.splitlines(keepends=True)[:1] + [
+        b'1,"a\nb\nc\nd\ne\nf\ng\nh"\n', b'2,"x"\n', b'3,plain\n']
+
+def test_iter_rows_prefilter_value_with_quotes(db):
+    db.create({"text": "Q", "author": 'Dwayne "The Rock" Johnson'})
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    assert [r["text"] for r in other.iter_rows({"author": 'Dwayne "The Rock" Johnson'})] == ["Q"]
+
+def test_iter_rows_prefilter_parses_only_candidates(db):
+    db.create_many([{"text": f"Q{i}", "author": "Wanted" if i % 10 == 0 else f"A{i}"}
+                    for i in range(100)])
+    db.create({"text": "mentions Wanted", "author": "Other"})
+    other = DB(db.file.parent, "quotes", ["text", "author"])
+    with patch.object(DB, "_decode_row", autospec=True, side_effect=DB._decode_row) as decode:
+        rows = list(other.iter_rows({"author": "Wanted"}))
+    assert [r["text"] for r in rows] == [f"Q{i}" for i in range(0, 100, 10)]
+    assert decode.call_count == 11  # 10 matches and one false positive of the byte scan
+
+
+def _stress_writer(path, worker, n):
+    db = DB(Path(path), "quotes", ["text", "author"])
+    ids = []
+    for i in range(n):
+        ids.append(db.create({"text": f"W{worker} Q{i}", "author": f"W{worker}"}))
+        if i % 5 == 4:
+            db.update(ids[-2], {"text": f"W{worker} Q{i - 1} updated"})
+            db.delete(ids[-3])
+        if i % 20 == 19:
+            ids.extend(db.create_many([{"text": "batch", "author": f"W{worker}"}] * 3))
+            db.compact()
+    return ids
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="needs fork")
+def test_concurrent_writers(tmp_path):
+    workers, n = 4, 40
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.starmap(_stress_writer, [(str(tmp_path), w, n) for w in range(workers)])
+    ids = [id for r in results for id in r]
+    assert len(ids) == len(set(ids)) == workers * (n + 6)  # no id handed out twice
+    db = DB(tmp_path, "quotes", ["text", "author"])
+    rows = db.read_all()
+    per_worker = n - n // 5  # every 5th step deletes one row
+    assert len(rows) == db.count() == workers * (per_worker + 6)
+    assert sum(r["text"].endswith("updated") for r in rows) == workers * (n // 5)
+    with db.file.open(newline='', encoding='utf-8') as f:
+        assert all(len(r) == 3 for r in csv.reader(f))  # no torn records
+
+def test_key_skips_duplicates(tmp_path):
+    db = DB(tmp_path, "quotes", ["text", "author"], key=lambda r: r["text"].lower())
+    assert db.create({"text": "A", "author": "X"}) == 1
+    assert db.create({"text": "a", "author": "Y"}) is None
+    assert db.create_many([{"text": "B"}, {"text": "A"}, {"text": "b"}, {"text": "C"}]) == [2, None, None, 3]
+    db.update(2, {"text": "Z"})
+    assert db.create({"text": "B", "author": "X"}) == 4  # the key follows the update
+    other = DB(tmp_path, "quotes", ["text", "author"])  # writer without a key
+    other.create({"text": "c", "author": "X"})
+    other.create({"text": "A", "author": "X"})
+    assert db.dedupe() == 2
+    assert [r["text"] for r in db.read_all()] == ["A", "Z", "C", "B"]
+    with pytest.raises(ValueError):
+        other.dedupe()
+
+def test_search_ranks_and_follows_writes(db):
+    db.create({"text": "Life is short", "author": "X"})
+    id2 = db.create({"text": "Life, life and more life", "author": "Y"})
+    db.create({"text": "Nothing here", "author": "Life Coach"})
+    assert [r["id"] for r in db.search("life")] == [str(id2), "1", "3"]
+    assert db.search("LIFE short") == [db.read(1)]
+    assert db.search('"') == []
+    db.update(1, {"text": "Art is long"})
+    db.delete(id2)
+    new_id = db.create({"text": "Café life", "author": "Z"})
+    assert [r["id"] for r in db.search("life", limit=1)] == [str(new_id)]
+    assert db.search("cafe")[0]["text"] == "Café life"
+    assert db._fts.sync() == 0  # up to date, nothing re-indexed
+
+def test_search_index_rebuilt_after_rewrite(db):
+    db.create({"text": "Old quote", "author": "X"})
+    db.search("quote")
+    db.delete_all()
+    db.create({"text": "New quote", "author": "X"})
+    assert [r["text"] for r in db.search("quote")] == ["New quote"]
+    other = DB(db.file.parent, "quotes", ["text", "author"])  # another process
+    other.create({"text": "Another quote", "author": "Y"})
+    assert len(db.search("quote")) == 2
+
+def test_sample_reads_only_live_versions(db):
+    for i in range(6):
+        db.create({"text": f"Q{i}", "author": "X" if i % 2 else "Y"})
+    db.update(1, {"text": "Q0 new"})
+    db.delete(2)
+    rows = db.sample(10)
+    assert sorted(r["text"] for r in rows) == ["Q0 new", "Q2", "Q3", "Q4", "Q5"]
+    seen = {r["id"] for _ in range(200) for r in db.sample(1)}
+    assert seen == {"1", "3", "4", "5", "6"}  # a superseded version or tombstone is never picked
+    assert [r["text"] for r in db.sample(5, match={"author": "X"}, exclude={4, 6})] == []
+    assert {r["id"] for r in db.sample(5, match={"author": "Y"}, exclude={1})} == {"3", "5"}
+    db.delete_all()
+    assert db.sample(1) == []
+
+def test_sample_does_not_load_index(db, tmp_path):
+    db.create_many([{"text": f"Q{i}", "author": "X"} for i in range(1, 301)])
+    for id in range(1, 301, 3):
+        db.update(id, {"text": f"new {id}"})  # offsets and lengths equal to ids are skipped
+    for id in range(2, 301, 3):
+        db.delete(id)
+    cold = DB(tmp_path, "quotes", ["text", "author"])
+    seen = {r["id"]: r["text"] for _ in range(50) for r in cold.sample(10)}
+    assert cold._index is None
+    assert seen and all(int(id) % 3 != 2 for id in seen)
+    assert all(text == f"new {id}" for id, text in seen.items() if int(id) % 3 == 1)
+    assert sorted(int(r["id"]) for r in cold.sample(500)) == [i for i in range(1, 301) if i % 3 != 2]
+
+def test_incomplete_sidecar_fails_on_creation(db):
+    from art_studio_tz.sidecar import LogSidecar
+
+    class NoRemove(LogSidecar):
+        suffix = ".broken"
+
+        def _create(self): pass
+        def _reset(self): pass
+        def _insert(self, rows): pass
+
+    with pytest.raises(TypeError, match="_remove"):
+        NoRemove(db)
+    assert not db.file.with_suffix(".broken").exists()
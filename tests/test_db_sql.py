@@ -1,9 +1,11 @@
+import re
+
 import pytest
 from unittest.mock import MagicMock, patch
 from art_studio_tz import DBsql
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, desc, inspect, select
 from sqlalchemy.orm import sessionmaker
-from art_studio_tz.db_sql import QuoteModel, Base
+from art_studio_tz.db_sql import QuoteModel, Base, sql_config
 
 
 @pytest.fixture
@@ -27,10 +29,10 @@ def test_create_and_read_all(dbsql):
     # Для теста проверяем наличие текста и автора
     all_rows = dbsql.read_all()
     assert len(all_rows) == 1
-    assert all_rows[0]["text"] == "Hello"
-    assert all_rows[0]["author"] == "Someone"
+    assert all_rows[0].text == "Hello"
+    assert all_rows[0].author == "Someone"
     # Проверяем, что id существует
-    assert "id" in all_rows[0]
+    assert all_rows[0].id is not None
 
 def test_get_latest(dbsql):
     import datetime
@@ -44,8 +46,8 @@ def test_get_latest(dbsql):
     
     latest_2 = dbsql.get_latest(2)
     assert len(latest_2) == 2
-    assert latest_2[0]["text"] == "C"
-    assert latest_2[1]["text"] == "B"
+    assert latest_2[0].text == "C"
+    assert latest_2[1].text == "B"
 
 def test_create_multiple(dbsql):
     ids = []
@@ -55,7 +57,7 @@ def test_create_multiple(dbsql):
     all_rows = dbsql.read_all()
     assert len(all_rows) == 5
     # Проверяем, что у всех есть id
-    assert all("id" in r for r in all_rows)
+    assert all(r.id is not None for r in all_rows)
 
 def test_get_latest_default_number(dbsql):
     import datetime
@@ -67,5 +69,226 @@ def test_get_latest_default_number(dbsql):
         })
     latest = dbsql.get_latest()  # по умолчанию 5
     assert len(latest) == 5
-    assert latest[0]["text"] == "Q9"
-    assert latest[-1]["text"] == "Q5"
\ No newline at end of file
+    assert latest[0].text == "Q9"
+    assert latest[-1].text == "Q5"
+
+def test_bulk_create(dbsql):
+    dbsql.create({"text": "A", "author": "X"})
+    ids = dbsql.bulk_create([{"text": "B", "author": "Y", "timestep": None, "id": None},
+                             {"text": "C", "author": "Z", "timestep": None, "id": None}])
+    assert ids == [2, 3]
+    all_rows = dbsql.read_all()
+    assert [r.text for r in all_rows] == ["A", "B", "C"]
+    assert all(r.timestep is not None for r in all_rows)
+    assert dbsql.bulk_create([]) == []
+
+def test_bulk_create_without_returning_selects_ids(dbsql, monkeypatch):
+    monkeypatch.setattr(dbsql.engine.dialect, "insert_executemany_returning", False)  # as MySQL
+    dbsql.create({"text": "A", "author": "X"})
+    ids = dbsql.bulk_create([{"text": t, "author": "X"} for t in "BCA"])
+    assert ids == [2, 3, None]
+    assert [r.text for r in dbsql.read_ids(ids[:2])] == ["B", "C"]
+
+def test_read_all_author_filter_in_sql(dbsql):
+    dbsql.bulk_create([{"text": f"Q{i}", "author": "X" if i % 2 else "Y"} for i in range(6)])
+    rows = dbsql.read_all(author="X")
+    assert [r.text for r in rows] == ["Q1", "Q3", "Q5"]
+
+def test_read_all_keyset_pagination(dbsql):
+    ids = dbsql.bulk_create([{"text": f"Q{i}", "author": "X"} for i in range(5)])
+    page1 = dbsql.read_all(limit=2)
+    page2 = dbsql.read_all(limit=2, after=page1[-1].id)
+    page3 = dbsql.read_all(limit=2, after=page2[-1].id)
+    assert [r.id for r in page1 + page2 + page3] == ids
+    assert len(page3) == 1
+
+
+def _plan(engine, stmt):
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+def test_latest_uses_timestep_index(dbsql):
+    stmt = select(QuoteModel).order_by(desc(QuoteModel.timestep)).limit(5)
+    plan = _plan(dbsql.engine, stmt)
+    assert "ix_quotes_timestep" in plan
+    assert "TEMP B-TREE" not in plan  # no filesort
+
+def test_author_filter_uses_index(dbsql):
+    stmt = select(QuoteModel).where(QuoteModel.author == "X").order_by(QuoteModel.id)
+    assert re.search(r"USING INDEX ix_quotes_author_timestep\b", _plan(dbsql.engine, stmt))
+
+def test_migrate_adds_missing_indexes():
+    engine = create_engine("sqlite:///:memory:", echo=False, future=True)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE quotes (id INTEGER PRIMARY KEY, text VARCHAR(1024) NOT NULL,"
+            " author VARCHAR(255), timestep DATETIME)")
+        conn.exec_driver_sql("CREATE INDEX ix_quotes_author ON quotes (author)")  # dropped since v5
+
+    class OldDBsql(DBsql):
+        def __init__(self):
+            self.engine = engine
+            self.Session = sessionmaker(bind=engine)
+
+    db = OldDBsql()
+    assert db.migrate() == ["ix_quotes_author_timestep", "ix_quotes_content_hash", "ix_quotes_timestep"]
+    assert db.migrate() == []
+    names = {ix["name"] for ix in inspect(engine).get_indexes("quotes")}
+    assert {"ix_quotes_timestep", "ix_quotes_author_timestep"} <= names
+    assert "ix_quotes_author" not in names
+    assert "content_hash" in {c["name"] for c in inspect(engine).get_columns("quotes")}
+
+def test_iter_all_streams(dbsql):
+    dbsql.bulk_create([{"text": f"Q{i}", "author": "X" if i % 2 else "Y"} for i in range(10)])
+    rows = dbsql.iter_all(author="X", batch_size=2)
+    assert next(rows).text == "Q1"
+    assert [r.text for r in rows] == ["Q3", "Q5", "Q7", "Q9"]
+    assert [r.text for r in dbsql.iter_all(limit=2, after=3)] == ["Q3", "Q4"]
+
+def test_schema_check_skipped_once_verified(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'quotes.db'}", future=True)
+    with patch("art_studio_tz.db_sql.create_engine", return_value=engine):
+        db = DBsql("user", "pass", "host", 3306, "quotes_db")
+        assert "quotes" in inspect(engine).get_table_names()
+        assert db.schema_verified()
+        with patch.object(DBsql, "migrate") as migrate:
+            DBsql("user", "pass", "host", 3306, "quotes_db")
+            migrate.assert_not_called()
+        with patch("art_studio_tz.db_sql.SCHEMA_VERSION", 99), patch.object(DBsql, "migrate") as migrate:
+            DBsql("user", "pass", "host", 3306, "quotes_db")
+            migrate.assert_called_once()
+
+def test_sql_config_env_overrides_ini(tmp_path, monkeypatch):
+    ini = tmp_path / "quotes.ini"
+    ini.write_text("[sql]\nurl = sqlite:///from_ini.db\npool_size = 3\npool_pre_ping = yes\n")
+    monkeypatch.setenv("QUOTES_DB_CONFIG", str(ini))
+    monkeypatch.setenv("QUOTES_DB_URL", "sqlite:///from_env.db")
+    monkeypatch.setenv("QUOTES_DB_POOL_RECYCLE", "3600")
+    assert sql_config() == {"url": "sqlite:///from_env.db", "pool_size": 3,
+                            "pool_recycle": 3600, "pool_pre_ping": True}
+
+def test_url_and_pool_options(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("QUOTES_DB_POOL_SIZE", "2")
+    db = DBsql(url=f"sqlite:///{tmp_path / 'quotes.db'}", max_overflow=1, pool_pre_ping=True)
+    assert db.engine.pool.size() == 2
+    assert db.engine.pool._max_overflow == 1
+    assert db.engine.pool._pre_ping
+    assert db.bulk_create([{"text": "A", "author": "X"}]) == [1]
+
+def test_mysql_url_from_credentials(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_DB_URL", "sqlite:///unused.db")
+    with patch("art_studio_tz.db_sql.create_engine") as mock_engine, patch.object(DBsql, "migrate"):
+        DBsql("user", "p@ss", "db.local", 3307, "quotes_db", pool_recycle=280)
+    url, = mock_engine.call_args[0]
+    assert url.drivername == "mysql+pymysql"
+    assert (url.password, url.host, url.port) == ("p@ss", "db.local", 3307)
+    assert mock_engine.call_args[1]["pool_recycle"] == 280
+
+def test_no_url_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("QUOTES_DB_URL", raising=False)
+    monkeypatch.delenv("QUOTES_DB_CONFIG", raising=False)
+    with pytest.raises(ValueError):
+        DBsql()
+
+def test_read_paths_return_rows_in_quote_order(dbsql):
+    import datetime
+    from art_studio_tz import Quote
+    ts = datetime.datetime(2025, 1, 1)
+    dbsql.create({"text": "A", "author": "X", "timestep": ts})
+    row, = dbsql.read_all()
+    assert tuple(row) == ("A", "X", ts, 1)
+    assert Quote(*dbsql.get_latest(1)[0]) == Quote(text="A", author="X", timestep=ts)
+
+def test_search_without_fulltext_index(dbsql):
+    dbsql.bulk_create([{"text": "Life is short", "author": "X"}, {"text": "Art is long", "author": "Y"},
+                       {"text": "short 100% life", "author": "Z"}])
+    assert [r.text for r in dbsql.search("LIFE short")] == ["Life is short", "short 100% life"]
+    assert [r.text for r in dbsql.search("100%")] == ["short 100% life"]
+    assert dbsql.search(" ") == []
+
+def test_fulltext_index_only_on_mysql():
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateIndex
+    index = next(ix for ix in QuoteModel.__table__.indexes if ix.name == "ix_quotes_text_fulltext")
+    assert str(CreateIndex(index).compile(dialect=mysql.dialect())).startswith("CREATE FULLTEXT INDEX")
+    stmt = DBsql._search("life", 5, "mysql").compile(dialect=mysql.dialect())
+    assert "MATCH (quotes.text) AGAINST" in str(stmt)
+
+def test_duplicates_skipped_on_insert(dbsql):
+    first = dbsql.create({"text": "Life is short", "author": "X"})
+    assert dbsql.create({"text": "  life IS short ", "author": "x"}) is None
+    ids = dbsql.bulk_create([{"text": "New", "author": "X"}, {"text": "Life is short", "author": "X"},
+                             {"text": "new", "author": "X"}, {"text": "Life is short", "author": "Y"}])
+    assert ids[1:3] == [None, None]
+    assert None not in (first, ids[0], ids[3])
+    assert [r.text for r in dbsql.read_all()] == ["Life is short", "New", "Life is short"]
+
+def test_dedupe_backfills_old_rows(dbsql):
+    with dbsql.engine.begin() as conn:  # rows stored before content_hash existed
+        conn.execute(QuoteModel.__table__.insert(), [
+            {"text": "A", "author": "X"}, {"text": "B", "author": "X"}, {"text": "a ", "author": "X"}])
+    assert dbsql.create({"text": "B", "author": "X"}) == 4  # not seen as a duplicate yet
+    assert dbsql.dedupe(batch_size=2) == 2
+    assert [(r.text, r.id) for r in dbsql.read_all()] == [("A", 1), ("B", 2)]  # smaller id kept, as DB.dedupe
+    assert dbsql.dedupe() == 0
+    assert dbsql.create({"text": "A", "author": "X"}) is None
+
+def test_read_and_delete_ids(dbsql):
+    dbsql.bulk_create([{"text": t, "author": "X"} for t in "ABC"])
+    assert [r.text for r in dbsql.read_ids([3, 1, 99])] == ["A", "C"]
+    assert dbsql.delete_ids([1, 3, 99]) == 2
+    assert [r.text for r in dbsql.read_all()] == ["B"]
+    assert dbsql.read_ids([]) == [] and dbsql.delete_ids([]) == 0
+
+def test_sample_by_id_ranges(dbsql):
+    dbsql.bulk_create([{"text": f"Q{i}", "author": "X" if i % 10 == 0 else "Y"} for i in range(100)])
+    dbsql.delete_ids(list(range(2, 90)))  # sparse ids, the rest comes from ORDER BY RANDOM()
+    assert sorted(r.id for r in dbsql.sample(20)) == [1, *range(90, 101)]
+    assert {r.id for r in dbsql.sample(5, author="X")} == {1, 91}
+    assert [r.id for r in dbsql.sample(5, author="X", exclude={1})] == [91]
+    assert dbsql.sample(3, author="nobody") == []
+
+def test_sample_fallback_is_one_query(dbsql):
+    from sqlalchemy import event
+    dbsql.bulk_create([{"text": f"Q{i}", "author": "X"} for i in range(1000)])
+    dbsql.delete_ids(list(range(1, 990)))
+    statements = []
+    event.listen(dbsql.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert sorted(r.id for r in dbsql.sample(1000, exclude={1000})) == list(range(990, 1000))
+    assert len(statements) <= 1 + 4 + 1  # MIN/MAX, id-range rounds, fallback; not one per quote
+    assert "random()" in statements[-1]
+
+def test_relative_sqlite_urls_do_not_share_marker(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        monkeypatch.chdir(tmp_path / name)
+        db = DBsql(url="sqlite:///quotes.db")
+        assert db.bulk_create([{"text": "Q", "author": name}]) == [1]
+        assert [r.author for r in db.iter_all()] == [name]
+        db.engine.dispose()
+
+def test_dropped_table_recreated(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))
+    url = f"sqlite:///{tmp_path / 'quotes.db'}"
+    db = DBsql(url=url)
+    assert db.schema_verified()
+    QuoteModel.__table__.drop(db.engine)  # removed by hand, the marker is stale
+    db = DBsql(url=url)
+    assert list(db.iter_all()) == []
+    assert db.create({"text": "Q", "author": "X"}) == 1
+    assert db.schema_verified()
+
+def test_concurrent_duplicate_skipped_not_batch(dbsql):
+    dbsql.create({"text": "A", "author": "X"})
+    no_stored = select(QuoteModel.content_hash).where(False)  # another writer stored "A" after the check
+    with patch("art_studio_tz.db_sql.existing_hashes", return_value=no_stored):
+        ids = dbsql.bulk_create([{"text": "B", "author": "X"}, {"text": "A", "author": "X"},
+                                 {"text": "C", "author": "X"}])
+        assert dbsql.create({"text": "A", "author": "X"}) is None
+    assert ids[1] is None and None not in (ids[0], ids[2])
+    assert sorted(r.text for r in dbsql.read_all()) == ["A", "B", "C"]
@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+
+import pytest
+
+from art_studio_tz import AsyncQuoteDBsql, MissingText, Quote
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def db_url(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))
+    return f"sqlite:///{tmp_path / 'quotes.db'}"  # sync driver is switched to aiosqlite
+
+
+def test_add_and_list(db_url):
+    async def scenario():
+        db = AsyncQuoteDBsql(url=db_url)
+        await db.add_quote_sql(Quote(text="Hello", author="Max"))
+        ids = await db.add_quotes([Quote(text="A", author="X"), Quote(text="B", author="Max")])
+        by_author = await db.list_quote(author="Max")
+        page = await db.list_quote(limit=1, after=ids[0])
+        await db.close()
+        return ids, by_author, page
+
+    ids, by_author, page = asyncio.run(scenario())
+    assert ids == [2, 3]
+    assert [q.text for q in by_author] == ["Hello", "B"]
+    assert [q.text for q in page] == ["B"]
+
+
+def test_concurrent_queries(db_url):
+    async def scenario():
+        db = AsyncQuoteDBsql(url=db_url)
+        await db.add_quotes([Quote(text=f"Q{i}", author="X", timestep=datetime.datetime(2025, 1, i + 1))
+                             for i in range(5)])
+        results = await asyncio.gather(*(db.get_latest(2) for _ in range(10)))
+        await db.delete_all()
+        left = await db.list_quote()
+        await db.close()
+        return results, left
+
+    results, left = asyncio.run(scenario())
+    assert all([q.text for q in r] == ["Q4", "Q3"] for r in results)
+    assert left == []
+
+
+def test_missing_text_raises(db_url):
+    db = AsyncQuoteDBsql(url=db_url)
+    with pytest.raises(MissingText):
+        asyncio.run(db.add_quote_sql(Quote(text=None)))
+
+
+def test_dropped_table_recreated(db_url):
+    from sqlalchemy import create_engine
+    from art_studio_tz.db_sql import QuoteModel
+
+    async def scenario():
+        db = AsyncQuoteDBsql(url=db_url)
+        await db.add_quote_sql(Quote(text="A", author="X"))
+        await db.close()
+        engine = create_engine(db_url)
+        QuoteModel.__table__.drop(engine)  # removed by hand, the marker is stale
+        engine.dispose()
+        db = AsyncQuoteDBsql(url=db_url)
+        quote_id = await db.add_quote_sql(Quote(text="B", author="X"))
+        quotes = await db.list_quote()
+        await db.close()
+        return quote_id, quotes
+
+    quote_id, quotes = asyncio.run(scenario())
+    assert quote_id == 1
+    assert [q.text for q in quotes] == ["B"]
+
+
+def test_concurrent_duplicate_skipped_not_batch(db_url):
+    from unittest.mock import patch
+    from sqlalchemy import select
+    from art_studio_tz.db_sql import QuoteModel
+
+    async def scenario():
+        db = AsyncQuoteDBsql(url=db_url)
+        await db.add_quote_sql(Quote(text="A", author="X"))
+        no_stored = select(QuoteModel.content_hash).where(False)  # "A" stored after the check
+        with patch("art_studio_tz.db_sql_async.existing_hashes", return_value=no_stored):
+            ids = await db.add_quotes([Quote(text="B", author="X"), Quote(text="A", author="X")])
+        quotes = await db.list_quote()
+        await db.close()
+        return ids, quotes
+
+    ids, quotes = asyncio.run(scenario())
+    assert ids[0] is not None and ids[1] is None
+    assert sorted(q.text for q in quotes) == ["A", "B"]
+
+
+def test_add_quotes_without_returning_selects_ids(db_url, monkeypatch):
+    async def scenario():
+        db = AsyncQuoteDBsql(url=db_url)
+        monkeypatch.setattr(db._db.engine.dialect, "insert_executemany_returning", False)  # as MySQL
+        await db.add_quote_sql(Quote(text="A", author="X"))
+        ids = await db.add_quotes([Quote(text=t, author="X") for t in "BCA"])
+        await db.close()
+        return ids
+
+    assert asyncio.run(scenario()) == [2, 3, None]
@@ -0,0 +1,158 @@
+import pytest
+from sqlalchemy import text
+from typer.testing import CliRunner
+
+from art_studio_tz import DB, DBsqlite, InvalidQuoteId, Quote, QuoteDB, QuoteDBsqlite
+from art_studio_tz.cli import app
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DBsqlite(tmp_path)
+
+
+def test_create_and_read(db):
+    new_id = db.create({"text": "Hello", "author": "Someone", "timestep": "2025-01-01 10:00:00 UTC"})
+    assert db.read(new_id) == {"id": 1, "timestep": "2025-01-01 10:00:00 UTC",
+                               "text": "Hello", "author": "Someone"}
+    assert db.read(99) is None
+
+
+def test_wal_mode(db):
+    with db.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+
+def test_update_delete_count(db):
+    ids = db.create_many([{"text": f"Q{i}", "author": "X" if i % 2 else "Y"} for i in range(5)])
+    assert ids == [1, 2, 3, 4, 5]
+    db.update(2, {"text": "New", "author": None})
+    db.update(99, {"text": "ignored"})
+    db.delete(3)
+    assert db.count() == 4
+    assert db.read(2)["text"] == "New"
+    assert [r["id"] for r in db.iter_rows({"author": "X"})] == [2, 4]
+    assert db.create({"text": "after", "author": "Z"}) == 6
+
+
+def test_ids_not_reused_and_reset_by_delete_all(db):
+    db.create({"text": "A", "author": "X"})
+    id2 = db.create({"text": "B", "author": "X"})
+    db.delete(id2)
+    assert db.create({"text": "C", "author": "X"}) == id2 + 1
+    db.delete_all()
+    assert db.count() == 0
+    assert db.create({"text": "D", "author": "X"}) == 1
+
+
+def test_csv_imported_once(tmp_path):
+    csv_db = DB(tmp_path, "quotes", ["timestep", "text", "author"])
+    csv_db.create({"timestep": "2025-01-01 10:00:00 UTC", "text": "A", "author": "X"})
+    csv_db.create({"timestep": "2025-01-02 10:00:00 UTC", "text": 'multi\nline, "quoted"', "author": "Y"})
+    csv_db.create({"timestep": "2025-01-03 10:00:00 UTC", "text": "gone", "author": "Z"})
+    csv_db.delete(3)
+    db = DBsqlite(tmp_path)
+    assert db.read_all() == [
+        {"id": 1, "timestep": "2025-01-01 10:00:00 UTC", "text": "A", "author": "X"},
+        {"id": 2, "timestep": "2025-01-02 10:00:00 UTC", "text": 'multi\nline, "quoted"', "author": "Y"},
+    ]
+    assert db.create({"text": "new", "author": "X"}) == 3
+    db.delete_all()
+    assert DBsqlite(tmp_path).count() == 0  # not imported again
+
+
+def test_quote_db_sqlite_api(tmp_path):
+    db = QuoteDBsqlite(tmp_path)
+    assert isinstance(db, QuoteDB)
+    quote_id = db.add_quote(Quote(text="Hello", author="Max"))
+    db.add_quotes([Quote(text="A", author="X"), Quote(text="B", author="Max")])
+    assert db.count() == 3
+    assert db.get_quote(quote_id) == Quote(text="Hello", author="Max", timestep=db.get_quote(quote_id).timestep)
+    assert [q.text for q in db.list_quote(author="Max")] == ["Hello", "B"]
+    assert [q.text for q in db.iter_quotes(author="X")] == ["A"]
+    db.update_quote(quote_id, Quote(text="Changed"))
+    assert db.get_quote(quote_id).text == "Changed"
+    db.delete_quote(quote_id)
+    with pytest.raises(InvalidQuoteId):
+        db.get_quote(quote_id)
+
+
+def test_cli_backend_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_DB_DIR", str(tmp_path))
+    monkeypatch.setenv("QUOTES_BACKEND", "sqlite")
+    assert runner.invoke(app, ["add", "Stored", "in", "sqlite"]).exit_code == 0
+    assert runner.invoke(app, ["count"]).output.strip() == "1"
+    assert (tmp_path / "quotes.sqlite3").exists()
+    assert not (tmp_path / "quotes.csv").exists()
+    monkeypatch.setenv("QUOTES_BACKEND", "nope")
+    assert runner.invoke(app, ["count"]).exit_code == 1
+
+
+def test_search_follows_writes(db):
+    db.create_many([{"text": "Life is short", "author": "X"},
+                     {"text": "Life, life and more life", "author": "Y"},
+                     {"text": "Art is long", "author": "Life Coach"}])
+    assert [r["id"] for r in db.search("life")] == [2, 1, 3]
+    assert db.search("art long") == [db.read(3)]
+    db.update(1, {"text": "Short story"})
+    db.delete(2)
+    assert [r["id"] for r in db.search("life")] == [3]
+    assert [r["id"] for r in db.search("short", limit=5)] == [1]
+    assert db.search("") == []
+
+
+def test_search_indexes_imported_csv(tmp_path):
+    csv_db = DB(tmp_path, "quotes", ["timestep", "text", "author"])
+    csv_db.create({"timestep": "2025-01-01 10:00:00 UTC", "text": "Imported wisdom", "author": "X"})
+    assert [q.text for q in QuoteDBsqlite(tmp_path).search("wisdom")] == ["Imported wisdom"]
+
+
+def test_duplicates_skipped_and_deduped(db):
+    assert db.create({"text": "Life is short", "author": "X"}) == 1
+    assert db.create({"text": "LIFE  is short", "author": "x"}) is None
+    assert db.create_many([{"text": "A", "author": "X"}, {"text": "Life is short", "author": "X"},
+                           {"text": "a", "author": "X"}]) == [2, None, None]
+    db.update(2, {"author": "Y"})
+    assert db.create({"text": "A", "author": "Y"}) is None  # hash follows the update
+    db.update(2, {"text": "Life is short", "author": "X"})  # now repeats quote 1
+    assert db.dedupe() == 1
+    assert [r["id"] for r in db.read_all()] == [1]
+
+
+def test_dedupe_keeps_smaller_id_after_update(db):
+    db.create_many([{"text": "A", "author": "X"}, {"text": "B", "author": "X"}])
+    db.update(1, {"text": "B"})  # now repeats the later quote 2
+    assert db.dedupe() == 1
+    assert db.read_all() == [{"id": 1, "timestep": db.read(1)["timestep"], "text": "B", "author": "X"}]
+    assert db.create({"text": "B", "author": "X"}) is None  # quote 1 took over the hash
+
+
+def test_failed_csv_import_retried(tmp_path, monkeypatch):
+    csv_db = DB(tmp_path, "quotes", ["timestep", "text", "author"])
+    csv_db.create_many([{"timestep": "2025-01-01 10:00:00 UTC", "text": t, "author": "X"} for t in "AB"])
+    new_row = DBsqlite._new_row.__func__
+
+    def failing_new_row(cls, item):
+        if item["text"] == "B":
+            raise RuntimeError("broken row")
+        return new_row(cls, item)
+
+    monkeypatch.setattr(DBsqlite, "_new_row", classmethod(failing_new_row))
+    with pytest.raises(RuntimeError, match="broken row"):
+        DBsqlite(tmp_path)
+    assert not list(tmp_path.glob("quotes.sqlite3*"))
+    monkeypatch.undo()
+    assert [r["text"] for r in DBsqlite(tmp_path).read_all()] == ["A", "B"]
+
+
+def test_csv_import_legacy_timesteps(tmp_path):
+    csv_db = DB(tmp_path, "quotes", ["timestep", "text", "author"])
+    csv_db.create_many([{"timestep": ts, "text": f"Q{i}", "author": "X"} for i, ts in enumerate(
+        ["28.09.2025", "28.09.2025 10:30", "2025-09-28T10:30:00+02:00", "2025-09-28 10:30:00", "yesterday"])])
+    with pytest.warns(UserWarning, match="quote 5 imported without timestep"):
+        db = DBsqlite(tmp_path)
+    assert [r["timestep"] for r in db.read_all()] == [
+        "2025-09-28 00:00:00 UTC", "2025-09-28 10:30:00 UTC", "2025-09-28 08:30:00 UTC",
+        "2025-09-28 10:30:00 UTC", None]
@@ -0,0 +1,33 @@
+import time
+from unittest.mock import patch
+
+from art_studio_tz.dedupe import MinHash, near_duplicate_clusters
+
+
+def test_near_duplicate_clusters_transitive():
+    items = [(1, "the quick brown fox jumps over the lazy dog"),
+             (2, "a completely different sentence about cats"),
+             (3, "The quick brown fox jumps over the lazy dog!"),
+             (4, "the quick brown fox jumps over the lazy dog again"),
+             (5, "A completely different sentence about cats.")]
+    assert near_duplicate_clusters(items, threshold=0.5) == [[1, 3, 4], [2, 5]]
+    assert near_duplicate_clusters(items, threshold=1.0) == [[1, 3], [2, 5]]
+    assert near_duplicate_clusters([(1, "alone")]) == []
+
+
+def test_near_duplicate_clusters_linear_in_copies():
+    n = 3000  # one bucket per band holds every id, more than one IN (...) chunk
+    calls = 0
+    similarity = MinHash.similarity
+
+    def counting(sig1, sig2):
+        nonlocal calls
+        calls += 1
+        return similarity(sig1, sig2)
+
+    start = time.perf_counter()
+    with patch.object(MinHash, "similarity", staticmethod(counting)):
+        clusters = near_duplicate_clusters((i, "The same quote over and over") for i in range(1, n + 1))
+    assert clusters == [list(range(1, n + 1))]
+    assert calls == n - 1
+    assert time.perf_counter() - start < 10
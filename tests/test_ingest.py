@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from art_studio_tz import HttpClient, Quote, QuoteDB, RateLimiter
+from art_studio_tz.ingest import Ingest
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    counter = 0
+    active = peak = 0  # requests in flight
+    lock = threading.Lock()
+    delay = 0.05
+
+    def do_GET(self):
+        with self.lock:
+            StubHandler.counter += 1
+            n = StubHandler.counter
+            StubHandler.active += 1
+            StubHandler.peak = max(StubHandler.peak, StubHandler.active)
+        time.sleep(self.delay)
+        with self.lock:
+            StubHandler.active -= 1
+        body = json.dumps([{"q": f"Quote {n}", "a": f"Author {n}"}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/random"
+    server.shutdown()
+    server.server_close()
+
+
+def test_ingest_concurrent(tmp_path, stub_url):
+    db = QuoteDB(tmp_path)
+    engine = Ingest(db, stub_url, concurrency=8, batch_size=5)
+    started = time.monotonic()
+    added = asyncio.run(engine.run(max_requests=24))
+    elapsed = time.monotonic() - started
+    assert added == 24
+    assert db.count() == 24
+    assert len({q.text for q in db.list_quote()}) == 24
+    assert elapsed < 24 * StubHandler.delay / 2  # requests overlapped
+
+def test_ingest_respects_rate_limit(tmp_path, stub_url):
+    db = QuoteDB(tmp_path)
+    engine = Ingest(db, stub_url, concurrency=4, limiter=RateLimiter(50, burst=1))
+    started = time.monotonic()
+    assert asyncio.run(engine.run(max_requests=6)) == 6
+    assert time.monotonic() - started >= 5 / 50
+
+def test_ingest_counts_errors(tmp_path):
+    db = QuoteDB(tmp_path)
+    engine = Ingest(db, "http://127.0.0.1:9/", concurrency=2, http=HttpClient(retries=0))
+    assert asyncio.run(engine.run(max_requests=2)) == 0
+    assert engine.errors == 2
+
+def test_ingest_counts_duplicates(tmp_path):
+    db = QuoteDB(tmp_path)
+    db.add_quote(Quote(text="Old", author="X"))
+    engine = Ingest(db, "unused")
+
+    async def feed():
+        queue = asyncio.Queue()
+        for text in ("Old", "New", "new"):
+            queue.put_nowait(Quote(text=text, author="X"))
+        queue.put_nowait(None)
+        await engine._writer(queue)
+
+    asyncio.run(feed())
+    assert (engine.added, engine.duplicates) == (1, 2)
+    assert db.count() == 2
+
+def test_ingest_runs_all_fetchers_at_once(tmp_path, stub_url):
+    StubHandler.peak = 0
+    engine = Ingest(QuoteDB(tmp_path), stub_url, concurrency=16)
+    assert asyncio.run(engine.run(max_requests=32)) == 32
+    assert StubHandler.peak > 8  # not capped by the default executor of the loop
+
+def test_ingest_survives_store_errors(stub_url):
+    class FailingDB:
+        calls = 0
+
+        def add_quotes(self, quotes):
+            self.calls += 1
+            if self.calls % 2:
+                raise RuntimeError("database is down")
+            return []  # QuoteDBsql reports a database error this way
+
+    engine = Ingest(FailingDB(), stub_url, concurrency=4, batch_size=1, queue_size=1)
+    added = asyncio.run(asyncio.wait_for(engine.run(max_requests=10), timeout=10))
+    assert added == 0
+    assert engine.errors == 10
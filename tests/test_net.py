@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from unittest.mock import MagicMock
+from art_studio_tz.net import HttpClient, RateLimiter
+
+
+def test_burst_does_not_wait():
+    limiter = RateLimiter(1, burst=3)
+    for _ in range(3):
+        assert limiter.acquire() == 0
+
+def test_empty_bucket_waits():
+    limiter = RateLimiter(20)
+    limiter.acquire()
+    started = time.monotonic()
+    waited = limiter.acquire()
+    assert waited == pytest.approx(0.05, abs=0.02)
+    assert time.monotonic() - started >= 0.04
+
+def test_no_limit():
+    limiter = RateLimiter(0)
+    assert all(limiter.acquire() == 0 for _ in range(100))
+    assert str(limiter) == "Rate limit: off"
+
+def test_str_shows_state():
+    limiter = RateLimiter(2, burst=4)
+    limiter.acquire()
+    assert "2 req/s" in str(limiter)
+    assert "burst 4" in str(limiter)
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """answers 503 to every first request of a pair, 200 to the second"""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    requests = 0
+    sleep = 0.0
+
+    def do_GET(self):
+        FlakyHandler.requests += 1
+        time.sleep(self.sleep)
+        status = 503 if FlakyHandler.requests % 2 else 200
+        body = json.dumps([{"q": "Q", "a": "A"}]).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up waiting
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_url():
+    FlakyHandler.requests = 0
+    FlakyHandler.sleep = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    ports = []
+    handle = server.process_request
+    def process_request(request, client_address):
+        ports.append(client_address[1])
+        handle(request, client_address)
+    server.process_request = process_request
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/", ports
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_quotes_takes_token():
+    client = HttpClient()
+    client._session = MagicMock()
+    client._session.get.return_value.json.return_value = [{"q": "Q", "a": "A"}]
+    limiter = RateLimiter(1)
+    assert client.fetch_quotes("fake_url", limiter) == [{"q": "Q", "a": "A"}]
+    assert limiter.tokens < 1
+    client._session.get.assert_called_once_with("fake_url", timeout=client.timeout)
+
+def test_retry_on_5xx_and_keep_alive(flaky_url):
+    url, ports = flaky_url
+    client = HttpClient(backoff=0)
+    for _ in range(3):
+        assert client.fetch_quotes(url) == [{"q": "Q", "a": "A"}]
+    assert FlakyHandler.requests == 6
+    assert len(set(ports)) == 1  # one connection for all requests
+    client.close()
+
+def test_no_retries_raises(flaky_url):
+    url, _ = flaky_url
+    client = HttpClient(retries=0)
+    with pytest.raises(requests.exceptions.RequestException):
+        client.fetch_quotes(url)
+
+def test_read_timeout(flaky_url):
+    url, _ = flaky_url
+    FlakyHandler.sleep = 0.5
+    client = HttpClient(timeout=(1, 0.1), retries=0)
+    with pytest.raises(requests.exceptions.RequestException):
+        client.fetch_quotes(url)
@@ -0,0 +1,142 @@
+import http.client
+import json
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+from typer.testing import CliRunner
+
+from art_studio_tz import InvalidQuoteId, Quote
+from art_studio_tz.cli import app
+from art_studio_tz.server import QuoteServer, RemoteError, RemoteQuoteDB, token_file
+
+runner = CliRunner()
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUOTES_CACHE_DIR", str(tmp_path / "cache"))  # token files
+
+
+@pytest.fixture()
+def server():
+    with TemporaryDirectory() as db_dir:
+        srv = QuoteServer(Path(db_dir), port=0)
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        yield srv
+        srv.shutdown()
+        srv.server_close()
+
+
+@pytest.fixture()
+def remote(server):
+    db = RemoteQuoteDB(server.url)
+    yield db
+    db.close()
+
+
+def test_remote_calls_warm_db(server, remote):
+    quote_id = remote.add_quote(Quote(text="Hello", author="Max"))
+    remote.add_quotes([Quote(text="A", author="X"), Quote(text="B", author="Max")])
+    assert remote.count() == 3
+    quote = remote.get_quote(quote_id)
+    assert isinstance(quote, Quote)
+    assert (quote.text, quote.author) == ("Hello", "Max")
+    assert quote.to_dict() == server.quote_db.get_quote(quote_id).to_dict()
+    assert [q.text for q in remote.iter_quotes(author="Max")] == ["Hello", "B"]
+    assert [q.text for q in remote.search("hello")] == ["Hello"]
+    assert [q.text for q in remote.random(author="Max", weights={"Max": 2})] in (["Hello"], ["B"])
+    assert server.quote_db.count() == 3  # the same db object serves every call
+
+
+def test_remote_reraises_quote_exceptions(remote):
+    with pytest.raises(InvalidQuoteId):
+        remote.get_quote(42)
+
+
+def test_remote_rejects_local_only_methods(remote):
+    with pytest.raises(RemoteError):
+        remote.start("fake_url", 5)
+
+
+def test_cli_uses_server(server, monkeypatch):
+    monkeypatch.setenv("QUOTES_SERVER", server.url)
+    result = runner.invoke(app, ["add", "Served", "quote", "-a", "Max"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["count"])
+    assert result.output.strip() == "1"
+    result = runner.invoke(app, ["list"])
+    assert "Served quote" in result.output
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "192.168.1.10", "example.com", "::"])
+def test_server_refuses_non_loopback_host(tmp_path, host):
+    with pytest.raises(ValueError, match="loopback"):
+        QuoteServer(tmp_path, host, 0)
+    result = runner.invoke(app, ["serve", "-H", host, "-P", "0"])
+    assert result.exit_code == 1
+    assert "loopback" in result.output
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "localhost", "::1"])
+def test_server_binds_loopback_host(tmp_path, host):
+    srv = QuoteServer(tmp_path, host, 0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        remote = RemoteQuoteDB(srv.url)
+        assert remote.count() == 0
+        remote.close()
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_server_port_in_use(tmp_path, server):
+    port = server.server_address[1]
+    with pytest.raises(OSError):
+        QuoteServer(tmp_path, "127.0.0.1", port)
+    assert token_file(port).exists()  # the running server keeps its token
+    result = runner.invoke(app, ["serve", "-P", str(port)])
+    assert result.exit_code == 1
+    assert result.output.startswith("Error:")
+
+
+def test_token_file_private_and_removed(tmp_path):
+    srv = QuoteServer(tmp_path, port=0)
+    path = token_file(srv.server_address[1])
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert path.read_text() == srv.token
+    srv.server_close()
+    assert not path.exists()
+
+
+def _post(server, headers, body=b'{"method": "count"}'):
+    host, port = server.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    conn.request("POST", "/call", body=body, headers=headers)
+    response = conn.getresponse()
+    status, data = response.status, response.read()
+    conn.close()
+    return status, data
+
+
+def test_server_rejects_unauthorized_requests(server):
+    good = {"Content-Type": "application/json", "Authorization": f"Bearer {server.token}"}
+    status, data = _post(server, good)
+    assert status == 200 and json.loads(data) == {"result": 0}
+    assert _post(server, {**good, "Content-Type": "text/plain"})[0] == 415  # CORS simple request
+    assert _post(server, {**good, "Origin": "https://example.com"})[0] == 403
+    assert _post(server, {**good, "Host": "evil.example:8765"})[0] == 403  # DNS rebinding
+    assert _post(server, {**good, "Authorization": "Bearer wrong"})[0] == 403
+    assert _post(server, {"Content-Type": "application/json"})[0] == 403
+    with pytest.raises(RemoteError, match="403"):
+        RemoteQuoteDB(server.url, token="wrong").count()
+
+
+def test_server_refuses_unknown_sql_params(server):
+    remote = RemoteQuoteDB(server.url, sql={"url": "sqlite:///stolen.db"})
+    with pytest.raises(RemoteError, match="url"):
+        remote.list_quote()
+    remote.close()
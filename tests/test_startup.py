@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("sqlalchemy", "requests", "urllib3", "pymysql")
+MAX_CLI_IMPORT_US = 300_000  # сейчас ~50 ms, до ленивых импортов было ~400 ms
+
+
+def import_times(tmp_path, *args):
+    """run CLI command with -X importtime, return {module: cumulative us}"""
+    env = {**os.environ, "QUOTES_DB_DIR": str(tmp_path),
+           "PYTHONPATH": os.pathsep.join([str(ROOT), os.environ.get("PYTHONPATH", "")])}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "art_studio_tz", *args],
+                            capture_output=True, text=True, env=env, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("command", [["version"], ["count"], ["config"]])
+def test_csv_commands_skip_heavy_imports(tmp_path, command):
+    times = import_times(tmp_path, *command)
+    loaded = [m for m in times if m.split(".")[0] in HEAVY]
+    assert loaded == []
+    assert "rich" not in times
+
+def test_list_skips_sql_and_network(tmp_path):
+    times = import_times(tmp_path, "list")
+    assert not [m for m in times if m.split(".")[0] in HEAVY]
+
+def test_cli_import_time_cap(tmp_path):
+    times = import_times(tmp_path, "count")
+    assert times["art_studio_tz.cli"] < MAX_CLI_IMPORT_US